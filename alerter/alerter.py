@@ -1,134 +1,287 @@
 #!/usr/bin/env python3
+import asyncio
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime
+from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.schedulers.blocking import BlockingScheduler
 import os
+import threading
+import time
 import logging
-import json
 from pytz import timezone
+from prometheus_client import Counter, Histogram, start_http_server
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
+
+from dispatch import NotificationDispatcher, NotificationQueue, dedup_key
+from watch import ReportChangeWatcher
+from rules import Subscription, SubscriptionIndex, evaluate, fetch_plan, load_subscriptions, notification
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 API_BASE_URL = os.getenv("API_URL", "http://api:8000")
+API_TIMEOUT_SECONDS = float(os.getenv("API_TIMEOUT_SECONDS", "30"))
+# JSON array of subscriptions (see rules.Subscription); unset means the single USER_ID wind alert
+SUBSCRIPTIONS_FILE = os.getenv("ALERT_SUBSCRIPTIONS_FILE")
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
+NOTIFICATION_QUEUE_COLLECTION_NAME = "notification_queue"
+NOTIFY_URL = os.getenv("NOTIFY_URL") or "https://{}-{}.cloudfunctions.net/{}".format(
+    os.getenv("REGION", "us-central1"), os.getenv("PROJECT", "taskr-1428"), os.getenv("FUNCTION", "sendMessage"),
+)
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "10"))
+# Notifications per request; above 1 the endpoint must accept {"messages": [...]}
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "1"))
+NOTIFY_TIMEOUT_SECONDS = float(os.getenv("NOTIFY_TIMEOUT_SECONDS", "10"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+NOTIFY_RETRY_BASE_DELAY_SECONDS = float(os.getenv("NOTIFY_RETRY_BASE_DELAY_SECONDS", "60"))
+NOTIFY_RETRY_MAX_DELAY_SECONDS = float(os.getenv("NOTIFY_RETRY_MAX_DELAY_SECONDS", "3600"))
+NOTIFY_RETRY_INTERVAL_MINUTES = int(os.getenv("NOTIFY_RETRY_INTERVAL_MINUTES", "5"))
+# "cron" evaluates every subscription once a day; "events" also re-evaluates
+# affected subscriptions as soon as the API reports a changed forecast
+ALERT_MODE = os.getenv("ALERT_MODE", "cron")
+ALERT_EVENT_DEBOUNCE_SECONDS = float(os.getenv("ALERT_EVENT_DEBOUNCE_SECONDS", "30"))
+# Prometheus metrics are served on this port; 0 disables the endpoint
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
 
-def format_time_hhmm(t):
-    """Convert numeric HHMM (e.g., 900, 1200) to 'H:MM am/pm'."""
-    try:
-        ti = int(t)
-    except (TypeError, ValueError):
-        return str(t)
-    hour = ti // 100
-    minute = ti % 100
-    # ampm = 'am' if hour < 12 else 'pm'
-    hour12 = hour % 12
-    if hour12 == 0:
-        hour12 = 12
-    return f"{hour12}:{minute:02d}"
-
-def get_weather_for_date(date_str):
-    """Fetches weather from the API for a specific date."""
+FETCH_DURATION = Histogram(
+    "alerter_fetch_duration_seconds", "Time to fetch a location's reports from the weather API.", ["result"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+NOTIFICATIONS = Counter("alerter_notifications_total", "Notification sends by result: sent, retry or failed.", ["result"])
+JOB_DURATION = Histogram(
+    "alerter_job_duration_seconds", "Wall time of the daily alert job.",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0),
+)
+
+DISPATCHER = NotificationDispatcher(NOTIFY_URL, NOTIFY_CONCURRENCY, NOTIFY_BATCH_SIZE, NOTIFY_TIMEOUT_SECONDS)
+
+def default_subscriptions():
+    """
+    The single subscription configured through the environment, used when
+    no ALERT_SUBSCRIPTIONS_FILE is given.
+    """
+    return [Subscription(
+        user_id=os.getenv("USER_ID", "493KKO1BmXca1bRUVwa0PY6HzzT2"),
+        location=os.getenv("LOCATION", "18966"),
+        threshold=int(os.getenv("WINDSPEED_ThRESHOLD", "15")),
+    )]
+
+def get_subscriptions():
+    if SUBSCRIPTIONS_FILE:
+        return load_subscriptions(SUBSCRIPTIONS_FILE)
+    return default_subscriptions()
+
+_subscription_index = (None, None)
+
+def get_subscription_index():
+    """
+    Subscriptions indexed by location, rebuilt only when the subscriptions
+    file changes.
+    """
+    global _subscription_index
+    version = os.path.getmtime(SUBSCRIPTIONS_FILE) if SUBSCRIPTIONS_FILE else 0
+    cached_version, index = _subscription_index
+    if index is None or cached_version != version:
+        index = SubscriptionIndex(get_subscriptions())
+        _subscription_index = (version, index)
+    return index
+
+def get_weather_range(location, start_date, end_date):
+    """Fetches every report for a location between two dates with one API request."""
+    started = time.perf_counter()
     try:
-        response = requests.get(f"{API_BASE_URL}/weather/{date_str}")
+        response = requests.get(
+            f"{API_BASE_URL}/weather/range",
+            params={"start": start_date, "end": end_date, "location": location, "format": "json"},
+            timeout=API_TIMEOUT_SECONDS,
+        )
         response.raise_for_status()
+        FETCH_DURATION.labels("success").observe(time.perf_counter() - started)
         return response.json()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching weather for {date_str}: {e}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        FETCH_DURATION.labels("error").observe(time.perf_counter() - started)
+        logging.error(f"Error fetching weather for {location} from {start_date} to {end_date}: {e}")
         return None
 
+def fetch_reports(subscriptions, today):
+    """
+    One range request per location, covering the longest window of any of
+    its subscriptions. Locations that could not be fetched are left out.
+    """
+    reports_by_location = {}
+    for location, (start_date, end_date) in fetch_plan(subscriptions, today).items():
+        reports = get_weather_range(location, start_date, end_date)
+        if reports is not None:
+            reports_by_location[location] = reports
+    return reports_by_location
+
+def get_mongo_client():
+    """
+    Establishes a connection to MongoDB with retry logic.
+    """
+    retries = 5
+    while retries > 0:
+        try:
+            client = MongoClient(MONGO_URI)
+            # The ismaster command is cheap and does not require auth.
+            client.admin.command('ismaster')
+            logging.info("Successfully connected to MongoDB.")
+            return client
+        except ConnectionFailure as e:
+            retries -= 1
+            logging.error(f"Could not connect to MongoDB: {e}. Retrying in 5 seconds...")
+            time.sleep(5)
+    logging.error("Failed to connect to MongoDB after several retries.")
+    return None
+
+_notification_queue = None
+_drain_lock = threading.Lock()
+# Last signature sent per dedup key, for suppression when MongoDB is unavailable
+_sent_signatures = {}
+
+def get_notification_queue():
+    """
+    The persistent notification queue, or None when MongoDB is unreachable.
+    """
+    global _notification_queue
+    if _notification_queue is None:
+        client = get_mongo_client()
+        if client is None:
+            return None
+        _notification_queue = NotificationQueue(
+            client.weather_db[NOTIFICATION_QUEUE_COLLECTION_NAME],
+            NOTIFY_MAX_ATTEMPTS, NOTIFY_RETRY_BASE_DELAY_SECONDS, NOTIFY_RETRY_MAX_DELAY_SECONDS,
+        )
+        _notification_queue.ensure_indexes()
+    return _notification_queue
+
+def record_dispatch(counts):
+    for result, count in counts.items():
+        if count:
+            NOTIFICATIONS.labels(result).inc(count)
+    logging.info(f"Notifications sent: {counts['sent']}, retrying: {counts['retry']}, failed: {counts['failed']}")
+
+def drain_queue(queue):
+    # The daily job and the retry job run on separate scheduler threads;
+    # draining one at a time keeps them from sending the same entry twice.
+    with _drain_lock:
+        record_dispatch(asyncio.run(DISPATCHER.drain(queue)))
+
+def dispatch_notifications():
+    """Sends every queued notification that is due, including retries."""
+    queue = get_notification_queue()
+    if queue is not None:
+        drain_queue(queue)
+
+def deliver_alerts(alerts, today, evaluated=()):
+    """
+    Queues a notification per alert, deduplicated per (user, date, alert)
+    and suppressed while the alert's signature is unchanged, and sends
+    them. Subscriptions in `evaluated` that no longer alert are cleared so
+    they notify again if the condition returns. Without MongoDB, alerts
+    are sent without retries and suppressed in memory.
+    """
+    date_str = today.strftime("%Y-%m-%d")
+    entries = []
+    for alert in alerts:
+        payload = notification(alert, today)
+        entries.append({
+            "_id": dedup_key(alert.subscription.user_id, date_str, alert.subscription.key()),
+            "user_id": alert.subscription.user_id,
+            "alert_key": alert.subscription.key(),
+            "signature": alert.signature(),
+            "payload": payload,
+        })
+    alerting = {entry["_id"] for entry in entries}
+    cleared = [
+        subscription for subscription in evaluated
+        if dedup_key(subscription.user_id, date_str, subscription.key()) not in alerting
+    ]
+
+    queue = get_notification_queue()
+    if queue is None:
+        logging.warning("Notification queue unavailable; sending without retries.")
+        for subscription in cleared:
+            _sent_signatures.pop(dedup_key(subscription.user_id, date_str, subscription.key()), None)
+        entries = [entry for entry in entries if _sent_signatures.get(entry["_id"]) != entry["signature"]]
+        for entry in entries:
+            logging.info(f"Alerting {entry['user_id']}: {entry['payload']['body']}")
+        results = asyncio.run(DISPATCHER.send(entries))
+        for entry, error in results:
+            if error is None:
+                _sent_signatures[entry["_id"]] = entry["signature"]
+            else:
+                logging.error(f"Error sending notification {entry['_id']}: {error}")
+        record_dispatch({
+            "sent": sum(1 for _, error in results if error is None),
+            "retry": 0,
+            "failed": sum(1 for _, error in results if error is not None),
+        })
+        return
+
+    for subscription in cleared:
+        queue.clear(subscription.user_id, date_str, subscription.key())
+    queued = 0
+    for entry in entries:
+        if queue.enqueue(entry["user_id"], date_str, entry["alert_key"], entry["payload"], entry["signature"]):
+            queued += 1
+            logging.info(f"Alerting {entry['user_id']}: {entry['payload']['body']}")
+    if queued < len(entries):
+        logging.info(f"{len(entries) - queued} unchanged alerts were already notified today")
+    drain_queue(queue)
+
+@JOB_DURATION.time()
 def daily_weather_alert():
-    """Scheduled job to get and log weather for today and tomorrow."""
+    """Scheduled job that evaluates every subscription against today's forecasts."""
     logging.info("Executing daily weather alert job...")
-    today = datetime.now().strftime('%Y-%m-%d')
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-    
-    wind_threshold = int(os.getenv("WINDSPEED_ThRESHOLD", "15"))
-    cuttoff_time = 900
-
-    hourly_wind_today = []
-    hourly_wind_tomorrow = []
-
-    logging.info(f"--- Weather for {today} ---")
-    weather_today = get_weather_for_date(today)
-    if weather_today and 'hourly' in weather_today:
-        hourly_wind_today = [{'time': h['time'], 'windspeed': h['windspeedMiles']} for h in weather_today['hourly'] if int(h['time']) >= cuttoff_time]
-
-    logging.info(f"--- Weather for {tomorrow} ---")
-    weather_tomorrow = get_weather_for_date(tomorrow)
-    if weather_tomorrow and 'hourly' in weather_tomorrow:
-        hourly_wind_tomorrow = [{'time': h['time'], 'windspeed': h['windspeedMiles']} for h in weather_tomorrow['hourly'] if int(h['time']) < cuttoff_time]
-    
-    hourly_winds = hourly_wind_today + hourly_wind_tomorrow
-    filtered_winds = [h for h in hourly_winds if int(h['windspeed']) >= wind_threshold]
-
-    logging.info("--- Filtered Weather ---")
-    logging.info(filtered_winds)
-
-    if len(filtered_winds) == 0:
-        logging.info('No high winds today')
+    today = datetime.now().date()
+    subscriptions = get_subscriptions()
+    reports_by_location = fetch_reports(subscriptions, today)
+    alerts = evaluate(subscriptions, reports_by_location, today)
+    logging.info(f"{len(alerts)} of {len(subscriptions)} subscriptions triggered across {len(reports_by_location)} locations")
+    deliver_alerts(alerts, today, [s for s in subscriptions if s.location in reports_by_location])
+    logging.info("Daily weather alert job finished.")
+
+def evaluate_changes(changes):
+    """
+    Re-evaluates only the subscriptions whose window covers a changed
+    (location, date), fetching just their locations.
+    """
+    today = datetime.now().date()
+    subscriptions = get_subscription_index().affected(changes, today)
+    if not subscriptions:
         return
-    
-    # raw numeric times from API (e.g. 900, 1200)
-    start_time = filtered_winds[0]['time']
-    last_checked_time = hourly_winds[-1]['time']
-    last_high_wind_time = filtered_winds[-1]['time']
-    start_time_fmt = format_time_hhmm(start_time)
-    end_time_fmt = format_time_hhmm(last_high_wind_time)
-    max_speed = max(int(h['windspeed']) for h in filtered_winds)
-
-    body = "Unknown wind notification"
-    if last_checked_time == last_high_wind_time:
-        body = f"High winds starting at {start_time_fmt} and continuing into tomorrow, with gusts up to {max_speed}mph."
-    else:
-        if start_time == last_high_wind_time:
-            body = f"High winds of {max_speed}mph expected around {start_time_fmt}."
-        else:
-            body = f"High winds expected from {start_time_fmt} to {end_time_fmt}, with gusts up to {max_speed}mph."
-
-    if len(filtered_winds) == 1:
-        end_time_fmt = format_time_hhmm(last_high_wind_time + 100)
-    
-    logging.info(body)
-
-    payload = {
-        "title": "Batten Down the Decorations!",
-        "body": body,
-        "data": {
-            "actions": json.dumps([
-                {"action": "add-wind-task", "title": "Yes"},
-                {"action": "dismiss", "title": "No"}
-            ]),
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "body": body,
-            "startHour": start_time_fmt,
-            "endHour": end_time_fmt
-        }
-    }
-    REGION = os.getenv("REGION", "us-central1")
-    PROJECT = os.getenv("PROJECT", "taskr-1428")
-    FUNCTION = os.getenv("FUNCTION", "sendMessage")
-    USER_ID = os.getenv("USER_ID", "493KKO1BmXca1bRUVwa0PY6HzzT2")
-    try:
-        resp = requests.post(
-            f"https://{REGION}-{PROJECT}.cloudfunctions.net/{FUNCTION}",
-            json={"userId": USER_ID, "payload": payload},
-            timeout=10
-        )
-        resp.raise_for_status()
-        logging.info(f"Notification sent successfully: {resp.status_code}")
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error sending notification: {e}")
+    reports_by_location = fetch_reports(subscriptions, today)
+    alerts = evaluate(subscriptions, reports_by_location, today)
+    logging.info(f"{len(changes)} report changes affected {len(subscriptions)} subscriptions; {len(alerts)} alerting")
+    deliver_alerts(alerts, today, [s for s in subscriptions if s.location in reports_by_location])
 
-    logging.info("Daily weather alert job finished.")
+def watch_report_changes():
+    """
+    Event mode: follows report changes from the API, starting with a full
+    evaluation so alerts that changed while the alerter was down are sent.
+    """
+    watcher = ReportChangeWatcher(API_BASE_URL, evaluate_changes, daily_weather_alert, ALERT_EVENT_DEBOUNCE_SECONDS)
+    watcher.reset()
+    asyncio.run(watcher.run())
 
 if __name__ == "__main__":
-    scheduler = BlockingScheduler(timezone=timezone('America/New_York'))
+    events_mode = ALERT_MODE == "events"
+    scheduler_class = BackgroundScheduler if events_mode else BlockingScheduler
+    scheduler = scheduler_class(timezone=timezone('America/New_York'))
     # Schedule the job to run every day at 10:00 EST, with grace time to run even if missed
     alert_cron_hour = int(os.getenv("ALERT_CRON_HOUR", "10"))
     alert_cron_minute = int(os.getenv("ALERT_CRON_MINUTE", "0"))
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
     scheduler.add_job(daily_weather_alert, 'cron', hour=alert_cron_hour, minute=alert_cron_minute, misfire_grace_time=24*3600, coalesce=True)
+    scheduler.add_job(dispatch_notifications, 'interval', minutes=NOTIFY_RETRY_INTERVAL_MINUTES, coalesce=True)
 
     logging.info(f"Scheduler started. Waiting for the next scheduled run at {alert_cron_hour:02d}:{alert_cron_minute:02d} AM.")
     try:
         scheduler.start()
+        if events_mode:
+            logging.info("Watching the API for report changes.")
+            watch_report_changes()
     except (KeyboardInterrupt, SystemExit):
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import random
+
+import httpx
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+def dedup_key(user_id: str, date_str: str, alert_key: str) -> str:
+    """
+    One notification per (user, date, alert), however often the job runs.
+    """
+    return f"{user_id}|{date_str}|{alert_key}"
+
+
+class NotificationQueue:
+    """
+    Persistent outbox of notifications in MongoDB. Entries are keyed by
+    dedup_key and remember the alert's signature, so enqueueing a condition
+    that was already queued or sent is a no-op. Failed sends are retried
+    with exponential backoff and full jitter until `max_attempts`, after
+    which the entry is marked failed.
+    """
+
+    def __init__(self, collection, max_attempts: int, base_delay: float, max_delay: float,
+                 retention_days: int = 14, rng: Optional[random.Random] = None):
+        self.collection = collection
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retention_days = retention_days
+        self._rng = rng or random.Random()
+
+    def ensure_indexes(self):
+        self.collection.create_index([("status", ASCENDING), ("next_attempt_utc", ASCENDING)])
+        self.collection.create_index([("expire_at", ASCENDING)], expireAfterSeconds=0)
+
+    def delay(self, attempts: int) -> float:
+        """
+        Seconds to wait after the given number of failed attempts.
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return self._rng.uniform(0, ceiling)
+
+    def enqueue(self, user_id: str, date_str: str, alert_key: str, payload: dict, signature: str,
+                now: Optional[datetime] = None) -> bool:
+        """
+        Queues a notification, or re-arms the existing entry when the alert's
+        signature has changed since it was queued. Returns False when the
+        same condition was already queued or sent.
+        """
+        now = now or datetime.utcnow()
+        key = dedup_key(user_id, date_str, alert_key)
+        try:
+            result = self.collection.update_one(
+                {"_id": key, "signature": {"$ne": signature}},
+                {
+                    "$set": {
+                        "payload": payload,
+                        "signature": signature,
+                        "status": PENDING,
+                        "attempts": 0,
+                        "next_attempt_utc": now,
+                        # Kept past the alert's date so a re-run the same day is still deduplicated
+                        "expire_at": now + timedelta(days=self.retention_days),
+                    },
+                    "$setOnInsert": {"user_id": user_id, "date": date_str, "alert_key": alert_key, "created_utc": now},
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False  # the entry exists with this signature
+        return result.upserted_id is not None or result.modified_count > 0
+
+    def clear(self, user_id: str, date_str: str, alert_key: str):
+        """
+        Forgets an alert whose condition no longer holds, so it is sent
+        again if it comes back, and cancels it if it was not sent yet.
+        """
+        key = dedup_key(user_id, date_str, alert_key)
+        self.collection.update_one({"_id": key, "status": PENDING}, {"$set": {"status": CANCELLED}})
+        self.collection.update_one({"_id": key, "signature": {"$ne": None}}, {"$set": {"signature": None}})
+
+    def due(self, limit: int, now: Optional[datetime] = None) -> List[dict]:
+        now = now or datetime.utcnow()
+        return list(
+            self.collection.find({"status": PENDING, "next_attempt_utc": {"$lte": now}})
+            .sort("next_attempt_utc", ASCENDING)
+            .limit(limit)
+        )
+
+    def mark_sent(self, keys: List[str], now: Optional[datetime] = None):
+        if keys:
+            self.collection.update_many(
+                {"_id": {"$in": keys}},
+                {"$set": {"status": SENT, "sent_utc": now or datetime.utcnow()}, "$inc": {"attempts": 1}},
+            )
+
+    def mark_failed(self, entry: dict, error: str, now: Optional[datetime] = None) -> bool:
+        """
+        Records a failed send and schedules the next attempt. Returns False
+        once the entry has used up its attempts.
+        """
+        now = now or datetime.utcnow()
+        attempts = entry.get("attempts", 0) + 1
+        update = {"attempts": attempts, "last_error": error}
+        retry = attempts < self.max_attempts
+        if retry:
+            update["next_attempt_utc"] = now + timedelta(seconds=self.delay(attempts))
+        else:
+            update["status"] = FAILED
+        self.collection.update_one({"_id": entry["_id"]}, {"$set": update})
+        return retry
+
+
+class NotificationDispatcher:
+    """
+    Sends notifications over one pooled keep-alive HTTP client, with at
+    most `concurrency` requests in flight. With batch_size > 1, up to that
+    many notifications are sent per request as {"messages": [...]}; with 1
+    each request carries a single {"userId", "payload"} body.
+    """
+
+    def __init__(self, url: str, concurrency: int = 10, batch_size: int = 1, timeout: float = 10,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.url = url
+        self.concurrency = concurrency
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self.transport = transport
+
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        return httpx.AsyncClient(limits=limits, timeout=self.timeout, transport=self.transport)
+
+    def _body(self, batch: List[dict]) -> dict:
+        messages = [{"userId": entry["user_id"], "payload": entry["payload"]} for entry in batch]
+        return messages[0] if self.batch_size == 1 else {"messages": messages}
+
+    async def _post(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, batch: List[dict]) -> Optional[str]:
+        async with semaphore:
+            try:
+                response = await client.post(self.url, json=self._body(batch))
+                response.raise_for_status()
+                return None
+            except httpx.HTTPError as e:
+                return str(e) or type(e).__name__
+
+    async def send(self, entries: List[dict]) -> List[Tuple[dict, Optional[str]]]:
+        """
+        Sends every entry and returns (entry, error) pairs, error being None
+        for delivered notifications. A failed request fails its whole batch.
+        """
+        if not entries:
+            return []
+        batches = [entries[i:i + self.batch_size] for i in range(0, len(entries), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._client() as client:
+            errors = await asyncio.gather(*(self._post(client, semaphore, batch) for batch in batches))
+        return [(entry, error) for batch, error in zip(batches, errors) for entry in batch]
+
+    async def drain(self, queue: NotificationQueue, limit: int = 500) -> dict:
+        """
+        Sends every notification that is due, `limit` at a time, and records
+        the outcome in the queue. Failures are rescheduled, so each entry is
+        tried at most once per drain.
+        """
+        counts = {"sent": 0, "retry": 0, "failed": 0}
+        started = datetime.utcnow()
+        while True:
+            entries = queue.due(limit, now=started)
+            if not entries:
+                return counts
+            results = await self.send(entries)
+            queue.mark_sent([entry["_id"] for entry, error in results if error is None])
+            counts["sent"] += sum(1 for _, error in results if error is None)
+            for entry, error in results:
+                if error is None:
+                    continue
+                if queue.mark_failed(entry, error):
+                    counts["retry"] += 1
+                else:
+                    counts["failed"] += 1
+                    logging.error(f"Giving up on notification {entry['_id']}: {error}")
+            if len(entries) < limit:
+                return counts
@@ -0,0 +1,263 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import operator
+
+from pydantic import BaseModel, Field
+
+# How a subscription's threshold is compared with an hourly value
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+}
+# Phrasing for metrics with a ready-made notification text; others use the metric name
+METRIC_LABELS = {
+    "windspeedMiles": ("High winds", "mph"),
+    "WindGustMiles": ("Wind gusts", "mph"),
+    "tempF": ("Temperatures", "°F"),
+    "chanceofrain": ("Chance of rain", "%"),
+    "precipInches": ("Precipitation", "in"),
+}
+WIND_METRICS = ("windspeedMiles", "WindGustMiles")
+
+
+class Subscription(BaseModel):
+    """
+    One user's alert: notify when `metric` crosses `threshold` at any hour
+    of the window. The window opens at `start_time` (HHMM) on the day the
+    job runs and lasts `hours`, so the default covers 9:00 today to 9:00
+    tomorrow.
+    """
+    user_id: str
+    location: str = "18966"
+    metric: str = "windspeedMiles"
+    op: str = Field(">=", pattern="^(>=|>|<=|<)$")
+    threshold: float
+    start_time: int = Field(900, ge=0, le=2359)
+    hours: int = Field(24, ge=1, le=24 * 14)
+    title: Optional[str] = None
+
+    def window(self) -> Tuple[int, int]:
+        """
+        The window as [start, end) in "day offset * 2400 + HHMM" units.
+        """
+        return self.start_time, self.start_time + self.hours * 100
+
+    def key(self) -> str:
+        """
+        Identifies the alert for deduplication, independently of the user.
+        """
+        return f"{self.location}:{self.metric}{self.op}{self.threshold:g}@{self.start_time}+{self.hours}h"
+
+    def days(self) -> int:
+        """
+        Number of report days the window touches, starting with today.
+        """
+        _, end = self.window()
+        return (end - 1) // 2400 + 1
+
+    def covers(self, offset: int) -> bool:
+        """
+        True if the window includes any hour of the day `offset` days after today.
+        """
+        start, end = self.window()
+        return offset * 2400 < end and (offset + 1) * 2400 > start
+
+
+class Alert(BaseModel):
+    subscription: Subscription
+    # Matching hours in window order: {"date", "time", "value"}
+    hours: List[dict]
+    # The last hour of the window that had data
+    last_checked: Optional[dict] = None
+
+    def signature(self) -> str:
+        """
+        The span the notification describes. An alert whose signature has
+        not changed since the last notification is not sent again.
+        """
+        first, last = self.hours[0], self.hours[-1]
+        continuing = "+" if self.last_checked == last else ""
+        return f"{first['date']}T{first['time']:04d}/{last['date']}T{last['time']:04d}{continuing}"
+
+
+class SubscriptionIndex:
+    """
+    Subscriptions grouped by location, for finding the ones a report
+    change can affect without scanning them all.
+    """
+
+    def __init__(self, subscriptions: Iterable[Subscription]):
+        self.subscriptions = list(subscriptions)
+        self.by_location: Dict[str, List[Subscription]] = defaultdict(list)
+        for subscription in self.subscriptions:
+            self.by_location[subscription.location].append(subscription)
+
+    def affected(self, changes: Iterable[Tuple[str, str]], today: date) -> List[Subscription]:
+        """
+        Subscriptions whose window covers one of the changed (location, date) pairs.
+        """
+        affected = {}
+        for location, date_str in changes:
+            try:
+                offset = (date.fromisoformat(date_str) - today).days
+            except (TypeError, ValueError):
+                continue
+            if offset < 0:
+                continue
+            for subscription in self.by_location.get(location, ()):
+                if subscription.covers(offset):
+                    affected[id(subscription)] = subscription
+        return list(affected.values())
+
+
+def load_subscriptions(path: str) -> List[Subscription]:
+    """
+    Reads a JSON array of subscriptions.
+    """
+    with open(path) as f:
+        return [Subscription.model_validate(entry) for entry in json.load(f)]
+
+
+def fetch_plan(subscriptions: Iterable[Subscription], today: date) -> Dict[str, Tuple[str, str]]:
+    """
+    The (start, end) date span each location needs so that every one of its
+    subscriptions' windows is covered by a single range request.
+    """
+    days = defaultdict(int)
+    for subscription in subscriptions:
+        days[subscription.location] = max(days[subscription.location], subscription.days())
+    return {
+        location: (today.strftime("%Y-%m-%d"), (today + timedelta(days=count - 1)).strftime("%Y-%m-%d"))
+        for location, count in days.items()
+    }
+
+
+def _number(value) -> Optional[float]:
+    """
+    Hourly values are numbers in typed reports and strings in legacy ones.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _timeline(reports: Iterable[dict], today: date) -> List[Tuple[int, dict, dict]]:
+    """
+    Flattens reports into (position, report, hour) in time order, where
+    position uses the same units as Subscription.window().
+    """
+    timeline = []
+    for report in reports:
+        try:
+            offset = (date.fromisoformat(report["date"]) - today).days
+        except (KeyError, TypeError, ValueError):
+            continue
+        if offset < 0:
+            continue
+        for hour in report.get("hourly") or []:
+            try:
+                timeline.append((offset * 2400 + int(hour["time"]), report, hour))
+            except (KeyError, TypeError, ValueError):
+                continue
+    timeline.sort(key=lambda entry: entry[0])
+    return timeline
+
+
+def evaluate(subscriptions: Iterable[Subscription], reports_by_location: Dict[str, List[dict]], today: date) -> List[Alert]:
+    """
+    Evaluates every subscription against the reports already fetched for
+    its location. Each location's reports are flattened once and shared by
+    all of its subscriptions. Returns one Alert per subscription with at
+    least one matching hour.
+    """
+    by_location = defaultdict(list)
+    for subscription in subscriptions:
+        by_location[subscription.location].append(subscription)
+
+    alerts = []
+    for location, location_subscriptions in by_location.items():
+        timeline = _timeline(reports_by_location.get(location) or [], today)
+        for subscription in location_subscriptions:
+            start, end = subscription.window()
+            compare = OPERATORS[subscription.op]
+            matches = []
+            last_checked = None
+            for position, report, hour in timeline:
+                if position < start or position >= end:
+                    continue
+                value = _number(hour.get(subscription.metric))
+                if value is None:
+                    continue
+                entry = {"date": report["date"], "time": int(hour["time"]), "value": value}
+                last_checked = entry
+                if compare(value, subscription.threshold):
+                    matches.append(entry)
+            if matches:
+                alerts.append(Alert(subscription=subscription, hours=matches, last_checked=last_checked))
+    return alerts
+
+
+def format_time_hhmm(t):
+    """Convert numeric HHMM (e.g., 900, 1200) to 'H:MM'."""
+    try:
+        ti = int(t)
+    except (TypeError, ValueError):
+        return str(t)
+    hour = (ti // 100) % 24
+    minute = ti % 100
+    hour12 = hour % 12
+    if hour12 == 0:
+        hour12 = 12
+    return f"{hour12}:{minute:02d}"
+
+
+def _format_value(value: float) -> str:
+    return f"{value:g}"
+
+
+def notification(alert: Alert, today: date) -> dict:
+    """
+    The push notification payload for an alert.
+    """
+    subscription = alert.subscription
+    label, unit = METRIC_LABELS.get(subscription.metric, (subscription.metric, ""))
+    is_wind = subscription.metric in WIND_METRICS
+    first, last = alert.hours[0], alert.hours[-1]
+    start_time_fmt = format_time_hhmm(first["time"])
+    end_time_fmt = format_time_hhmm(last["time"])
+    values = [hour["value"] for hour in alert.hours]
+    peak = _format_value(min(values) if subscription.op.startswith("<") else max(values))
+    peak_phrase = f"with gusts up to {peak}{unit}" if is_wind else f"reaching {peak}{unit}"
+
+    if alert.last_checked == last:
+        body = f"{label} starting at {start_time_fmt} and continuing into tomorrow, {peak_phrase}."
+    elif first == last:
+        body = f"{label} of {peak}{unit} expected around {start_time_fmt}."
+    else:
+        body = f"{label} expected from {start_time_fmt} to {end_time_fmt}, {peak_phrase}."
+
+    if len(alert.hours) == 1:
+        end_time_fmt = format_time_hhmm(last["time"] + 100)
+
+    title = subscription.title or ("Batten Down the Decorations!" if is_wind else f"{label} alert")
+    return {
+        "title": title,
+        "body": body,
+        "data": {
+            "actions": json.dumps([
+                {"action": "add-wind-task", "title": "Yes"},
+                {"action": "dismiss", "title": "No"}
+            ]),
+            "date": today.strftime("%Y-%m-%d"),
+            "body": body,
+            "startHour": start_time_fmt,
+            "endHour": end_time_fmt
+        }
+    }
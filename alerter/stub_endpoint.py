@@ -0,0 +1,53 @@
+"""
+Local stand-in for the notification Cloud Function. It accepts the single
+{"userId", "payload"} body and the batched {"messages": [...]} body,
+records what it received, and can be told to fail or slow down requests.
+
+Tests mount it in-process with httpx.ASGITransport; to point a local
+alerter at it, run
+
+    uvicorn stub_endpoint:app --port 8081
+    NOTIFY_URL=http://localhost:8081/sendMessage python alerter.py
+"""
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(fail_first: int = 0, delay_seconds: float = 0.0) -> FastAPI:
+    """
+    A fresh stub. `fail_first` requests get a 503 before the stub starts
+    accepting; `delay_seconds` holds each request open that long.
+    """
+    app = FastAPI()
+    app.state.messages = []
+    app.state.requests = 0
+    app.state.fail_remaining = fail_first
+    app.state.delay_seconds = delay_seconds
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+
+    @app.post("/{function}")
+    async def send_message(function: str, request: Request):
+        state = app.state
+        state.requests += 1
+        state.in_flight += 1
+        state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            if state.delay_seconds:
+                await asyncio.sleep(state.delay_seconds)
+            if state.fail_remaining > 0:
+                state.fail_remaining -= 1
+                return JSONResponse({"error": "unavailable"}, status_code=503)
+            body = await request.json()
+            messages = body["messages"] if "messages" in body else [body]
+            state.messages.extend(messages)
+            return {"delivered": len(messages)}
+        finally:
+            state.in_flight -= 1
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,148 @@
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import httpx
+from pymongo.errors import DuplicateKeyError
+
+# Add the parent directory to the path so we can import the alerter modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import alerter
+import stub_endpoint
+from dispatch import CANCELLED, FAILED, PENDING, NotificationDispatcher, NotificationQueue, dedup_key
+from rules import Alert, Subscription
+
+URL = "http://stub/sendMessage"
+
+
+def _dispatcher(stub, **kwargs):
+    return NotificationDispatcher(URL, transport=httpx.ASGITransport(app=stub), **kwargs)
+
+
+def _entries(count):
+    return [
+        {"_id": dedup_key(f"user-{i}", "2024-03-01", "18966:windspeedMiles>=15@900+24h"), "user_id": f"user-{i}",
+         "payload": {"title": "t", "body": f"b{i}"}, "attempts": 0}
+        for i in range(count)
+    ]
+
+
+def _queue(collection=None, max_attempts=3):
+    return NotificationQueue(collection or MagicMock(), max_attempts, base_delay=60, max_delay=600, rng=random.Random(0))
+
+
+async def test_dispatcher_bounds_concurrency_and_sends_single_bodies():
+    stub = stub_endpoint.create_app(delay_seconds=0.01)
+
+    results = await _dispatcher(stub, concurrency=3).send(_entries(10))
+
+    assert [error for _, error in results] == [None] * 10
+    assert stub.state.requests == 10
+    assert stub.state.max_in_flight == 3
+    assert stub.state.messages[0] == {"userId": "user-0", "payload": {"title": "t", "body": "b0"}}
+
+
+async def test_dispatcher_batches_messages():
+    stub = stub_endpoint.create_app()
+
+    results = await _dispatcher(stub, batch_size=4).send(_entries(10))
+
+    assert stub.state.requests == 3
+    assert sorted(message["userId"] for message in stub.state.messages) == sorted(f"user-{i}" for i in range(10))
+    assert all(error is None for _, error in results)
+
+
+async def test_failed_batch_fails_each_of_its_entries():
+    stub = stub_endpoint.create_app(fail_first=1)
+
+    results = await _dispatcher(stub, batch_size=2, concurrency=1).send(_entries(4))
+
+    assert [error is None for _, error in results] == [False, False, True, True]
+    assert "503" in results[0][1]
+
+
+def test_enqueue_is_deduplicated_per_user_date_and_alert():
+    collection = MagicMock()
+    collection.update_one.return_value.upserted_id = None
+    collection.update_one.return_value.modified_count = 1
+    queue = _queue(collection)
+    now = datetime(2024, 3, 1, 14)
+
+    assert queue.enqueue("user-1", "2024-03-01", "alert", {"body": "b"}, "sig", now=now) is True
+
+    query, update = collection.update_one.call_args.args
+    assert query == {"_id": "user-1|2024-03-01|alert", "signature": {"$ne": "sig"}}
+    assert update["$set"]["status"] == PENDING
+    assert update["$set"]["next_attempt_utc"] == now
+    assert collection.update_one.call_args.kwargs == {"upsert": True}
+
+    # The entry already holds this signature, so the upsert collides with it
+    collection.update_one.side_effect = DuplicateKeyError("E11000")
+    assert queue.enqueue("user-1", "2024-03-01", "alert", {"body": "b"}, "sig", now=now) is False
+
+
+def test_clear_cancels_unsent_entries_and_forgets_the_signature():
+    collection = MagicMock()
+
+    _queue(collection).clear("user-1", "2024-03-01", "alert")
+
+    assert [call.args for call in collection.update_one.call_args_list] == [
+        ({"_id": "user-1|2024-03-01|alert", "status": PENDING}, {"$set": {"status": CANCELLED}}),
+        ({"_id": "user-1|2024-03-01|alert", "signature": {"$ne": None}}, {"$set": {"signature": None}}),
+    ]
+
+
+def test_mark_failed_backs_off_then_gives_up():
+    collection = MagicMock()
+    queue = _queue(collection, max_attempts=3)
+    now = datetime(2024, 3, 1, 14)
+
+    assert queue.mark_failed({"_id": "k", "attempts": 1}, "503", now=now) is True
+    update = collection.update_one.call_args.args[1]["$set"]
+    assert update["attempts"] == 2
+    assert now <= update["next_attempt_utc"] <= now + timedelta(seconds=120)
+
+    assert queue.mark_failed({"_id": "k", "attempts": 2}, "503", now=now) is False
+    update = collection.update_one.call_args.args[1]["$set"]
+    assert update["status"] == FAILED
+    assert "next_attempt_utc" not in update
+
+
+async def test_drain_marks_sent_and_reschedules_failures():
+    stub = stub_endpoint.create_app(fail_first=1)
+    entries = _entries(3)
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value.limit.return_value = entries
+
+    counts = await _dispatcher(stub, concurrency=1).drain(_queue(collection))
+
+    assert counts == {"sent": 2, "retry": 1, "failed": 0}
+    sent_filter = collection.update_many.call_args.args[0]
+    assert sent_filter == {"_id": {"$in": [entries[1]["_id"], entries[2]["_id"]]}}
+    failed_filter, failed_update = collection.update_one.call_args.args
+    assert failed_filter == {"_id": entries[0]["_id"]}
+    assert failed_update["$set"]["attempts"] == 1
+
+
+def test_deliver_alerts_without_queue_suppresses_unchanged_alerts():
+    stub = stub_endpoint.create_app()
+    subscription = Subscription(user_id="user-1", threshold=15)
+    alert = Alert(subscription=subscription, hours=[{"date": "2024-03-01", "time": 1200, "value": 20}])
+    today = date(2024, 3, 1)
+
+    with patch("alerter.get_notification_queue", return_value=None), \
+            patch("alerter.DISPATCHER", _dispatcher(stub)), \
+            patch.dict("alerter._sent_signatures", clear=True):
+        alerter.deliver_alerts([alert], today, [subscription])
+        alerter.deliver_alerts([alert], today, [subscription])
+        assert len(stub.state.messages) == 1
+        # Once the condition clears, its return is notified again
+        alerter.deliver_alerts([], today, [subscription])
+        alerter.deliver_alerts([alert], today, [subscription])
+
+    assert len(stub.state.messages) == 2
+    assert stub.state.messages[0]["userId"] == "user-1"
+    assert stub.state.messages[0]["payload"]["body"] == "High winds of 20mph expected around 12:00."
@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+from datetime import date
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add the parent directory to the path so we can import the alerter modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import alerter
+from rules import Subscription, SubscriptionIndex, evaluate, fetch_plan, load_subscriptions, notification
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+TODAY = date(2024, 3, 1)
+
+
+@pytest.fixture
+def subscriptions():
+    return load_subscriptions(os.path.join(FIXTURES, "subscriptions.json"))
+
+
+@pytest.fixture
+def reports_by_location():
+    with open(os.path.join(FIXTURES, "reports.json")) as f:
+        return json.load(f)
+
+
+def test_fetch_plan_covers_each_location_once(subscriptions):
+    plan = fetch_plan(subscriptions, TODAY)
+
+    assert plan == {
+        "18966": ("2024-03-01", "2024-03-02"),
+        "10001": ("2024-03-01", "2024-03-02"),
+    }
+    assert fetch_plan([Subscription(user_id="u", threshold=1, start_time=0, hours=24)], TODAY) == {
+        "18966": ("2024-03-01", "2024-03-01"),
+    }
+
+
+def test_evaluate_matches_each_subscription_window(subscriptions, reports_by_location):
+    alerts = {alert.subscription.user_id: alert for alert in evaluate(subscriptions, reports_by_location, TODAY)}
+
+    assert set(alerts) == {"wind-user", "rain-user", "frost-user"}
+    assert [(hour["date"], hour["time"], hour["value"]) for hour in alerts["wind-user"].hours] == [
+        ("2024-03-01", 1200, 18), ("2024-03-01", 1500, 22), ("2024-03-02", 0, 16), ("2024-03-02", 300, 17),
+    ]
+    assert [hour["time"] for hour in alerts["rain-user"].hours] == [1500, 1800]
+    # Legacy string values are compared as numbers
+    assert alerts["frost-user"].hours == [{"date": "2024-03-02", "time": 600, "value": 19.0}]
+
+
+def test_evaluate_skips_locations_without_reports(subscriptions, reports_by_location):
+    del reports_by_location["18966"]
+
+    alerts = evaluate(subscriptions, reports_by_location, TODAY)
+
+    assert [alert.subscription.user_id for alert in alerts] == ["frost-user"]
+
+
+def test_notification_text(subscriptions, reports_by_location):
+    alerts = {alert.subscription.user_id: alert for alert in evaluate(subscriptions, reports_by_location, TODAY)}
+
+    wind = notification(alerts["wind-user"], TODAY)
+    assert wind["title"] == "Batten Down the Decorations!"
+    assert wind["body"] == "High winds expected from 12:00 to 3:00, with gusts up to 22mph."
+    assert wind["data"]["date"] == "2024-03-01"
+    assert notification(alerts["rain-user"], TODAY)["body"] == "Chance of rain expected from 3:00 to 6:00, reaching 80%."
+    frost = notification(alerts["frost-user"], TODAY)
+    assert frost["body"] == "Temperatures of 19°F expected around 6:00."
+    assert (frost["data"]["startHour"], frost["data"]["endHour"]) == ("6:00", "7:00")
+
+
+def test_notification_for_winds_lasting_past_the_window():
+    reports = [
+        {"date": "2024-03-01", "hourly": [{"time": 1800, "windspeedMiles": 20}, {"time": 2100, "windspeedMiles": 25}]},
+        {"date": "2024-03-02", "hourly": [{"time": 0, "windspeedMiles": 16}]},
+    ]
+    subscription = Subscription(user_id="u", threshold=15)
+
+    [alert] = evaluate([subscription], {"18966": reports}, TODAY)
+
+    assert notification(alert, TODAY)["body"] == (
+        "High winds starting at 6:00 and continuing into tomorrow, with gusts up to 25mph."
+    )
+
+
+def test_job_fetches_once_per_location_and_notifies_matches(subscriptions, reports_by_location):
+    def fake_get(url, params, timeout):
+        response = MagicMock()
+        response.json.return_value = reports_by_location[params["location"]]
+        return response
+
+    with patch("alerter.get_subscriptions", return_value=subscriptions), \
+            patch("alerter.requests.get", side_effect=fake_get) as get, \
+            patch("alerter.deliver_alerts") as deliver, \
+            patch("alerter.datetime") as mock_datetime:
+        mock_datetime.now.return_value.date.return_value = TODAY
+        alerter.daily_weather_alert()
+
+    assert get.call_count == 2
+    assert sorted(call.kwargs["params"]["location"] for call in get.call_args_list) == ["10001", "18966"]
+    alerts, today, evaluated = deliver.call_args.args
+    assert [alert.subscription.user_id for alert in alerts] == ["wind-user", "rain-user", "frost-user"]
+    assert today == TODAY
+    assert evaluated == subscriptions
+
+
+def test_changes_re_evaluate_only_affected_subscriptions(subscriptions, reports_by_location):
+    index = SubscriptionIndex(subscriptions)
+
+    affected = index.affected({("18966", "2024-03-02")}, TODAY)
+    # The rain window ends at midnight, so a change to tomorrow cannot affect it
+    assert [s.user_id for s in affected] == ["wind-user", "calm-user"]
+    assert index.affected({("18966", "2024-02-29"), ("90210", "2024-03-01")}, TODAY) == []
+
+    def fake_get(url, params, timeout):
+        response = MagicMock()
+        response.json.return_value = reports_by_location[params["location"]]
+        return response
+
+    with patch("alerter.get_subscription_index", return_value=index), \
+            patch("alerter.requests.get", side_effect=fake_get) as get, \
+            patch("alerter.deliver_alerts") as deliver, \
+            patch("alerter.datetime") as mock_datetime:
+        mock_datetime.now.return_value.date.return_value = TODAY
+        alerter.evaluate_changes({("18966", "2024-03-02")})
+
+    assert [call.kwargs["params"]["location"] for call in get.call_args_list] == ["18966"]
+    alerts, _, evaluated = deliver.call_args.args
+    assert [alert.subscription.user_id for alert in alerts] == ["wind-user"]
+    assert [s.user_id for s in evaluated] == ["wind-user", "calm-user"]
+
+
+def test_signature_tracks_the_notified_span(subscriptions, reports_by_location):
+    [alert] = evaluate(subscriptions[:1], reports_by_location, TODAY)
+    assert alert.signature() == "2024-03-01T1200/2024-03-02T0300"
+
+    # A stronger gust inside the same span doesn't change the condition
+    reports_by_location["18966"][0]["hourly"][5]["windspeedMiles"] = 30
+    [stronger] = evaluate(subscriptions[:1], reports_by_location, TODAY)
+    assert stronger.signature() == alert.signature()
+
+    # Winds lasting to the end of the window now continue past it
+    reports_by_location["18966"][1]["hourly"][2]["windspeedMiles"] = 20
+    [longer] = evaluate(subscriptions[:1], reports_by_location, TODAY)
+    assert longer.signature() == "2024-03-01T1200/2024-03-02T0600+"
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+# Add the parent directory to the path so we can import the alerter modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from watch import ReportChangeWatcher
+
+STREAM = (
+    'id: e1-1\nevent: report\ndata: {"location": "18966", "date": "2024-03-01", "operation": "update"}\n\n'
+    'id: e1-2\nevent: report\ndata: {"location": "18966", "date": "2024-03-02", "operation": "update"}\n\n'
+    'id: e1-3\nevent: report\ndata: {"location": "18966", "date": "2024-03-01", "operation": "update"}\n\n'
+)
+
+
+def _watcher(stream, requests, calls):
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text=stream, headers={"Content-Type": "text/event-stream"})
+
+    return ReportChangeWatcher(
+        "http://api", calls.append, lambda: calls.append("reset"), debounce=0.01, reconnect_delay=0.01,
+        transport=httpx.MockTransport(handler),
+    )
+
+
+async def _run_briefly(watcher, seconds=0.1):
+    task = asyncio.create_task(watcher.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def test_watcher_collapses_a_burst_of_changes_and_resumes_from_last_event_id():
+    requests, calls = [], []
+    watcher = _watcher(STREAM, requests, calls)
+
+    await _run_briefly(watcher)
+
+    assert calls[0] == {("18966", "2024-03-01"), ("18966", "2024-03-02")}
+    assert "reset" not in calls
+    assert watcher.last_event_id == "e1-3"
+    assert "Last-Event-ID" not in requests[0].headers
+    assert requests[1].headers["Last-Event-ID"] == "e1-3"
+    assert requests[0].url.params["types"] == "report"
+
+
+async def test_reset_event_triggers_full_evaluation():
+    requests, calls = [], []
+    watcher = _watcher(STREAM + 'event: reset\ndata: {"reason": "unresumable"}\n\n', requests, calls)
+
+    await _run_briefly(watcher)
+
+    # The full evaluation replaces the changes collected before the reset
+    assert calls[0] == "reset"
+
+
+def test_watcher_built_outside_the_loop_keeps_evaluating_across_runs():
+    stream, calls = [""], []
+
+    def handler(request):
+        return httpx.Response(200, text=stream[0], headers={"Content-Type": "text/event-stream"})
+
+    # Built and reset before any loop runs, as watch_report_changes does
+    watcher = ReportChangeWatcher(
+        "http://api", calls.append, lambda: calls.append("reset"), debounce=0.01, reconnect_delay=0.01,
+        transport=httpx.MockTransport(handler),
+    )
+    watcher.reset()
+
+    asyncio.run(_run_briefly(watcher))
+    assert calls == ["reset"]
+
+    # Nothing it holds is tied to the first loop
+    stream[0] = STREAM
+    asyncio.run(_run_briefly(watcher, seconds=0.2))
+    assert calls[1] == {("18966", "2024-03-01"), ("18966", "2024-03-02")}
+    # Each reconnect replays the stream, and each replay is evaluated in turn
+    assert len(calls) > 2
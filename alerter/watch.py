@@ -0,0 +1,120 @@
+from typing import AsyncIterator, Callable, Iterable, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+
+import httpx
+
+
+async def read_events(lines: AsyncIterator[str]) -> AsyncIterator[dict]:
+    """
+    Parses a Server-Sent Events stream into {"id", "type", "data"} dicts.
+    """
+    event = {"id": None, "type": "message", "data": []}
+    async for line in lines:
+        if line == "":
+            if event["data"]:
+                yield {"id": event["id"], "type": event["type"], "data": json.loads("\n".join(event["data"]))}
+            event = {"id": None, "type": "message", "data": []}
+            continue
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "id":
+            event["id"] = value
+        elif field == "event":
+            event["type"] = value
+        elif field == "data":
+            event["data"].append(value)
+
+
+class ReportChangeWatcher:
+    """
+    Follows the API's report events and hands the changed (location, date)
+    pairs to `on_changes`. Changes are collected for `debounce` seconds
+    first, since a scrape upserts several dates per location in a burst.
+    When events may have been missed (an API restart, or the stream
+    reporting a reset) `on_reset` runs instead. Both callbacks are blocking
+    and run on a worker thread, one at a time. The watcher can be built and
+    fed before `run` starts its event loop.
+    """
+
+    def __init__(self, api_base_url: str, on_changes: Callable[[Set[Tuple[str, str]]], None],
+                 on_reset: Callable[[], None], debounce: float = 30, reconnect_delay: float = 5,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_base_url = api_base_url
+        self.on_changes = on_changes
+        self.on_reset = on_reset
+        self.debounce = debounce
+        self.reconnect_delay = reconnect_delay
+        self.transport = transport
+        self.last_event_id: Optional[str] = None
+        self._changes: Set[Tuple[str, str]] = set()
+        self._reset = False
+        # Created in run(), since on Python 3.9 an Event binds to whichever
+        # loop is current when it is constructed
+        self._pending: Optional[asyncio.Event] = None
+
+    def add(self, changes: Iterable[Tuple[str, str]]):
+        self._changes.update(changes)
+        self._wake()
+
+    def reset(self):
+        self._reset = True
+        self._changes.clear()
+        self._wake()
+
+    def _wake(self):
+        if self._pending is not None:
+            self._pending.set()
+
+    async def flush(self):
+        """
+        Runs the callback for everything collected so far.
+        """
+        if self._pending is not None:
+            self._pending.clear()
+        reset, changes = self._reset, self._changes
+        self._reset, self._changes = False, set()
+        try:
+            if reset:
+                await asyncio.to_thread(self.on_reset)
+            elif changes:
+                await asyncio.to_thread(self.on_changes, changes)
+        except Exception as e:
+            logging.error(f"Error evaluating report changes: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await self._pending.wait()
+            await asyncio.sleep(self.debounce)
+            await self.flush()
+
+    async def _consume(self, client: httpx.AsyncClient):
+        headers = {"Last-Event-ID": self.last_event_id} if self.last_event_id else {}
+        async with client.stream("GET", "/events", params={"types": "report"}, headers=headers) as response:
+            response.raise_for_status()
+            async for event in read_events(response.aiter_lines()):
+                if event["type"] == "reset":
+                    logging.warning("Report events may have been missed; re-evaluating every subscription.")
+                    self.reset()
+                elif event["type"] == "report":
+                    self.add([(event["data"]["location"], event["data"]["date"])])
+                if event["id"]:
+                    self.last_event_id = event["id"]
+
+    async def run(self):
+        self._pending = asyncio.Event()
+        if self._reset or self._changes:
+            self._pending.set()
+        flusher = asyncio.create_task(self._flush_loop())
+        timeout = httpx.Timeout(10, read=None)
+        try:
+            async with httpx.AsyncClient(base_url=self.api_base_url, timeout=timeout, transport=self.transport) as client:
+                while True:
+                    try:
+                        await self._consume(client)
+                    except httpx.HTTPError as e:
+                        logging.error(f"Report event stream failed: {e}")
+                    await asyncio.sleep(self.reconnect_delay)
+        finally:
+            flusher.cancel()
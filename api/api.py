@@ -1,15 +1,32 @@
-from fastapi import FastAPI, HTTPException, Request
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, OperationFailure, PyMongoError
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
-from datetime import datetime, date, timedelta
+from typing import Dict, List, NamedTuple, Optional
+from datetime import datetime, date, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+from itertools import islice
 from bson import ObjectId
+import asyncio
+import hashlib
+import orjson
 import os
+import random
+import threading
 import time
 import logging
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from models import Hourly
+from cache import TTLCache
+from events import EventHub, format_sse
+from encoding import CompressionMiddleware, compress, negotiate_encoding, render_report, wants_msgpack
+from metrics import DB_QUERY_DURATION, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, register_caches, register_gauge
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -17,29 +34,160 @@ app = FastAPI()
 app.add_middleware(ProxyHeadersMiddleware, trusted_hosts="192.168.65.1")
 
 @app.middleware("http")
-async def log_ip_address(request: Request, call_next):
+async def observe_request(request: Request, call_next):
     """
-    Middleware to log the client's IP address for each request.
+    Records per-route latency and in-flight requests. Only a sample of
+    requests (and every server error) is logged, as one structured line.
     """
-    timestamp = datetime.now()
-    client_ip = request.client.host
-    logging.info(request.headers.get('X-Forwarded-For'))
-    logging.info(f"{timestamp} = API: Request from Client IP: {client_ip}")
-    
-    # Continue processing the request
-    response = await call_next(request)
-    
-    return response
+    started = time.perf_counter()
+    scope_token = current_request_scope.set(request.scope)
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        current_request_scope.reset(scope_token)
+        duration = time.perf_counter() - started
+        route = route_template(request.scope)
+        HTTP_REQUEST_DURATION.labels(request.method, route, status_code).observe(duration)
+        if status_code >= 500 or random.random() < ACCESS_LOG_SAMPLE_RATE:
+            logging.info(
+                f"API: request method={request.method} route={route} status={status_code} "
+                f"duration_ms={duration * 1000:.1f} client_ip={request.client.host if request.client else None} "
+                f"forwarded_for={request.headers.get('X-Forwarded-For')}"
+            )
 
 # --- Configuration ---
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
 DB_NAME = "weather_db"
 HOURLY_REPORTS_COLLECTION_NAME = "hourly_reports"
 ATTEMPTS_COLLECTION_NAME = "attempts"
+FORECAST_HISTORY_COLLECTION_NAME = "forecast_history"
+ATTEMPT_SUMMARIES_COLLECTION_NAME = "attempt_summaries"
+# Location served when a request doesn't name one
+DEFAULT_LOCATION = os.getenv("DEFAULT_LOCATION", "18966")
+# Fraction of requests written to the access log; server errors are always logged
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.01"))
+
+# Connection pool sizing. pymongo is synchronous, so every query runs on a
+# worker thread; DB_EXECUTOR_WORKERS bounds how many queries can be in flight
+# at once and defaults to the size of the connection pool.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(MONGO_MAX_POOL_SIZE)))
+
+# Weather report response cache. Reports change at most once per hourly
+# scrape, so entries for today and later expire on that cadence while past
+# dates are kept much longer.
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "512"))
+REPORT_CACHE_RECENT_TTL_SECONDS = int(os.getenv("REPORT_CACHE_RECENT_TTL_SECONDS", "3600"))
+REPORT_CACHE_PAST_TTL_SECONDS = int(os.getenv("REPORT_CACHE_PAST_TTL_SECONDS", str(24 * 3600)))
+
+report_cache = TTLCache(maxsize=REPORT_CACHE_MAX_ENTRIES, default_ttl=REPORT_CACHE_RECENT_TTL_SECONDS)
+
+# Memoized /weather/stats, /weather/summary and /weather/hours results
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "256"))
+
+stats_cache = TTLCache(maxsize=STATS_CACHE_MAX_ENTRIES, default_ttl=REPORT_CACHE_RECENT_TTL_SECONDS)
+
+register_caches({"report": report_cache, "stats": stats_cache})
+
+# Cache-miss lookups in flight, per report key: [lookups, evictions seen].
+# Evicting a report while it is being read bumps its count (clearing the cache
+# bumps the epoch), so the lookup does not cache what it read before the
+# eviction. Entries are dropped with their last lookup.
+report_lookups: Dict[tuple, list] = {}
+report_cache_epoch = 0
+
+# Push-based invalidation. When MongoDB runs as a replica set, a change stream
+# on hourly_reports evicts cached reports as soon as the scraper upserts them.
+# On a standalone mongod the watcher gives up and the TTLs above apply. The
+# same stream also feeds /events.
+CHANGE_STREAM_ENABLED = os.getenv("CHANGE_STREAM_ENABLED", "true").lower() == "true"
+CHANGE_STREAM_RETRY_SECONDS = int(os.getenv("CHANGE_STREAM_RETRY_SECONDS", "5"))
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573}  # "$changeStream is only supported on replica sets"
+CHANGE_STREAM_HISTORY_LOST_CODES = {136, 280, 286}
+
+# Live events (/events). One database tail feeds every subscriber: the change
+# stream above, or, when it is unavailable, a poller that only runs while
+# someone is subscribed. The last EVENTS_BUFFER_SIZE events are kept so
+# clients can resume with Last-Event-ID.
+EVENT_TYPES = ("attempt", "report")
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "1000"))
+EVENTS_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENTS_SUBSCRIBER_QUEUE_SIZE", "500"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "5"))
+EVENTS_POLL_BATCH_SIZE = 500
+
+# Date-range streaming. Documents are pulled from the cursor in batches so
+# memory stays flat no matter how long the requested range is.
+RANGE_BATCH_SIZE = int(os.getenv("RANGE_BATCH_SIZE", "50"))
+RANGE_MAX_PAGE_SIZE = int(os.getenv("RANGE_MAX_PAGE_SIZE", "366"))
+
+# Compact projections for clients (such as the MCP tools) that don't need
+# whole reports. Summaries cover these hourly metrics unless others are asked for.
+SUMMARY_METRICS = [
+    metric.strip()
+    for metric in os.getenv(
+        "SUMMARY_METRICS", "tempF,FeelsLikeF,windspeedMiles,WindGustMiles,chanceofrain,precipInches,humidity,cloudcover,uvIndex"
+    ).split(",")
+    if metric.strip()
+]
+SUMMARY_MAX_DAYS = int(os.getenv("SUMMARY_MAX_DAYS", "31"))
+HOURS_MAX_ROWS = int(os.getenv("HOURS_MAX_ROWS", "2000"))
+HOURS_OPERATORS = {">=": "$gte", ">": "$gt", "<=": "$lte", "<": "$lt", "==": "$eq"}
+
+# /logs pages are walked newest first with a keyset cursor on
+# (timestamp_utc, _id), so every page is one bounded index scan
+LOGS_DEFAULT_PAGE_SIZE = 100
+LOGS_MAX_PAGE_SIZE = int(os.getenv("LOGS_MAX_PAGE_SIZE", "1000"))
+
+# Reports at this schema_version were written by the current scraper with
+# typed metrics, so they are serialized straight from the document without
+# re-validating them through WeatherReport.
+TYPED_SCHEMA_VERSION = 2
+
+# Part of every report ETag; bump it when the response body format changes
+# so clients holding an old representation refetch it.
+REPORT_REPRESENTATION_VERSION = 3
+
+# Negotiated response compression (brotli preferred, then gzip). Responses
+# smaller than COMPRESSION_MIN_BYTES go out as they are. Single-day reports
+# are compressed once per cached entry; everything else on the fly.
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "500"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_BYTES,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+)
+
+cache_invalidation_mode = "ttl"
+change_watcher_stop = threading.Event()
+change_watcher_thread: Optional[threading.Thread] = None
+
+event_hub = EventHub(buffer_size=EVENTS_BUFFER_SIZE, queue_size=EVENTS_SUBSCRIBER_QUEUE_SIZE)
+register_gauge("api_event_subscribers", "Clients connected to /events.", lambda: len(event_hub))
+event_poller_task: Optional[asyncio.Task] = None
 
 # MongoDB client instance
 mongo_client_instance: Optional[MongoClient] = None
 
+# Thread pool used to keep blocking pymongo calls off the event loop
+db_executor: Optional[ThreadPoolExecutor] = None
+
+# The ASGI scope of the request being handled, so DB timings can be
+# attributed to its route. Routing fills in scope["route"] in place.
+current_request_scope: ContextVar[Optional[dict]] = ContextVar("current_request_scope", default=None)
+
 def get_mongo_client() -> MongoClient:
     """
     Establishes a connection to MongoDB with retry logic.
@@ -51,7 +199,12 @@ def get_mongo_client() -> MongoClient:
     retries = 5
     while retries > 0:
         try:
-            client = MongoClient(MONGO_URI)
+            client = MongoClient(
+                MONGO_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            )
             client.admin.command('ismaster')
             logging.info("API: Successfully connected to MongoDB.")
             mongo_client_instance = client
@@ -62,36 +215,367 @@ def get_mongo_client() -> MongoClient:
             time.sleep(5)
     raise ConnectionFailure("API: Failed to connect to MongoDB after several retries.")
 
+def get_db_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded thread pool used for MongoDB calls, creating it on first use.
+    """
+    global db_executor
+    if db_executor is None:
+        db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+    return db_executor
+
+async def run_db(func, *args, **kwargs):
+    """
+    Runs a blocking pymongo call on the DB thread pool so the event loop can
+    keep serving other requests while the query is in flight.
+    """
+    loop = asyncio.get_running_loop()
+    scope = current_request_scope.get()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(get_db_executor(), partial(func, *args, **kwargs))
+    finally:
+        route = route_template(scope) if scope is not None else "background"
+        DB_QUERY_DURATION.labels(route).observe(time.perf_counter() - started)
+
+def route_template(scope: dict) -> str:
+    """
+    The matched route's path template (e.g. /weather/{date_str}), which keeps
+    metric label values bounded no matter what paths clients request.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def _drop_legacy_date_index(collection):
+    """
+    Reports used to be unique per date. With several locations they are
+    unique per (location, date), so the old index has to go.
+    """
+    if "date_1" not in collection.index_information():
+        return
+    try:
+        collection.drop_index("date_1")
+        logging.info("API: Dropped legacy unique index on hourly_reports.date.")
+    except OperationFailure as e:
+        if e.code != 27:  # IndexNotFound: the scraper dropped it first
+            raise
+
+def ensure_indexes(db):
+    """
+    Creates the indexes the hot queries rely on. Idempotent, so it is safe to
+    run on every startup; the scraper runs the same step.
+    """
+    _drop_legacy_date_index(db[HOURLY_REPORTS_COLLECTION_NAME])
+    db[HOURLY_REPORTS_COLLECTION_NAME].create_index([("location", ASCENDING), ("date", ASCENDING)], unique=True)
+    db[HOURLY_REPORTS_COLLECTION_NAME].create_index([("timestamp_recorded_utc", ASCENDING)])
+    # The scraper owns this index's TTL (attempt retention), so only create it
+    # when it is missing rather than fight over its options
+    if "timestamp_utc_-1" not in db[ATTEMPTS_COLLECTION_NAME].index_information():
+        try:
+            db[ATTEMPTS_COLLECTION_NAME].create_index([("timestamp_utc", DESCENDING)])
+        except OperationFailure as e:
+            if e.code not in (85, 86):  # IndexOptionsConflict / IndexKeySpecsConflict: the scraper won
+                raise
+    db[ATTEMPTS_COLLECTION_NAME].create_index([("timestamp_utc", DESCENDING), ("_id", DESCENDING)])
+    db[ATTEMPT_SUMMARIES_COLLECTION_NAME].create_index([("date", ASCENDING), ("location", ASCENDING)], unique=True)
+    db[FORECAST_HISTORY_COLLECTION_NAME].create_index([("location", ASCENDING), ("date", ASCENDING)], unique=True)
+    db[FORECAST_HISTORY_COLLECTION_NAME].create_index([("expire_at", ASCENDING)], expireAfterSeconds=0)
+    logging.info("API: MongoDB indexes are in place.")
+
+def _plan_stages(plan: dict):
+    """
+    Yields every stage name in an explain() plan tree.
+    """
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+def verify_query_plans(db) -> List[str]:
+    """
+    Runs explain() on the API's hot queries and logs a warning for any that
+    would fall back to a collection scan. Returns the names of those queries.
+    """
+    hot_queries = {
+        "hourly_reports by location and date": db[HOURLY_REPORTS_COLLECTION_NAME].find(
+            {"location": DEFAULT_LOCATION, "date": date.today().strftime("%Y-%m-%d")}
+        ).limit(1),
+        "attempts by newest timestamp": db[ATTEMPTS_COLLECTION_NAME].find().sort(ATTEMPTS_PAGE_SORT).limit(LOGS_DEFAULT_PAGE_SIZE),
+    }
+    collscans = []
+    for name, cursor in hot_queries.items():
+        winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in set(_plan_stages(winning_plan)):
+            logging.warning(f"API: Query '{name}' is using a COLLSCAN; check the MongoDB indexes.")
+            collscans.append(name)
+    return collscans
+
+def bootstrap_indexes():
+    """
+    Creates indexes and checks the hot query plans. Failures are logged rather
+    than raised so a missing index never keeps the API from serving.
+    """
+    db = get_mongo_client()[DB_NAME]
+    try:
+        ensure_indexes(db)
+        verify_query_plans(db)
+    except OperationFailure as e:
+        logging.error(f"API: Index bootstrap failed: {e}")
+
+def _changed_report_key(change: dict) -> Optional[tuple]:
+    """
+    Returns the (location, date) cache key a change stream event refers to,
+    or None if it cannot be determined (e.g. a delete, which only carries the _id).
+    """
+    document = change.get("fullDocument") or {}
+    if "date" not in document:
+        return None
+    return (document.get("location", DEFAULT_LOCATION), document["date"])
+
+def begin_report_lookup(report_key: tuple) -> tuple:
+    entry = report_lookups.setdefault(report_key, [0, 0])
+    entry[0] += 1
+    return (report_cache_epoch, entry[1])
+
+def end_report_lookup(report_key: tuple, started: tuple) -> bool:
+    """
+    Returns True when the report was not evicted since begin_report_lookup,
+    i.e. what the lookup read can be cached.
+    """
+    entry = report_lookups[report_key]
+    unchanged = (report_cache_epoch, entry[1]) == started
+    entry[0] -= 1
+    if entry[0] == 0:
+        del report_lookups[report_key]
+    return unchanged
+
+def invalidate_all():
+    """
+    Drops every cached report and memoized stats result.
+    """
+    global report_cache_epoch
+    report_cache_epoch += 1
+    report_cache.clear()
+    stats_cache.clear()
+
+def invalidate_report(report_key: Optional[tuple]):
+    """
+    Evicts one cached report, or the whole cache when the key is unknown.
+    Memoized stats are always dropped.
+    """
+    if report_key is None:
+        invalidate_all()
+        return
+    if report_key in report_lookups:
+        report_lookups[report_key][1] += 1
+    report_cache.pop(report_key)
+    # Any changed day can fall inside a memoized stats range
+    stats_cache.clear()
+
+def attempt_event(attempt: dict) -> dict:
+    return AttemptLog.model_validate(attempt).model_dump(mode="json", by_alias=True)
+
+def report_event(report: dict, operation: str) -> dict:
+    """
+    Report events only say which report changed; clients fetch it if they care.
+    """
+    recorded_at = _recorded_at(report)
+    return {
+        "location": report.get("location", DEFAULT_LOCATION),
+        "date": report["date"],
+        "timestamp_recorded_utc": recorded_at.isoformat() if recorded_at else None,
+        "operation": operation,
+    }
+
+def handle_change(change: dict):
+    """
+    Applies one change stream event on the event loop: evicts the cached
+    report and publishes the matching live event.
+    """
+    collection = change.get("ns", {}).get("coll")
+    document = change.get("fullDocument")
+    if collection == ATTEMPTS_COLLECTION_NAME:
+        if change.get("operationType") == "insert" and document:
+            event_hub.publish("attempt", attempt_event(document))
+        return
+    report_key = _changed_report_key(change)
+    invalidate_report(report_key)
+    if report_key is not None:
+        event_hub.publish("report", report_event(document, change.get("operationType")))
+
+def watch_database_changes(loop: asyncio.AbstractEventLoop):
+    """
+    Tails a single change stream on hourly_reports and attempts and hands
+    each event to handle_change on the event loop. Runs in a daemon thread
+    because pymongo blocks. Returns when change streams are not supported,
+    leaving TTL expiry and the event poller in charge.
+    """
+    global cache_invalidation_mode
+    db = get_mongo_client()[DB_NAME]
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": [HOURLY_REPORTS_COLLECTION_NAME, ATTEMPTS_COLLECTION_NAME]},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+    }}]
+    resume_token = None
+    while not change_watcher_stop.is_set():
+        try:
+            with db.watch(pipeline, full_document="updateLookup", resume_after=resume_token, max_await_time_ms=1000) as stream:
+                cache_invalidation_mode = "change_stream"
+                logging.info("API: Watching hourly_reports and attempts for changes; cache invalidation is push-based.")
+                while not change_watcher_stop.is_set() and stream.alive:
+                    change = stream.try_next()
+                    resume_token = stream.resume_token
+                    if change is not None:
+                        loop.call_soon_threadsafe(handle_change, change)
+        except OperationFailure as e:
+            if e.code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                cache_invalidation_mode = "ttl"
+                logging.warning(f"API: Change streams are not available ({e}); falling back to TTL cache expiry.")
+                return
+            if e.code in CHANGE_STREAM_HISTORY_LOST_CODES:
+                # Events were missed while we were away, so nothing cached can be trusted
+                resume_token = None
+                loop.call_soon_threadsafe(invalidate_all)
+            cache_invalidation_mode = "ttl"
+            logging.error(f"API: Change stream failed: {e}. Retrying in {CHANGE_STREAM_RETRY_SECONDS} seconds...")
+            change_watcher_stop.wait(CHANGE_STREAM_RETRY_SECONDS)
+        except PyMongoError as e:
+            cache_invalidation_mode = "ttl"
+            logging.error(f"API: Change stream interrupted: {e}. Retrying in {CHANGE_STREAM_RETRY_SECONDS} seconds...")
+            change_watcher_stop.wait(CHANGE_STREAM_RETRY_SECONDS)
+    cache_invalidation_mode = "ttl"
+
+def start_change_watcher():
+    """
+    Starts the change stream watcher thread if it is enabled and not running.
+    """
+    global change_watcher_thread
+    if not CHANGE_STREAM_ENABLED or (change_watcher_thread and change_watcher_thread.is_alive()):
+        return
+    change_watcher_stop.clear()
+    change_watcher_thread = threading.Thread(
+        target=watch_database_changes, args=(asyncio.get_running_loop(),), name="change-watcher", daemon=True
+    )
+    change_watcher_thread.start()
+
+def _poll_watermark(collection, field: str) -> tuple:
+    """
+    The (value, _ids at that value) of the newest document, so polling
+    starts after everything that already exists.
+    """
+    newest = collection.find_one({}, {field: 1}, sort=[(field, DESCENDING)])
+    if not newest:
+        return (datetime.utcnow(), set())
+    at_newest = collection.find({field: newest[field]}, {"_id": 1})
+    return (newest[field], {document["_id"] for document in at_newest})
+
+def _poll_new_documents(collection, field: str, watermark: tuple, projection: Optional[dict] = None) -> tuple:
+    """
+    Returns documents whose `field` is at or after the watermark and haven't
+    been seen yet, oldest first, plus the advanced watermark. Remembering
+    the _ids at the watermark value catches documents that share a
+    timestamp but became visible in different polls.
+    """
+    since, seen = watermark
+    documents = list(collection.find({field: {"$gte": since}}, projection).sort(field, ASCENDING).limit(EVENTS_POLL_BATCH_SIZE))
+    fresh = [document for document in documents if not (document[field] == since and document["_id"] in seen)]
+    if documents:
+        newest = documents[-1][field]
+        at_newest = {document["_id"] for document in documents if document[field] == newest}
+        seen = seen | at_newest if newest == since else at_newest
+        since = newest
+    return fresh, (since, seen)
+
+async def poll_events():
+    """
+    Publishes new attempts and report upserts by polling when there is no
+    change stream. Runs as one task for the whole process and only queries
+    MongoDB while /events has subscribers.
+    """
+    watermarks = None
+    while True:
+        await asyncio.sleep(EVENTS_POLL_SECONDS)
+        if cache_invalidation_mode == "change_stream" or not len(event_hub):
+            watermarks = None
+            continue
+        try:
+            client = await run_db(get_mongo_client)
+            attempts = client[DB_NAME][ATTEMPTS_COLLECTION_NAME]
+            reports = client[DB_NAME][HOURLY_REPORTS_COLLECTION_NAME]
+            if watermarks is None:
+                watermarks = (
+                    await run_db(_poll_watermark, attempts, "timestamp_utc"),
+                    await run_db(_poll_watermark, reports, "timestamp_recorded_utc"),
+                )
+                continue
+            new_attempts, attempts_mark = await run_db(_poll_new_documents, attempts, "timestamp_utc", watermarks[0])
+            new_reports, reports_mark = await run_db(
+                _poll_new_documents, reports, "timestamp_recorded_utc", watermarks[1],
+                {"location": 1, "date": 1, "timestamp_recorded_utc": 1},
+            )
+            watermarks = (attempts_mark, reports_mark)
+            for attempt in new_attempts:
+                event_hub.publish("attempt", attempt_event(attempt))
+            for report in new_reports:
+                event_hub.publish("report", report_event(report, "upsert"))
+        except PyMongoError as e:
+            logging.error(f"API: Polling for live events failed: {e}")
+
+def start_event_poller():
+    global event_poller_task
+    if event_poller_task is None or event_poller_task.done():
+        event_poller_task = asyncio.get_running_loop().create_task(poll_events())
+
 @app.on_event("startup")
 async def startup_db_client():
     """
     Connects to MongoDB on FastAPI startup.
     """
     try:
-        get_mongo_client()
+        await run_db(get_mongo_client)
     except ConnectionFailure as e:
         logging.error(f"API: Startup failed due to MongoDB connection issue: {e}")
         raise
+    await run_db(bootstrap_indexes)
+    start_change_watcher()
+    start_event_poller()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """
     Closes the MongoDB connection on FastAPI shutdown.
     """
-    global mongo_client_instance
+    global mongo_client_instance, db_executor
+    change_watcher_stop.set()
+    if event_poller_task:
+        event_poller_task.cancel()
     if mongo_client_instance:
         mongo_client_instance.close()
         logging.info("API: MongoDB connection closed.")
+    if db_executor:
+        db_executor.shutdown(wait=False)
+        db_executor = None
 
 # Pydantic models for response data validation and serialization
 
 class AttemptLog(BaseModel):
     id: str = Field(alias="_id")
+    location: Optional[str] = None
     attempt_number: int
     timestamp_utc: datetime
     success: bool
     status_code: Optional[int]
     error: Optional[str]
+    # Seconds the scraper waited before retrying, None if it didn't retry
+    delay_seconds: Optional[float] = None
+    # "updated" or "not_modified" for successful fetches
+    outcome: Optional[str] = None
+    # Time spent waiting on the upstream, None if no request was sent
+    duration_ms: Optional[float] = None
 
     class Config:
         validate_by_name = True
@@ -106,11 +590,28 @@ class AttemptLog(BaseModel):
             return str(v)
         return v
 
+# Fields /logs can project, by their stored name
+ATTEMPT_LOG_FIELDS = sorted(field.alias or name for name, field in AttemptLog.model_fields.items() if name != "id")
+ATTEMPTS_PAGE_SORT = [("timestamp_utc", DESCENDING), ("_id", DESCENDING)]
+
+class AttemptSummary(BaseModel):
+    date: str
+    location: str
+    attempts: int
+    successes: int
+    failures: int
+    not_modified: int
+    avg_duration_ms: Optional[float] = None
+    max_duration_ms: Optional[float] = None
+
 class WeatherReport(BaseModel):
     id: str = Field(alias="_id")
+    location: Optional[str] = None
     date: str
     hourly: List[Hourly]
     timestamp_recorded_utc: datetime
+    # 2 = numeric metrics stored as numbers; None for reports written before versioning
+    schema_version: Optional[int] = None
 
     class Config:
         validate_by_name = True
@@ -125,6 +626,62 @@ class WeatherReport(BaseModel):
             return str(v)
         return v
 
+class ForecastSnapshot(BaseModel):
+    location: str
+    date: str
+    recorded_utc: datetime
+    hourly: List[Hourly]
+
+class StatsBucket(BaseModel):
+    period: str
+    first_date: str
+    last_date: str
+    hours: int
+    min: Optional[float]
+    max: Optional[float]
+    avg: Optional[float]
+    exceedances: Optional[int] = None
+
+class WeatherStats(BaseModel):
+    location: str
+    metric: str
+    group_by: str
+    start: str
+    end: str
+    threshold: Optional[float]
+    buckets: List[StatsBucket]
+
+class MetricSummary(BaseModel):
+    min: Optional[float]
+    max: Optional[float]
+    avg: Optional[float]
+
+class DailySummary(BaseModel):
+    date: str
+    location: str
+    hours: int
+    metrics: Dict[str, MetricSummary]
+
+class HourValue(BaseModel):
+    date: str
+    time: Optional[int]
+    value: Optional[float]
+
+class HourlyValues(BaseModel):
+    location: str
+    metric: str
+    start: str
+    end: str
+    op: Optional[str] = None
+    value: Optional[float] = None
+    hours: List[HourValue]
+    truncated: bool = False
+
+# Hourly metrics that can be aggregated, by their stored (wttr.in) key
+STATS_METRICS = sorted(
+    field.alias or name for name, field in Hourly.model_fields.items() if field.annotation in (int, float)
+)
+
 @app.get("/health")
 async def health_check():
     """
@@ -132,54 +689,715 @@ async def health_check():
     Checks MongoDB connection.
     """
     try:
-        client = get_mongo_client()
-        client.admin.command('ismaster') # Check if MongoDB is reachable
+        client = await run_db(get_mongo_client)
+        await run_db(client.admin.command, 'ismaster') # Check if MongoDB is reachable
         return {"status": "healthy", "database": "reachable"}
     except ConnectionFailure:
         raise HTTPException(status_code=500, detail="Database connection failed")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Hit/miss/eviction counters for the weather report cache, plus whether
+    entries are being invalidated by a change stream or only by TTL.
+    """
+    return {**report_cache.stats(), "invalidation": cache_invalidation_mode}
+
+async def _event_stream(request: Request, subscriber, resumed: bool):
+    """
+    Yields one subscriber's events as SSE messages, with a comment line as a
+    heartbeat while idle. A "reset" event (with no id) tells the client that
+    events were missed and it should refetch what it shows.
+    """
+    try:
+        if not resumed:
+            yield format_sse({"type": "reset", "data": {"reason": "resume point not available"}})
+        while True:
+            if subscriber.lagged and subscriber.queue.empty():
+                yield format_sse({"type": "reset", "data": {"reason": "subscriber fell behind"}})
+                return
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield b": keepalive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+@app.get("/events")
+async def stream_events(
+    request: Request,
+    types: Optional[str] = Query(None, description="Comma-separated event types: attempt, report. Defaults to both."),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events stream of new scrape attempts ("attempt") and report
+    upserts ("report"). Every subscriber shares one database tail. Reconnect
+    with the Last-Event-ID header to resume where the stream left off.
+    """
+    requested = [event_type.strip() for event_type in types.split(",") if event_type.strip()] if types else None
+    if requested and not set(requested) <= set(EVENT_TYPES):
+        raise HTTPException(status_code=400, detail=f"Unknown event type. Choose from: {', '.join(EVENT_TYPES)}.")
+    subscriber, resumed = event_hub.subscribe(requested, last_event_id)
+    return StreamingResponse(
+        _event_stream(request, subscriber, resumed),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Prometheus metrics: per-route latency, in-flight requests, DB query
+    timing, cache counters and /events subscribers.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/events/stats")
+async def get_event_stats():
+    """
+    Subscriber and throughput counters for /events.
+    """
+    return event_hub.stats()
+
 @app.get("/")
 async def read_root():
     return {"message": "Weather Data API."}
 
 @app.get("/weather/latest", response_model=WeatherReport)
-async def get_latest_report():
+async def get_latest_report(request: Request, location: str = DEFAULT_LOCATION, format: str = Query("json", pattern="^(json|columnar)$")):
     """
     Retrieve the most recent weather report (today's report).
     """
-    return await get_report_by_date("today")
+    return await get_report_by_date("today", request, location, format)
 
 
-@app.get("/weather/{date_str}", response_model=WeatherReport)
-async def get_report_by_date(date_str: str):
+def resolve_report_date(date_str: str) -> date:
     """
-    Retrieve a weather report for a specific date.
-    Also accepts keywords: "today", "tomorrow", "yesterday".
+    Resolves a YYYY-MM-DD string or one of the keywords "today", "tomorrow",
+    "yesterday" to a date. Raises a 400 for anything else.
     """
+    if date_str == "today":
+        return date.today()
+    if date_str == "tomorrow":
+        return date.today() + timedelta(days=1)
+    if date_str == "yesterday":
+        return date.today() - timedelta(days=1)
     try:
-        target_date = None
-        if date_str == "today":
-            target_date = date.today()
-        elif date_str == "tomorrow":
-            target_date = date.today() + timedelta(days=1)
-        elif date_str == "yesterday":
-            target_date = date.today() - timedelta(days=1)
-        else:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD or keywords: today, tomorrow, yesterday.")
+
+def naive_utc(value: datetime) -> datetime:
+    """
+    Converts a query datetime to the naive UTC form pymongo stores. Naive
+    input is taken to be UTC already.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+# Stored keys of an Hourly entry, in the order WeatherReport serializes them
+HOURLY_KEYS = tuple(field.alias or name for name, field in Hourly.model_fields.items())
+HOURLY_VALUE_LIST_KEYS = frozenset(("weatherDesc", "weatherIconUrl"))
+
+def _fast_hourly(hour: dict) -> dict:
+    """
+    The scraper stores wttr.in's hourly entries as they come, which is
+    exactly Hourly's keys in the same (sorted) order, so those are emitted
+    untouched. Anything else is narrowed down to Hourly's keys.
+    """
+    if tuple(hour) == HOURLY_KEYS:
+        return hour
+    return {
+        key: [{"value": item["value"]} for item in hour[key]] if key in HOURLY_VALUE_LIST_KEYS else hour[key]
+        for key in HOURLY_KEYS
+    }
+
+def _fast_report(report: dict) -> dict:
+    """
+    Builds the WeatherReport shape straight from a typed document. Raises
+    KeyError or TypeError when the document doesn't have that shape.
+    """
+    return {
+        "_id": str(report["_id"]),
+        "location": report.get("location"),
+        "date": report["date"],
+        "hourly": [_fast_hourly(hour) for hour in report["hourly"]],
+        "timestamp_recorded_utc": report["timestamp_recorded_utc"],
+        "schema_version": report["schema_version"],
+    }
+
+def serialize_report(report: dict) -> bytes:
+    """
+    Serializes a hourly_reports document to the WeatherReport JSON shape.
+    Typed documents take the orjson fast path; anything older, or anything
+    that doesn't fit, is validated and coerced by WeatherReport.
+    """
+    if report.get("schema_version") == TYPED_SCHEMA_VERSION and isinstance(report.get("timestamp_recorded_utc"), datetime):
+        try:
+            return orjson.dumps(_fast_report(report))
+        except (KeyError, TypeError):
+            pass
+    return WeatherReport.model_validate(report).model_dump_json(by_alias=True).encode()
+
+class CachedReport(NamedTuple):
+    body: bytes
+    etag: str
+    last_modified: Optional[datetime]
+    # Other representations of body, built on first request:
+    # {(columnar, msgpack, content encoding): bytes}
+    variants: dict
+
+class ReportVariant(NamedTuple):
+    columnar: bool
+    msgpack: bool
+    encoding: Optional[str]
+
+    @classmethod
+    def negotiate(cls, request: Request, format: str) -> "ReportVariant":
+        return cls(
+            format == "columnar",
+            wants_msgpack(request.headers.get("accept")),
+            negotiate_encoding(request.headers.get("accept-encoding")),
+        )
+
+    def etag(self, etag: str) -> str:
+        """
+        Each representation and content coding gets its own strong ETag.
+        """
+        suffix = "".join(f"-{part}" for part in (
+            "columnar" if self.columnar else None, "msgpack" if self.msgpack else None, self.encoding
+        ) if part)
+        return etag[:-1] + suffix + '"'
+
+    @property
+    def media_type(self) -> str:
+        return MSGPACK_MEDIA_TYPE if self.msgpack else "application/json"
+
+def report_variant_body(cached: CachedReport, variant: ReportVariant) -> bytes:
+    body = cached.variants.get(variant)
+    if body is None:
+        body = render_report(cached.body, variant.columnar, variant.msgpack)
+        body = compress(body, variant.encoding, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY)
+        cached.variants[variant] = body
+    return body
+
+def _recorded_at(report: dict) -> Optional[datetime]:
+    """
+    Returns the report's timestamp_recorded_utc as an aware UTC datetime.
+    """
+    recorded = report.get("timestamp_recorded_utc")
+    if isinstance(recorded, str):
+        recorded = datetime.fromisoformat(recorded)
+    if not isinstance(recorded, datetime):
+        return None
+    if recorded.tzinfo is None:
+        recorded = recorded.replace(tzinfo=timezone.utc)
+    return recorded.astimezone(timezone.utc)
+
+def report_etag(report: dict, recorded_at: Optional[datetime]) -> str:
+    """
+    Builds a strong ETag from the document id and the time the scraper
+    recorded it, which changes on every upsert. Bump
+    REPORT_REPRESENTATION_VERSION whenever the response body format changes.
+    """
+    source = f"{REPORT_REPRESENTATION_VERSION}|{report.get('_id')}|{recorded_at.isoformat() if recorded_at else ''}"
+    return '"' + hashlib.blake2b(source.encode(), digest_size=12).hexdigest() + '"'
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Evaluates If-None-Match, falling back to If-Modified-Since when no ETag
+    was sent, as described in RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+def report_cache_headers(target_date: date, etag: str, last_modified: Optional[datetime]) -> dict:
+    """
+    Validator and Cache-Control headers for a report response. Reports for
+    today and later change every scrape, so clients must revalidate them;
+    past reports are effectively immutable.
+    """
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if target_date < date.today():
+        headers["Cache-Control"] = f"public, max-age={REPORT_CACHE_PAST_TTL_SECONDS}"
+    else:
+        headers["Cache-Control"] = "public, no-cache"
+    return headers
+
+def report_cache_ttl(target_date: date) -> float:
+    """
+    Past reports no longer change, so they can stay cached for a long time.
+    Today's and future reports are rewritten by every scrape.
+    """
+    if target_date < date.today():
+        return REPORT_CACHE_PAST_TTL_SECONDS
+    return REPORT_CACHE_RECENT_TTL_SECONDS
+
+def _next_batch(cursor) -> list:
+    return list(islice(cursor, RANGE_BATCH_SIZE))
+
+async def _stream_reports(cursor, first_batch: list, fmt: str, use_msgpack: bool = False):
+    """
+    Yields serialized reports batch by batch: as NDJSON lines, as the pieces
+    of a single JSON array (rows or columnar), or as back-to-back
+    MessagePack objects.
+    """
+    columnar = fmt == "columnar"
+    as_array = fmt != "ndjson" and not use_msgpack
+    terminator = b"\n" if fmt == "ndjson" and not use_msgpack else b""
+    try:
+        if as_array:
+            yield b"["
+        batch = first_batch
+        separator = b""
+        while batch:
+            bodies = [render_report(serialize_report(doc), columnar, use_msgpack) for doc in batch]
+            if as_array:
+                chunk = separator + b",".join(bodies)
+                separator = b","
+            else:
+                chunk = b"".join(body + terminator for body in bodies)
+            yield chunk
+            if len(batch) < RANGE_BATCH_SIZE:
+                break
+            batch = await run_db(_next_batch, cursor)
+        if as_array:
+            yield b"]"
+    finally:
+        await run_db(cursor.close)
+
+def build_stats_pipeline(location: str, start_date: str, end_date: str, metric: str, group_by: str, threshold: Optional[float]) -> list:
+    """
+    Builds the aggregation that unwinds each report's hourly entries and
+    groups them per day or per ISO week. Values are converted with $convert
+    so reports stored before the typed schema are aggregated as well.
+    """
+    if group_by == "week":
+        period = {"$dateToString": {
+            "format": "%G-W%V",
+            "date": {"$dateFromString": {"dateString": "$date", "format": "%Y-%m-%d"}},
+        }}
+    else:
+        period = "$date"
+    group = {
+        "_id": "$period",
+        "first_date": {"$min": "$date"},
+        "last_date": {"$max": "$date"},
+        "hours": {"$sum": 1},
+        "min": {"$min": "$value"},
+        "max": {"$max": "$value"},
+        "avg": {"$avg": "$value"},
+    }
+    if threshold is not None:
+        group["exceedances"] = {"$sum": {"$cond": [{"$gte": ["$value", threshold]}, 1, 0]}}
+    return [
+        {"$match": {"location": location, "date": {"$gte": start_date, "$lte": end_date}}},
+        {"$project": {"_id": 0, "date": 1, f"hourly.{metric}": 1}},
+        {"$unwind": "$hourly"},
+        {"$project": {
+            "date": 1,
+            "period": period,
+            "value": {"$convert": {"input": f"$hourly.{metric}", "to": "double", "onError": None, "onNull": None}},
+        }},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+    ]
+
+@app.get("/weather/stats", response_model=WeatherStats)
+async def get_weather_stats(
+    start: str,
+    end: str,
+    metric: str = Query(..., description="Hourly metric to aggregate, e.g. windspeedMiles or tempF."),
+    threshold: Optional[float] = Query(None, description="Also count hours where the metric is at or above this value."),
+    group_by: str = Query("day", pattern="^(day|week)$"),
+    location: str = DEFAULT_LOCATION,
+):
+    """
+    Min/max/avg of an hourly metric per day or ISO week over a date range,
+    computed in MongoDB. Results are memoized per (range, metric, threshold,
+    grouping) and dropped whenever a report changes.
+    """
+    try:
+        if metric not in STATS_METRICS:
+            raise HTTPException(status_code=400, detail=f"Unknown metric: {metric}. Choose one of: {', '.join(STATS_METRICS)}.")
+        start_date = resolve_report_date(start)
+        end_date = resolve_report_date(end)
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="start must not be after end.")
+        start_str = start_date.strftime("%Y-%m-%d")
+        end_str = end_date.strftime("%Y-%m-%d")
+
+        cache_key = (location, start_str, end_str, metric, threshold, group_by)
+        stats = stats_cache.get(cache_key)
+        if stats is None:
+            client = await run_db(get_mongo_client)
+            db = client[DB_NAME]
+            collection = db[HOURLY_REPORTS_COLLECTION_NAME]
+
+            pipeline = build_stats_pipeline(location, start_str, end_str, metric, group_by, threshold)
+            rows = await run_db(lambda: list(collection.aggregate(pipeline)))
+            stats = WeatherStats(
+                location=location,
+                metric=metric,
+                group_by=group_by,
+                start=start_str,
+                end=end_str,
+                threshold=threshold,
+                buckets=[StatsBucket(period=row.pop("_id"), **row) for row in rows],
+            )
+            stats_cache.set(cache_key, stats, ttl=report_cache_ttl(end_date))
+        return stats
+    except ConnectionFailure as e:
+        raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+def _as_double(path: str) -> dict:
+    return {"$convert": {"input": path, "to": "double", "onError": None, "onNull": None}}
+
+def build_summary_pipeline(location: str, start_date: str, end_date: str, metrics: List[str]) -> list:
+    """
+    Builds the aggregation that reduces each day's hourly entries to
+    min/max/avg per metric. Only the requested metrics are projected out
+    of the stored reports.
+    """
+    group = {"_id": "$date", "hours": {"$sum": 1}}
+    for metric in metrics:
+        value = _as_double(f"$hourly.{metric}")
+        group[f"{metric}__min"] = {"$min": value}
+        group[f"{metric}__max"] = {"$max": value}
+        group[f"{metric}__avg"] = {"$avg": value}
+    return [
+        {"$match": {"location": location, "date": {"$gte": start_date, "$lte": end_date}}},
+        {"$project": {"_id": 0, "date": 1, **{f"hourly.{metric}": 1 for metric in metrics}}},
+        {"$unwind": "$hourly"},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+    ]
+
+def build_hours_pipeline(location: str, start_date: str, end_date: str, metric: str,
+                         op: Optional[str], value: Optional[float], limit: int) -> list:
+    """
+    Builds the aggregation that returns one (date, time, value) row per
+    hour for a single metric, optionally only the hours matching a
+    condition. Rows are capped at `limit`.
+    """
+    pipeline = [
+        {"$match": {"location": location, "date": {"$gte": start_date, "$lte": end_date}}},
+        {"$project": {"_id": 0, "date": 1, "hourly.time": 1, f"hourly.{metric}": 1}},
+        {"$unwind": "$hourly"},
+        {"$project": {
+            "date": 1,
+            "time": {"$convert": {"input": "$hourly.time", "to": "int", "onError": None, "onNull": None}},
+            "value": _as_double(f"$hourly.{metric}"),
+        }},
+    ]
+    if op is not None:
+        pipeline.append({"$match": {"value": {HOURS_OPERATORS[op]: value}}})
+    pipeline += [{"$sort": {"date": 1, "time": 1}}, {"$limit": limit}]
+    return pipeline
+
+def _validate_metrics(metrics: List[str]):
+    unknown = [metric for metric in metrics if metric not in STATS_METRICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {', '.join(unknown)}. Choose from: {', '.join(STATS_METRICS)}.")
+
+def _resolve_span(start: str, end: Optional[str], max_days: Optional[int] = None):
+    start_date = resolve_report_date(start)
+    end_date = resolve_report_date(end) if end else start_date
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    if max_days is not None and (end_date - start_date).days >= max_days:
+        raise HTTPException(status_code=400, detail=f"At most {max_days} days per request.")
+    return start_date, end_date
+
+@app.get("/weather/summary", response_model=List[DailySummary])
+async def get_daily_summaries(
+    start: str,
+    end: Optional[str] = None,
+    metrics: Optional[str] = Query(None, description="Comma-separated hourly metrics. Defaults to SUMMARY_METRICS."),
+    location: str = DEFAULT_LOCATION,
+):
+    """
+    Min/max/avg of a few hourly metrics per day between start and end
+    (inclusive, end defaults to start), computed in MongoDB from just those
+    fields. A compact alternative to fetching whole reports.
+    """
+    try:
+        requested = [metric.strip() for metric in metrics.split(",") if metric.strip()] if metrics else SUMMARY_METRICS
+        _validate_metrics(requested)
+        start_date, end_date = _resolve_span(start, end, SUMMARY_MAX_DAYS)
+        start_str = start_date.strftime("%Y-%m-%d")
+        end_str = end_date.strftime("%Y-%m-%d")
+
+        cache_key = ("summary", location, start_str, end_str, tuple(requested))
+        summaries = stats_cache.get(cache_key)
+        if summaries is None:
+            client = await run_db(get_mongo_client)
+            collection = client[DB_NAME][HOURLY_REPORTS_COLLECTION_NAME]
+            pipeline = build_summary_pipeline(location, start_str, end_str, requested)
+            rows = await run_db(lambda: list(collection.aggregate(pipeline)))
+            summaries = [
+                DailySummary(
+                    date=row["_id"],
+                    location=location,
+                    hours=row["hours"],
+                    metrics={
+                        metric: MetricSummary(
+                            min=row.get(f"{metric}__min"),
+                            max=row.get(f"{metric}__max"),
+                            avg=round(row[f"{metric}__avg"], 2) if row.get(f"{metric}__avg") is not None else None,
+                        )
+                        for metric in requested
+                    },
+                )
+                for row in rows
+            ]
+            stats_cache.set(cache_key, summaries, ttl=report_cache_ttl(end_date))
+        return summaries
+    except ConnectionFailure as e:
+        raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@app.get("/weather/hours", response_model=HourlyValues)
+async def get_hourly_values(
+    start: str,
+    metric: str,
+    end: Optional[str] = None,
+    op: Optional[str] = Query(None, pattern="^(>=|>|<=|<|==)$", description="With value, only return hours where metric op value holds."),
+    value: Optional[float] = None,
+    location: str = DEFAULT_LOCATION,
+):
+    """
+    One hourly metric as (date, time, value) rows between start and end
+    (inclusive, end defaults to start), optionally filtered by a condition
+    such as windspeedMiles >= 15. Only the time and the metric are read
+    from each stored report.
+    """
+    try:
+        _validate_metrics([metric])
+        if (op is None) != (value is None):
+            raise HTTPException(status_code=400, detail="op and value must be given together.")
+        start_date, end_date = _resolve_span(start, end)
+        start_str = start_date.strftime("%Y-%m-%d")
+        end_str = end_date.strftime("%Y-%m-%d")
+
+        cache_key = ("hours", location, start_str, end_str, metric, op, value)
+        result = stats_cache.get(cache_key)
+        if result is None:
+            client = await run_db(get_mongo_client)
+            collection = client[DB_NAME][HOURLY_REPORTS_COLLECTION_NAME]
+            # One row past the cap tells whether the result was cut short
+            pipeline = build_hours_pipeline(location, start_str, end_str, metric, op, value, HOURS_MAX_ROWS + 1)
+            rows = await run_db(lambda: list(collection.aggregate(pipeline)))
+            result = HourlyValues(
+                location=location,
+                metric=metric,
+                start=start_str,
+                end=end_str,
+                op=op,
+                value=value,
+                hours=[HourValue(**row) for row in rows[:HOURS_MAX_ROWS]],
+                truncated=len(rows) > HOURS_MAX_ROWS,
+            )
+            stats_cache.set(cache_key, result, ttl=report_cache_ttl(end_date))
+        return result
+    except ConnectionFailure as e:
+        raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@app.get("/weather/range", response_model=List[WeatherReport])
+async def get_reports_in_range(
+    start: str,
+    end: str,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header."),
+    limit: Optional[int] = Query(None, ge=1, le=RANGE_MAX_PAGE_SIZE, description="Page size. Omit to stream the whole range."),
+    format: str = Query("ndjson", pattern="^(ndjson|json|columnar)$"),
+    location: str = DEFAULT_LOCATION,
+    accept: Optional[str] = Header(None),
+):
+    """
+    Retrieve every weather report between start and end (inclusive) with a
+    single indexed range query. Dates accept the same keywords as
+    /weather/{date_str}. Results are streamed as NDJSON (default) or as a
+    chunked JSON array. When limit is set and more reports remain, the
+    X-Next-Cursor header holds the cursor for the next page.
+    """
+    try:
+        start_date = resolve_report_date(start).strftime("%Y-%m-%d")
+        end_date = resolve_report_date(end).strftime("%Y-%m-%d")
+        if cursor is not None:
             try:
-                target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+                cursor_date = datetime.strptime(cursor, "%Y-%m-%d").strftime("%Y-%m-%d")
             except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid date format. Please use YYYY-MM-DD or keywords: today, tomorrow, yesterday.")
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+            # A cursor can only move the range forward, never outside [start, end]
+            start_date = max(start_date, cursor_date)
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="start must not be after end.")
 
-        client = get_mongo_client()
+        client = await run_db(get_mongo_client)
         db = client[DB_NAME]
         collection = db[HOURLY_REPORTS_COLLECTION_NAME]
+        query = {"location": location, "date": {"$gte": start_date, "$lte": end_date}}
+
+        # The representation depends on Accept (msgpack) and Accept-Encoding
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        if limit is not None:
+            # The first date of the next page is the cursor. Projecting only
+            # the indexed field keeps this lookahead a covered index scan.
+            lookahead = await run_db(lambda: list(
+                collection.find(query, {"_id": 0, "date": 1}).sort("date", ASCENDING).skip(limit).limit(1)
+            ))
+            if lookahead:
+                headers["X-Next-Cursor"] = lookahead[0]["date"]
+
+        db_cursor = collection.find(query).sort("date", ASCENDING).batch_size(RANGE_BATCH_SIZE)
+        if limit is not None:
+            db_cursor = db_cursor.limit(limit)
+        first_batch = await run_db(_next_batch, db_cursor)
+
+        use_msgpack = wants_msgpack(accept)
+        if use_msgpack:
+            media_type = MSGPACK_MEDIA_TYPE
+        else:
+            media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+        return StreamingResponse(_stream_reports(db_cursor, first_batch, format, use_msgpack), media_type=media_type, headers=headers)
+    except ConnectionFailure as e:
+        raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@app.get("/weather/{date_str}/as-of", response_model=ForecastSnapshot)
+async def get_forecast_as_of(
+    date_str: str,
+    at: datetime = Query(..., description="Point in time (ISO 8601, UTC if no offset is given)."),
+    location: str = DEFAULT_LOCATION,
+):
+    """
+    Retrieve the forecast for a date as it stood at a given time: the last
+    snapshot the scraper recorded at or before `at`. Only the one history
+    bucket for (location, date) is read, and only the matching snapshot is
+    returned from MongoDB.
+    """
+    try:
+        report_date = resolve_report_date(date_str).strftime("%Y-%m-%d")
+        at = naive_utc(at)
+
+        client = await run_db(get_mongo_client)
+        db = client[DB_NAME]
+        collection = db[FORECAST_HISTORY_COLLECTION_NAME]
+
+        pipeline = [
+            {"$match": {"location": location, "date": report_date}},
+            {"$project": {
+                "_id": 0,
+                "location": 1,
+                "date": 1,
+                "snapshot": {"$arrayElemAt": [
+                    {"$filter": {"input": "$snapshots", "as": "s", "cond": {"$lte": ["$$s.recorded_utc", at]}}},
+                    -1,
+                ]},
+            }},
+        ]
+        rows = await run_db(lambda: list(collection.aggregate(pipeline)))
+        if not rows or not rows[0].get("snapshot"):
+            raise HTTPException(status_code=404, detail=f"No forecast for {date_str} was recorded at or before {at.isoformat()}.")
+        row = rows[0]
+        return ForecastSnapshot(
+            location=row["location"],
+            date=row["date"],
+            recorded_utc=row["snapshot"]["recorded_utc"],
+            hourly=row["snapshot"]["hourly"],
+        )
+    except ConnectionFailure as e:
+        raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@app.get("/weather/{date_str}", response_model=WeatherReport)
+async def get_report_by_date(
+    date_str: str,
+    request: Request,
+    location: str = DEFAULT_LOCATION,
+    format: str = Query("json", pattern="^(json|columnar)$", description="columnar returns one array per hourly metric."),
+):
+    """
+    Retrieve a weather report for a specific date and location
+    (DEFAULT_LOCATION when omitted).
+    Also accepts keywords: "today", "tomorrow", "yesterday".
+    Supports conditional requests via If-None-Match / If-Modified-Since,
+    MessagePack via the Accept header and brotli/gzip via Accept-Encoding.
+    """
+    try:
+        target_date = resolve_report_date(date_str)
+        report_date = target_date.strftime("%Y-%m-%d")
+        cache_key = (location, report_date)
+        variant = ReportVariant.negotiate(request, format)
 
-        report = collection.find_one({"date": target_date.strftime("%Y-%m-%d")})
-        if report:
-            return report
-        raise HTTPException(status_code=404, detail=f"No weather report found for date: {date_str}")
+        cached = report_cache.get(cache_key)
+        if cached is None:
+            lookup = begin_report_lookup(cache_key)
+            try:
+                client = await run_db(get_mongo_client)
+                db = client[DB_NAME]
+                collection = db[HOURLY_REPORTS_COLLECTION_NAME]
+
+                report = await run_db(collection.find_one, {"location": location, "date": report_date})
+            finally:
+                cacheable = end_report_lookup(cache_key, lookup)
+            if not report:
+                raise HTTPException(status_code=404, detail=f"No weather report found for date: {date_str}")
+            last_modified = _recorded_at(report)
+            etag = report_etag(report, last_modified)
+            if is_not_modified(request, variant.etag(etag), last_modified):
+                return Response(status_code=304, headers=report_cache_headers(target_date, variant.etag(etag), last_modified))
+            body = serialize_report(report)
+            cached = CachedReport(body, etag, last_modified, {})
+            # An upsert evicted this report while we were reading it, so what we read may be stale
+            if cacheable:
+                report_cache.set(cache_key, cached, ttl=report_cache_ttl(target_date))
+
+        etag = variant.etag(cached.etag)
+        headers = report_cache_headers(target_date, etag, cached.last_modified)
+        if is_not_modified(request, etag, cached.last_modified):
+            return Response(status_code=304, headers=headers)
+        if variant.encoding:
+            headers["Content-Encoding"] = variant.encoding
+        return Response(content=report_variant_body(cached, variant), media_type=variant.media_type, headers=headers)
     except ConnectionFailure as e:
         raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
     except HTTPException:
@@ -187,19 +1405,125 @@ async def get_report_by_date(date_str: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+def encode_logs_cursor(log: dict) -> str:
+    return f"{log['timestamp_utc'].isoformat()}_{log['_id']}"
+
+def decode_logs_cursor(cursor: str) -> dict:
+    """
+    Turns a /logs cursor into the keyset filter for the page after it: older
+    attempts, or attempts with the same timestamp and a smaller _id. The
+    $lte bound lets MongoDB start the index scan right at the cursor.
+    """
+    try:
+        timestamp, oid = cursor.rsplit("_", 1)
+        timestamp_utc = datetime.fromisoformat(timestamp)
+        last_id = ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return {
+        "timestamp_utc": {"$lte": timestamp_utc},
+        "$or": [{"timestamp_utc": {"$lt": timestamp_utc}}, {"_id": {"$lt": last_id}}],
+    }
+
+def parse_log_fields(fields: str) -> dict:
+    """
+    Builds the projection for a comma-separated field list. timestamp_utc
+    and _id are always returned because the cursor is built from them.
+    """
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(ATTEMPT_LOG_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(ATTEMPT_LOG_FIELDS)}.")
+    return {field: 1 for field in ["timestamp_utc", *requested]}
+
 @app.get("/logs", response_model=List[AttemptLog])
-async def get_all_logs():
+async def get_all_logs(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header."),
+    limit: int = Query(LOGS_DEFAULT_PAGE_SIZE, ge=1, le=LOGS_MAX_PAGE_SIZE),
+    success: Optional[bool] = None,
+    status_code: Optional[int] = None,
+    location: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="Only attempts at or after this time (UTC if no offset is given)."),
+    until: Optional[datetime] = Query(None, description="Only attempts before this time (UTC if no offset is given)."),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. success,status_code,error."),
+):
     """
-    Retrieve all attempt logs.
+    Retrieve attempt logs, newest first, one page at a time. When more
+    attempts match, the X-Next-Cursor header holds the cursor for the next
+    page; following it costs the same index scan as the first page. With
+    `fields`, only those columns are read from MongoDB and returned as is.
     """
     try:
-        client = get_mongo_client()
+        query = {}
+        window = {}
+        if since is not None:
+            window["$gte"] = naive_utc(since)
+        if until is not None:
+            window["$lt"] = naive_utc(until)
+        if window:
+            query["timestamp_utc"] = window
+        if cursor is not None:
+            keyset = decode_logs_cursor(cursor)
+            query.setdefault("timestamp_utc", {}).update(keyset["timestamp_utc"])
+            query["$or"] = keyset["$or"]
+        if success is not None:
+            query["success"] = success
+        if status_code is not None:
+            query["status_code"] = status_code
+        if location is not None:
+            query["location"] = location
+        projection = parse_log_fields(fields) if fields else None
+
+        client = await run_db(get_mongo_client)
         db = client[DB_NAME]
         collection = db[ATTEMPTS_COLLECTION_NAME]
-        
-        logs = list(collection.find().sort("timestamp_utc", -1).limit(100))
+
+        # One extra row tells us whether there is a next page
+        logs = await run_db(lambda: list(collection.find(query, projection).sort(ATTEMPTS_PAGE_SORT).limit(limit + 1)))
+        headers = {}
+        if len(logs) > limit:
+            logs = logs[:limit]
+            headers["X-Next-Cursor"] = encode_logs_cursor(logs[-1])
+        if projection is not None:
+            # Partial rows don't fit AttemptLog, so skip model validation
+            return JSONResponse(jsonable_encoder(logs, custom_encoder={ObjectId: str}), headers=headers)
+        response.headers.update(headers)
         return logs
     except ConnectionFailure as e:
         raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@app.get("/logs/summary", response_model=List[AttemptSummary])
+async def get_logs_summary(start: str, end: str, location: Optional[str] = None):
+    """
+    Per-day attempt counts and upstream latency between start and end
+    (inclusive), for one location or all of them. Summaries are written by
+    the scraper's daily rollup, so they cover complete days only and outlive
+    the raw attempts.
+    """
+    try:
+        start_date = resolve_report_date(start).strftime("%Y-%m-%d")
+        end_date = resolve_report_date(end).strftime("%Y-%m-%d")
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="start must not be after end.")
+
+        client = await run_db(get_mongo_client)
+        db = client[DB_NAME]
+        collection = db[ATTEMPT_SUMMARIES_COLLECTION_NAME]
+
+        query = {"date": {"$gte": start_date, "$lte": end_date}}
+        if location is not None:
+            query["location"] = location
+        return await run_db(lambda: list(
+            collection.find(query, {"_id": 0}).sort([("date", ASCENDING), ("location", ASCENDING)])
+        ))
+    except ConnectionFailure as e:
+        raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
@@ -0,0 +1,118 @@
+"""
+Load benchmark for the /weather/{date_str} endpoint.
+
+Drives the ASGI app in-process at fixed concurrency levels against a fake
+MongoDB collection whose find_one blocks for a configurable amount of time,
+the same way a real pymongo round-trip blocks its calling thread.
+
+Run it from the api/ directory:
+
+    python benchmarks/load_benchmark.py --mode offload
+    python benchmarks/load_benchmark.py --mode inline   # pre-offload behaviour
+
+"inline" calls pymongo directly on the event loop (how the endpoints behaved
+before run_db was introduced); "offload" uses the bounded DB thread pool.
+The report cache is disabled, so every request reaches the fake database.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from httpx import AsyncClient, ASGITransport
+
+import api
+from cache import TTLCache
+
+
+def make_fake_client(db_latency_ms: float) -> MagicMock:
+    """
+    Builds a fake MongoClient whose collections block like a real query would.
+    """
+    def find_one(query, *args, **kwargs):
+        time.sleep(db_latency_ms / 1000)
+        return {
+            "_id": "60d5ec49e7ef42e3f8a3e3a0",
+            "location": query.get("location"),
+            "date": query.get("date", "2024-01-01"),
+            "hourly": [],
+            "timestamp_recorded_utc": datetime(2024, 1, 1),
+        }
+
+    collection = MagicMock()
+    collection.find_one.side_effect = find_one
+    db = MagicMock()
+    db.__getitem__.return_value = collection
+    client = MagicMock()
+    client.__getitem__.return_value = db
+    return client
+
+
+async def run_inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def run_level(client: AsyncClient, concurrency: int, requests_per_client: int) -> dict:
+    latencies = []
+
+    async def worker():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = await client.get("/weather/2024-01-01")
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "req_per_s": len(latencies) / elapsed,
+        "p50_ms": quantiles[49],
+        "p99_ms": quantiles[98],
+    }
+
+
+async def main(args):
+    logging.disable(logging.INFO)
+    fake_client = make_fake_client(args.db_latency_ms)
+    patches = [
+        patch("api.get_mongo_client", return_value=fake_client),
+        # Otherwise only the first request would reach the database
+        patch("api.report_cache", TTLCache(maxsize=0, default_ttl=0)),
+    ]
+    if args.mode == "inline":
+        patches.append(patch("api.run_db", run_inline))
+
+    for p in patches:
+        p.start()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=api.app), base_url="http://bench") as client:
+            print(f"mode={args.mode} db_latency={args.db_latency_ms}ms workers={api.DB_EXECUTOR_WORKERS}")
+            print(f"{'clients':>8} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+            for concurrency in args.concurrency:
+                result = await run_level(client, concurrency, args.requests_per_client)
+                print(f"{result['concurrency']:>8} {result['requests']:>9} {result['req_per_s']:>9.1f} "
+                      f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+    finally:
+        for p in patches:
+            p.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["offload", "inline"], default="offload")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
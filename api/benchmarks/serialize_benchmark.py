@@ -0,0 +1,58 @@
+"""
+Microbenchmark of the per-request cost of serializing one weather report:
+the WeatherReport validation path vs the orjson fast path serialize_report
+takes for typed documents. Runs against synthetic 8-hour (wttr.in's 3-hourly
+forecast) and 24-hour reports; no database is needed. Run it from the api/
+directory:
+
+    python benchmarks/serialize_benchmark.py
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+
+from api import WeatherReport, serialize_report
+from synthetic import HOURS, make_report
+
+SHAPES = {
+    "8-hour": HOURS,
+    "24-hour": tuple(range(0, 2400, 100)),
+}
+
+
+def validated(report: dict) -> bytes:
+    return WeatherReport.model_validate(report).model_dump_json(by_alias=True).encode()
+
+
+def time_per_call(func, report: dict, number: int, repeat: int) -> float:
+    """
+    Best of `repeat` runs, in microseconds per call.
+    """
+    return min(timeit.repeat(lambda: func(report), number=number, repeat=repeat)) / number * 1e6
+
+
+def main(args):
+    logging.disable(logging.INFO)
+    print(f"{'report':>8} {'bytes':>7} {'validated us':>13} {'fast path us':>13} {'speedup':>8}")
+    for name, hours in SHAPES.items():
+        report = make_report(date(2024, 1, 1), random.Random(1428), hours)
+        report["_id"] = ObjectId()
+        assert serialize_report(report) == validated(report), "fast path output differs from WeatherReport"
+        slow = time_per_call(validated, report, args.number, args.repeat)
+        fast = time_per_call(serialize_report, report, args.number, args.repeat)
+        print(f"{name:>8} {len(serialize_report(report)):>7} {slow:>13.1f} {fast:>13.1f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="Calls per timing run.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs; the fastest is reported.")
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+"""
+Benchmark for /weather/stats: server-side aggregation vs the client-side
+approach the alerter uses (pull whole hourly arrays, compute in Python).
+
+Needs a real mongod, because the pipeline uses operators that in-memory
+stand-ins do not implement. Seeds a separate database (weather_bench by
+default) with several years of synthetic reports, then times both
+approaches over ranges of increasing length. Run it from the api/ directory:
+
+    MONGO_URI=mongodb://localhost:27017/ python benchmarks/stats_benchmark.py --years 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import BSON
+from pymongo import MongoClient, ASCENDING
+
+from api import build_stats_pipeline
+from synthetic import make_reports
+
+
+def seed(collection, years: int):
+    days = years * 365
+    if collection.estimated_document_count() == days:
+        return
+    collection.drop()
+    collection.create_index([("location", ASCENDING), ("date", ASCENDING)], unique=True)
+    batch = []
+    for report in make_reports(date(2020, 1, 1), days):
+        batch.append(report)
+        if len(batch) == 1000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def server_side(collection, start: str, end: str, metric: str, threshold: float):
+    rows = list(collection.aggregate(build_stats_pipeline("18966", start, end, metric, "day", threshold)))
+    return rows, sum(len(BSON.encode(row)) for row in rows)
+
+
+def client_side(collection, start: str, end: str, metric: str, threshold: float):
+    rows = []
+    transferred = 0
+    for report in collection.find({"location": "18966", "date": {"$gte": start, "$lte": end}}).sort("date", ASCENDING):
+        transferred += len(BSON.encode(report))
+        values = [float(hour[metric]) for hour in report["hourly"]]
+        rows.append({
+            "_id": report["date"],
+            "min": min(values),
+            "max": max(values),
+            "avg": sum(values) / len(values),
+            "exceedances": sum(1 for value in values if value >= threshold),
+        })
+    return rows, transferred
+
+
+def timed(func, repeat: int, *args):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        durations.append((time.perf_counter() - started) * 1000)
+    return statistics.median(durations), result
+
+
+def main(args):
+    client = MongoClient(args.mongo_uri)
+    collection = client[args.db][args.collection]
+    seed(collection, args.years)
+
+    start = date(2020, 1, 1)
+    print(f"{args.years} years of reports, metric={args.metric}, threshold={args.threshold}")
+    print(f"{'days':>6} {'server ms':>10} {'client ms':>10} {'server KB':>10} {'client KB':>10}")
+    for days in args.days:
+        end = (start + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        server_ms, (server_rows, server_bytes) = timed(server_side, args.repeat, collection, start.strftime("%Y-%m-%d"), end, args.metric, args.threshold)
+        client_ms, (client_rows, client_bytes) = timed(client_side, args.repeat, collection, start.strftime("%Y-%m-%d"), end, args.metric, args.threshold)
+        assert [row["max"] for row in server_rows] == [row["max"] for row in client_rows]
+        print(f"{days:>6} {server_ms:>10.1f} {client_ms:>10.1f} {server_bytes / 1024:>10.1f} {client_bytes / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="weather_bench")
+    parser.add_argument("--collection", default="hourly_reports")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30, 365, 5 * 365])
+    parser.add_argument("--metric", default="windspeedMiles")
+    parser.add_argument("--threshold", type=float, default=15)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,291 @@
+"""
+Benchmark suite for the API's hot read endpoints.
+
+Seeds a database with years of synthetic wttr.in-shaped reports and attempt
+logs, then drives the ASGI app in-process at fixed concurrency levels. For
+every (scenario, concurrency) it reports req/s and p50/p95/p99 latency, plus
+allocation figures from a separate tracemalloc pass (tracing slows requests
+down, so it is kept out of the timed run). Results are written as JSON so
+runs from different commits can be compared.
+
+Run it from the api/ directory, against an in-memory stand-in
+(pip install mongomock) or a real mongod:
+
+    python benchmarks/suite.py --backend mongomock --years 2
+    MONGO_URI=mongodb://localhost:27017/ python benchmarks/suite.py --backend mongod --years 5
+    python benchmarks/suite.py --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+mongomock scans and copies documents in Python, so its absolute numbers are
+only comparable with other mongomock runs.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+from httpx import AsyncClient, ASGITransport
+from pymongo import ASCENDING, DESCENDING, MongoClient
+
+import api
+from cache import TTLCache
+from synthetic import make_reports
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+ATTEMPTS_PER_DAY = 24
+
+
+def seed_start(years: int) -> date:
+    """
+    Seeded data ends today so /weather/latest finds a report.
+    """
+    return date.today() - timedelta(days=years * 365 - 1)
+
+
+def make_attempts(start: date, days: int, seed: int = 1428):
+    """
+    One attempt per hour, with the occasional retried failure.
+    """
+    rng = random.Random(seed)
+    for offset in range(days * ATTEMPTS_PER_DAY):
+        timestamp = datetime(start.year, start.month, start.day) + timedelta(hours=offset)
+        failed = rng.random() < 0.05
+        yield {
+            "_id": ObjectId.from_datetime(timestamp),
+            "location": "18966",
+            "attempt_number": 1,
+            "timestamp_utc": timestamp,
+            "success": not failed,
+            "status_code": 503 if failed else 200,
+            "error": "503 Service Unavailable" if failed else None,
+            "delay_seconds": round(rng.uniform(0, 2), 3) if failed else None,
+            "duration_ms": round(rng.uniform(150, 900), 1),
+            "outcome": None if failed else "updated",
+        }
+
+
+def seed(db, years: int):
+    """
+    Fills hourly_reports and attempts unless they already hold this many
+    years up to today.
+    """
+    days = years * 365
+    start = seed_start(years)
+    reports = db[api.HOURLY_REPORTS_COLLECTION_NAME]
+    attempts = db[api.ATTEMPTS_COLLECTION_NAME]
+    if (
+        reports.estimated_document_count() == days
+        and attempts.estimated_document_count() == days * ATTEMPTS_PER_DAY
+        and reports.find_one({"date": date.today().strftime("%Y-%m-%d")}, {"_id": 1})
+    ):
+        return
+    for collection, documents in ((reports, make_reports(start, days)), (attempts, make_attempts(start, days))):
+        collection.drop()
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) == 1000:
+                collection.insert_many(batch)
+                batch = []
+        if batch:
+            collection.insert_many(batch)
+    reports.create_index([("location", ASCENDING), ("date", ASCENDING)], unique=True)
+    attempts.create_index([("timestamp_utc", DESCENDING), ("_id", DESCENDING)])
+
+
+def scenarios(years: int) -> dict:
+    """
+    Request factories per scenario. Dates are drawn from the seeded range so
+    the report cache sees a realistic mix of hits and misses.
+    """
+    rng = random.Random(7)
+    days = years * 365
+    start = seed_start(years)
+
+    def random_date():
+        return (start + timedelta(days=rng.randrange(days))).strftime("%Y-%m-%d")
+
+    return {
+        "weather_by_date": lambda: f"/weather/{random_date()}",
+        "weather_latest": lambda: "/weather/latest",
+        "logs": lambda: "/logs",
+        "logs_failures": lambda: "/logs?success=false&fields=status_code,error",
+    }
+
+
+def percentile(quantiles: list, p: int) -> float:
+    return quantiles[p - 1]
+
+
+async def run_level(client: AsyncClient, next_path, concurrency: int, requests_per_client: int) -> dict:
+    latencies = []
+
+    async def worker():
+        for _ in range(requests_per_client):
+            path = next_path()
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, f"{path}: {response.status_code} {response.text}"
+
+    gc_before = gc.get_stats()[0]["collections"]
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(quantiles, 50), 2),
+        "p95_ms": round(percentile(quantiles, 95), 2),
+        "p99_ms": round(percentile(quantiles, 99), 2),
+        "gc_gen0_collections": gc.get_stats()[0]["collections"] - gc_before,
+    }
+
+
+async def measure_allocations(client: AsyncClient, next_path, requests: int) -> dict:
+    """
+    Runs requests one at a time under tracemalloc. Reports allocated blocks
+    and bytes per request (from the snapshot diff, so only allocations still
+    alive at the end count) and the peak traced memory.
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for _ in range(requests):
+        await client.get(next_path())
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    growth = [stat for stat in after.compare_to(before, "lineno") if stat.count_diff > 0]
+    return {
+        "retained_blocks_per_request": round(sum(stat.count_diff for stat in growth) / requests, 1),
+        "retained_bytes_per_request": round(sum(stat.size_diff for stat in growth) / requests, 1),
+        "peak_traced_kib": round(peak / 1024, 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def open_database(args):
+    if args.backend == "mongomock":
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(args.mongo_uri)
+
+
+async def run_suite(args) -> dict:
+    logging.disable(logging.INFO)
+    client = open_database(args)
+    seed(client[args.db], args.years)
+
+    patches = [
+        patch("api.get_mongo_client", return_value=client),
+        patch("api.DB_NAME", args.db),
+        patch("api.CHANGE_STREAM_ENABLED", False),
+    ]
+    if args.cold_cache:
+        patches.append(patch("api.report_cache", TTLCache(maxsize=0, default_ttl=0)))
+    for p in patches:
+        p.start()
+
+    results = []
+    try:
+        async with AsyncClient(transport=ASGITransport(app=api.app), base_url="http://bench") as http_client:
+            for name, next_path in scenarios(args.years).items():
+                if args.scenario and name not in args.scenario:
+                    continue
+                api.report_cache.clear()
+                for _ in range(args.warmup):
+                    await http_client.get(next_path())
+                allocations = await measure_allocations(http_client, next_path, args.alloc_requests)
+                for concurrency in args.concurrency:
+                    level = await run_level(http_client, next_path, concurrency, args.requests_per_client)
+                    results.append({"scenario": name, **level, **allocations})
+                    print(f"{name:>16} {level['concurrency']:>6} {level['req_per_s']:>9.1f} {level['p50_ms']:>8.2f} "
+                          f"{level['p95_ms']:>8.2f} {level['p99_ms']:>8.2f} {allocations['retained_blocks_per_request']:>8.1f}")
+    finally:
+        for p in patches:
+            p.stop()
+
+    return {
+        "commit": git_commit(),
+        "recorded_utc": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "years": args.years,
+        "cold_cache": args.cold_cache,
+        "db_executor_workers": api.DB_EXECUTOR_WORKERS,
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str):
+    """
+    Prints the relative change in throughput and p99 between two result files.
+    """
+    with open(old_path) as f:
+        old = {(row["scenario"], row["concurrency"]): row for row in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    print(f"{'scenario':>16} {'conc':>6} {'req/s':>9} {'change':>8} {'p99 ms':>8} {'change':>8}")
+    for row in new:
+        before = old.get((row["scenario"], row["concurrency"]))
+        if before is None:
+            continue
+        throughput = (row["req_per_s"] / before["req_per_s"] - 1) * 100
+        p99 = (row["p99_ms"] / before["p99_ms"] - 1) * 100 if before["p99_ms"] else 0.0
+        print(f"{row['scenario']:>16} {row['concurrency']:>6} {row['req_per_s']:>9.1f} {throughput:>+7.1f}% "
+              f"{row['p99_ms']:>8.2f} {p99:>+7.1f}%")
+
+
+def main(args):
+    if args.compare:
+        compare(*args.compare)
+        return
+    print(f"{'scenario':>16} {'conc':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'blocks':>8}")
+    run = asyncio.run(run_suite(args))
+    output = args.output or os.path.join(RESULTS_DIR, f"{run['recorded_utc'].replace(':', '')}-{run['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"Saved results to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="weather_bench")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--scenario", nargs="+", help="Only run these scenarios.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests-per-client", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--alloc-requests", type=int, default=50)
+    parser.add_argument("--cold-cache", action="store_true", help="Disable the report cache so every request hits the database.")
+    parser.add_argument("--output", help="Where to write the JSON results. Defaults to benchmarks/results/.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files instead of running.")
+    main(parser.parse_args())
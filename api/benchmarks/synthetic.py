@@ -0,0 +1,60 @@
+"""
+Synthetic wttr.in-shaped weather reports for benchmarks.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+HOURS = (0, 300, 600, 900, 1200, 1500, 1800, 2100)
+DESCRIPTIONS = ("Sunny", "Partly cloudy", "Cloudy", "Overcast", "Light rain", "Patchy rain nearby")
+DIRECTIONS = ("N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE", "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW")
+
+
+def make_hour(rng: random.Random, time_hhmm: int) -> dict:
+    """
+    One typed (schema_version 2) hourly entry with plausible values.
+    """
+    temp_f = rng.randint(10, 95)
+    wind_miles = rng.randint(0, 35)
+    description = rng.choice(DESCRIPTIONS)
+    direction = rng.randrange(16)
+    return {
+        "DewPointC": rng.randint(-10, 20), "DewPointF": rng.randint(14, 68),
+        "FeelsLikeC": round((temp_f - 32) / 1.8), "FeelsLikeF": temp_f,
+        "HeatIndexC": round((temp_f - 32) / 1.8), "HeatIndexF": temp_f,
+        "WindChillC": round((temp_f - 32) / 1.8), "WindChillF": temp_f,
+        "WindGustKmph": round(wind_miles * 1.6 * 1.4), "WindGustMiles": round(wind_miles * 1.4),
+        "chanceoffog": 0, "chanceoffrost": rng.randint(0, 100), "chanceofhightemp": 0,
+        "chanceofovercast": rng.randint(0, 100), "chanceofrain": rng.randint(0, 100),
+        "chanceofremdry": rng.randint(0, 100), "chanceofsnow": 0, "chanceofsunshine": rng.randint(0, 100),
+        "chanceofthunder": 0, "chanceofwindy": 0, "cloudcover": rng.randint(0, 100),
+        "diffRad": round(rng.uniform(0, 200), 1), "humidity": rng.randint(20, 100),
+        "precipInches": round(rng.uniform(0, 0.3), 1), "precipMM": round(rng.uniform(0, 8), 1),
+        "pressure": rng.randint(990, 1040), "pressureInches": 30.0,
+        "shortRad": round(rng.uniform(0, 600), 1), "tempC": round((temp_f - 32) / 1.8), "tempF": temp_f,
+        "time": time_hhmm, "uvIndex": rng.randint(0, 9), "visibility": 10, "visibilityMiles": 6.0,
+        "weatherCode": 116, "weatherDesc": [{"value": description}],
+        "weatherIconUrl": [{"value": ""}], "winddir16Point": DIRECTIONS[direction],
+        "winddirDegree": direction * 22, "windspeedKmph": round(wind_miles * 1.6), "windspeedMiles": wind_miles,
+    }
+
+
+def make_report(day: date, rng: random.Random, hours=HOURS, location: str = "18966") -> dict:
+    """
+    One hourly_reports document as written by the scraper.
+    """
+    return {
+        "location": location,
+        "date": day.strftime("%Y-%m-%d"),
+        "hourly": [make_hour(rng, time_hhmm) for time_hhmm in hours],
+        "schema_version": 2,
+        "timestamp_recorded_utc": datetime(day.year, day.month, day.day, 6, 0, 0),
+    }
+
+
+def make_reports(start: date, days: int, seed: int = 1428, hours=HOURS, location: str = "18966"):
+    """
+    Yields consecutive daily reports for one location starting at start.
+    """
+    rng = random.Random(seed)
+    for offset in range(days):
+        yield make_report(start + timedelta(days=offset), rng, hours, location)
@@ -0,0 +1,107 @@
+"""
+Bytes and latency per MCP tool call: the full-report tools against the
+compact summary tools. Each tool is measured through the API request it
+makes, since the tools return the API's JSON (trimmed at most), so the
+body size is what lands in the agent's context.
+
+Seeds a mongod the same way suite.py does and drives the ASGI app
+in-process. Caches are cleared between calls, so every call reaches the
+database. mongomock does not implement $convert, which the summary
+pipelines use, so this needs a real mongod. Run it from the api/ directory:
+
+    MONGO_URI=mongodb://localhost:27017/ python benchmarks/tools_benchmark.py
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from httpx import AsyncClient, ASGITransport
+
+import api
+from suite import open_database, seed
+
+
+def tool_calls() -> dict:
+    """
+    (tool, API request) pairs for the same questions: what is today's
+    weather, this week's weather, and when is it windy.
+    """
+    today = date.today()
+    week_ago = (today - timedelta(days=6)).strftime("%Y-%m-%d")
+    today = today.strftime("%Y-%m-%d")
+    return {
+        "today": [
+            ("get_weather_report_by_date", f"/weather/{today}"),
+            ("get_daily_summary", f"/weather/summary?start={today}"),
+        ],
+        "one metric today": [
+            ("get_weather_report_by_date", f"/weather/{today}"),
+            ("get_hourly_metric", f"/weather/hours?start={today}&metric=windspeedMiles"),
+        ],
+        "last 7 days": [
+            ("get_weather_reports_in_range", f"/weather/range?start={week_ago}&end={today}&format=json&limit=31"),
+            ("get_daily_summary", f"/weather/summary?start={week_ago}&end={today}"),
+        ],
+        "windy hours, 7 days": [
+            ("get_weather_reports_in_range", f"/weather/range?start={week_ago}&end={today}&format=json&limit=31"),
+            ("find_hours", f"/weather/hours?start={week_ago}&end={today}&metric=windspeedMiles&op=%3E%3D&value=20"),
+        ],
+    }
+
+
+async def measure(client: AsyncClient, path: str, calls: int) -> dict:
+    latencies = []
+    size = 0
+    for _ in range(calls):
+        api.report_cache.clear()
+        api.stats_cache.clear()
+        started = time.perf_counter()
+        response = await client.get(path)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, f"{path}: {response.status_code} {response.text}"
+        size = len(response.content)
+    return {"bytes": size, "median_ms": statistics.median(latencies)}
+
+
+async def run(args):
+    logging.disable(logging.INFO)
+    client = open_database(args)
+    seed(client[args.db], args.years)
+    patches = [
+        patch("api.get_mongo_client", return_value=client),
+        patch("api.DB_NAME", args.db),
+        patch("api.CHANGE_STREAM_ENABLED", False),
+    ]
+    for p in patches:
+        p.start()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=api.app), base_url="http://bench") as http_client:
+            print(f"{'question':>20} {'tool':>28} {'bytes':>8} {'median ms':>10} {'vs full':>8}")
+            for question, calls in tool_calls().items():
+                baseline = None
+                for tool, path in calls:
+                    result = await measure(http_client, path, args.calls)
+                    baseline = baseline or result
+                    ratio = f"{baseline['bytes'] / result['bytes']:.0f}x" if result is not baseline else ""
+                    print(f"{question:>20} {tool:>28} {result['bytes']:>8} {result['median_ms']:>10.2f} {ratio:>8}")
+    finally:
+        for p in patches:
+            p.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongod")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="weather_bench")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--calls", type=int, default=20, help="Calls per tool; the median latency is reported.")
+    asyncio.run(run(parser.parse_args()))
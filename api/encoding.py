@@ -0,0 +1,185 @@
+from typing import Optional
+import gzip
+import zlib
+
+import brotli
+import msgpack
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+
+# Preferred first when a client accepts both at the same q-value
+SUPPORTED_ENCODINGS = ("br", "gzip")
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+# Hourly fields wttr.in wraps as [{"value": ...}]; the columnar layout keeps just the value
+VALUE_LIST_FIELDS = ("weatherDesc", "weatherIconUrl")
+
+
+def _accepted(header: str) -> dict:
+    """
+    Parses an Accept / Accept-Encoding header into {token: q}.
+    """
+    accepted = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Picks br or gzip from an Accept-Encoding header, or None for identity.
+    """
+    if not accept_encoding:
+        return None
+    accepted = _accepted(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """
+    True when the Accept header prefers MessagePack over JSON.
+    """
+    if not accept:
+        return False
+    accepted = _accepted(accept)
+    msgpack_q = max(accepted.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    return msgpack_q > 0 and msgpack_q >= accepted.get("application/json", 0.0)
+
+
+def compress(body: bytes, encoding: Optional[str], gzip_level: int, brotli_quality: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=gzip_level)
+    return body
+
+
+def to_columnar(report: dict) -> dict:
+    """
+    Turns a serialized report's hourly list into one array per metric, so
+    each key is written once instead of once per hour.
+    """
+    hourly = report.get("hourly", [])
+    columns = {}
+    for hour in hourly:
+        for key, value in hour.items():
+            if key in VALUE_LIST_FIELDS:
+                value = value[0]["value"] if value else None
+            columns.setdefault(key, []).append(value)
+    return {**{key: value for key, value in report.items() if key != "hourly"}, "hours": len(hourly), "hourly": columns}
+
+
+def render_report(json_body: bytes, columnar: bool, use_msgpack: bool) -> bytes:
+    """
+    Re-encodes a serialized WeatherReport in the requested layout and media type.
+    """
+    if not columnar and not use_msgpack:
+        return json_body
+    report = orjson.loads(json_body)
+    if columnar:
+        report = to_columnar(report)
+    return msgpack.packb(report) if use_msgpack else orjson.dumps(report)
+
+
+class _StreamCompressor:
+    """
+    Incremental gzip or brotli compressor that flushes after every chunk so
+    streamed responses reach the client as they are produced.
+    """
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli/gzip compression for every response, including
+    streamed ones. Responses that already carry a Content-Encoding (such as
+    precompressed cached reports), event streams and small bodies are sent
+    as they are.
+    """
+
+    def __init__(self, app, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                skip = (
+                    "content-encoding" in headers
+                    or headers.get("content-type", "").startswith("text/event-stream")
+                    or (not more_body and len(body) < self.minimum_size)
+                )
+                if not skip:
+                    compressor = _StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+                    headers["Content-Encoding"] = encoding
+                    if "accept-encoding" not in headers.get("vary", "").lower():
+                        headers.add_vary_header("Accept-Encoding")
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                    if not more_body:
+                        body = compress(body, encoding, self.gzip_level, self.brotli_quality)
+                        headers["Content-Length"] = str(len(body))
+                        compressor = None
+                        await send(start_message)
+                        start_message = None
+                        await send({"type": "http.response.body", "body": body})
+                        return
+                await send(start_message)
+                start_message = None
+            if compressor is not None:
+                body = compressor.chunk(body) if more_body else compressor.chunk(body) + compressor.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
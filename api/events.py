@@ -0,0 +1,123 @@
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+import asyncio
+import json
+import uuid
+
+
+class Subscriber:
+    """
+    One connected client's queue of pending events. A subscriber that falls
+    more than a full queue behind is marked as lagged and stops receiving.
+    """
+
+    def __init__(self, types: Optional[Iterable[str]], maxsize: int):
+        self.types = set(types) if types else None
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=maxsize)
+        self.lagged = False
+
+    def wants(self, event: dict) -> bool:
+        return self.types is None or event["type"] in self.types
+
+
+class EventHub:
+    """
+    Fans events from a single database tail out to every subscriber, and
+    keeps the most recent ones so a reconnecting client can resume from its
+    Last-Event-ID without another database query.
+
+    Event ids are "<epoch>-<sequence>". The epoch changes with every
+    process, so ids from before a restart are recognised as unresumable.
+
+    Not thread-safe; it is only touched from the event loop.
+    """
+
+    def __init__(self, buffer_size: int, queue_size: int):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._sequence = 0
+        self._recent: "deque[dict]" = deque(maxlen=buffer_size)
+        self._subscribers: List[Subscriber] = []
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def publish(self, event_type: str, data: dict) -> dict:
+        """
+        Stamps an event with the next id and hands it to every subscriber.
+        """
+        self._sequence += 1
+        event = {"id": f"{self.epoch}-{self._sequence}", "type": event_type, "data": data}
+        self._recent.append(event)
+        self.published += 1
+        for subscriber in self._subscribers:
+            if subscriber.lagged or not subscriber.wants(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.lagged = True
+                self.dropped_subscribers += 1
+        return event
+
+    def subscribe(self, types: Optional[Iterable[str]] = None, last_event_id: Optional[str] = None) -> Tuple[Subscriber, bool]:
+        """
+        Registers a subscriber and queues any buffered events after
+        last_event_id. Returns the subscriber and whether the resume point
+        was found; False means events may have been missed. A backlog larger
+        than the queue leaves the subscriber lagged, like one that fell
+        behind while connected.
+        """
+        subscriber = Subscriber(types, self.queue_size)
+        resumed = True
+        if last_event_id:
+            backlog = self._events_after(last_event_id)
+            if backlog is None:
+                resumed = False
+            else:
+                for event in backlog:
+                    if not subscriber.wants(event):
+                        continue
+                    if subscriber.queue.full():
+                        subscriber.lagged = True
+                        self.dropped_subscribers += 1
+                        break
+                    subscriber.queue.put_nowait(event)
+        self._subscribers.append(subscriber)
+        return subscriber, resumed
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+
+    def _events_after(self, last_event_id: str) -> Optional[List[dict]]:
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        if sequence > self._sequence:
+            return None
+        oldest = self._sequence - len(self._recent) + 1
+        if sequence < oldest - 1:
+            return None  # already rotated out of the buffer
+        return [event for event in self._recent if int(event["id"].rsplit("-", 1)[1]) > sequence]
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "buffered": len(self._recent),
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+def format_sse(event: dict) -> bytes:
+    """
+    Encodes an event as a Server-Sent Events message. Events without an id
+    (such as "reset") leave the client's Last-Event-ID unchanged.
+    """
+    lines = [f"id: {event['id']}"] if event.get("id") else []
+    lines += [f"event: {event['type']}", f"data: {json.dumps(event['data'], default=str)}"]
+    return ("\n".join(lines) + "\n\n").encode()
@@ -0,0 +1,56 @@
+from typing import Callable, Dict
+from prometheus_client import Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+# Buckets sized for an API whose cached responses take well under a millisecond
+# and whose uncached ones are bounded by a MongoDB round-trip
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "api_http_request_duration_seconds",
+    "Time until the response headers are ready, by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("api_http_requests_in_flight", "Requests currently being handled.")
+DB_QUERY_DURATION = Histogram(
+    "api_db_query_duration_seconds",
+    "Time spent in MongoDB calls on the DB thread pool, including the wait for a free worker.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+class CacheCollector:
+    """
+    Exposes the counters every TTLCache already keeps, read at scrape time
+    so the cache itself stays free of metrics code.
+    """
+
+    def __init__(self, caches: Dict[str, object]):
+        self.caches = caches
+
+    def collect(self):
+        counters = {
+            name: CounterMetricFamily(f"api_cache_{name}", f"Cache {name}.", labels=["cache"])
+            for name in ("hits", "misses", "evictions", "expirations")
+        }
+        size = GaugeMetricFamily("api_cache_entries", "Entries currently cached.", labels=["cache"])
+        hit_ratio = GaugeMetricFamily("api_cache_hit_ratio", "Hits over lookups since startup.", labels=["cache"])
+        for cache_name, cache in self.caches.items():
+            stats = cache.stats()
+            for name, family in counters.items():
+                family.add_metric([cache_name], stats[name])
+            size.add_metric([cache_name], stats["size"])
+            hit_ratio.add_metric([cache_name], stats["hit_ratio"])
+        yield from counters.values()
+        yield size
+        yield hit_ratio
+
+
+def register_caches(caches: Dict[str, object]):
+    REGISTRY.register(CacheCollector(caches))
+
+
+def register_gauge(name: str, documentation: str, read: Callable[[], float]):
+    Gauge(name, documentation).set_function(read)
@@ -65,47 +65,47 @@ class Astronomy(BaseModel):
     sunset: str
 
 class Hourly(BaseModel):
-    dew_point_c: str = Field(..., alias='DewPointC')
-    dew_point_f: str = Field(..., alias='DewPointF')
-    feels_like_c: str = Field(..., alias='FeelsLikeC')
-    feels_like_f: str = Field(..., alias='FeelsLikeF')
-    heat_index_c: str = Field(..., alias='HeatIndexC')
-    heat_index_f: str = Field(..., alias='HeatIndexF')
-    wind_chill_c: str = Field(..., alias='WindChillC')
-    wind_chill_f: str = Field(..., alias='WindChillF')
-    wind_gust_kmph: str = Field(..., alias='WindGustKmph')
-    wind_gust_miles: str = Field(..., alias='WindGustMiles')
-    chanceoffog: str
-    chanceoffrost: str
-    chanceofhightemp: str
-    chanceofovercast: str
-    chanceofrain: str
-    chanceofremdry: str
-    chanceofsnow: str
-    chanceofsunshine: str
-    chanceofthunder: str
-    chanceofwindy: str
-    cloudcover: str
-    diff_rad: str = Field(..., alias='diffRad')
-    humidity: str
-    precip_inches: str = Field(..., alias='precipInches')
-    precip_mm: str = Field(..., alias='precipMM')
-    pressure: str
-    pressure_inches: str = Field(..., alias='pressureInches')
-    short_rad: str = Field(..., alias='shortRad')
-    temp_c: str = Field(..., alias='tempC')
-    temp_f: str = Field(..., alias='tempF')
-    time: str
-    uv_index: str = Field(..., alias='uvIndex')
-    visibility: str
-    visibility_miles: str = Field(..., alias='visibilityMiles')
-    weather_code: str = Field(..., alias='weatherCode')
+    dew_point_c: int = Field(..., alias='DewPointC')
+    dew_point_f: int = Field(..., alias='DewPointF')
+    feels_like_c: int = Field(..., alias='FeelsLikeC')
+    feels_like_f: int = Field(..., alias='FeelsLikeF')
+    heat_index_c: int = Field(..., alias='HeatIndexC')
+    heat_index_f: int = Field(..., alias='HeatIndexF')
+    wind_chill_c: int = Field(..., alias='WindChillC')
+    wind_chill_f: int = Field(..., alias='WindChillF')
+    wind_gust_kmph: int = Field(..., alias='WindGustKmph')
+    wind_gust_miles: int = Field(..., alias='WindGustMiles')
+    chanceoffog: int
+    chanceoffrost: int
+    chanceofhightemp: int
+    chanceofovercast: int
+    chanceofrain: int
+    chanceofremdry: int
+    chanceofsnow: int
+    chanceofsunshine: int
+    chanceofthunder: int
+    chanceofwindy: int
+    cloudcover: int
+    diff_rad: float = Field(..., alias='diffRad')
+    humidity: int
+    precip_inches: float = Field(..., alias='precipInches')
+    precip_mm: float = Field(..., alias='precipMM')
+    pressure: int
+    pressure_inches: float = Field(..., alias='pressureInches')
+    short_rad: float = Field(..., alias='shortRad')
+    temp_c: int = Field(..., alias='tempC')
+    temp_f: int = Field(..., alias='tempF')
+    time: int
+    uv_index: int = Field(..., alias='uvIndex')
+    visibility: int
+    visibility_miles: float = Field(..., alias='visibilityMiles')
+    weather_code: int = Field(..., alias='weatherCode')
     weather_desc: List[WeatherDesc] = Field(..., alias='weatherDesc')
     weather_icon_url: List[WeatherIconUrl] = Field(..., alias='weatherIconUrl')
     winddir16_point: str = Field(..., alias='winddir16Point')
-    winddir_degree: str = Field(..., alias='winddirDegree')
-    windspeed_kmph: str = Field(..., alias='windspeedKmph')
-    windspeed_miles: str = Field(..., alias='windspeedMiles')
+    winddir_degree: int = Field(..., alias='winddirDegree')
+    windspeed_kmph: int = Field(..., alias='windspeedKmph')
+    windspeed_miles: int = Field(..., alias='windspeedMiles')
 
 class Weather(BaseModel):
     astronomy: List[Astronomy]
@@ -2,14 +2,23 @@ import pytest
 from httpx import AsyncClient, ASGITransport
 from fastapi import FastAPI
 import os
+import time
+import asyncio
+import json
 import sys
+import threading
 from unittest.mock import MagicMock, patch
 from datetime import date, timedelta, datetime
 
 # Add the parent directory to the path so we can import the api module
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from api import app, WeatherReport
+import api
+from api import app, WeatherReport, verify_query_plans, report_cache, stats_cache
+from events import EventHub
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+import msgpack
 
 @pytest.fixture
 def mock_mongo_client():
@@ -22,6 +31,14 @@ def mock_mongo_client():
         mock_db.__getitem__.return_value = mock_collection
         yield mock_collection
 
+@pytest.fixture(autouse=True)
+def clear_report_cache():
+    report_cache.clear()
+    stats_cache.clear()
+    yield
+    report_cache.clear()
+    stats_cache.clear()
+
 @pytest.fixture
 async def client():
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
@@ -76,3 +93,639 @@ async def test_get_report_by_date_not_found(client: AsyncClient, mock_mongo_clie
     response = await client.get("/weather/2024-01-02")
     assert response.status_code == 404
     assert response.json() == {"detail": "No weather report found for date: 2024-01-02"}
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_overlap_db_io(client: AsyncClient, mock_mongo_client):
+    def slow_find_one(query):
+        time.sleep(0.2)
+        return {
+            "_id": "60d5ec49e7ef42e3f8a3e3a0",
+            "date": query["date"],
+            "hourly": [],
+            "timestamp_recorded_utc": datetime.utcnow().isoformat()
+        }
+    mock_mongo_client.find_one.side_effect = slow_find_one
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.get(f"/weather/2024-01-0{day}") for day in range(1, 6)))
+    elapsed = time.perf_counter() - start
+
+    assert all(response.status_code == 200 for response in responses)
+    # Five blocking 200ms lookups would take a full second if run on the event loop
+    assert elapsed < 0.6
+
+def test_verify_query_plans_warns_on_collscan(caplog):
+    collscan_plan = {"queryPlanner": {"winningPlan": {"stage": "LIMIT", "inputStage": {"stage": "COLLSCAN"}}}}
+    ixscan_plan = {"queryPlanner": {"winningPlan": {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}}
+    reports = MagicMock()
+    reports.find.return_value.limit.return_value.explain.return_value = collscan_plan
+    attempts = MagicMock()
+    attempts.find.return_value.sort.return_value.limit.return_value.explain.return_value = ixscan_plan
+    db = {"hourly_reports": reports, "attempts": attempts}
+
+    assert verify_query_plans(db) == ["hourly_reports by location and date"]
+    assert "COLLSCAN" in caplog.text
+
+@pytest.mark.asyncio
+async def test_report_cache_shares_keyword_and_literal_date(client: AsyncClient, mock_mongo_client):
+    today = date.today().strftime("%Y-%m-%d")
+    mock_mongo_client.find_one.return_value = {
+        "_id": "60d5ec49e7ef42e3f8a3e3a0",
+        "date": today,
+        "hourly": [],
+        "timestamp_recorded_utc": datetime.utcnow().isoformat()
+    }
+    before = report_cache.stats()
+    first = await client.get("/weather/today")
+    second = await client.get(f"/weather/{today}")
+    third = await client.get("/weather/latest")
+
+    assert first.status_code == second.status_code == third.status_code == 200
+    assert first.content == second.content == third.content
+    assert mock_mongo_client.find_one.call_count == 1
+    stats = (await client.get("/cache/stats")).json()
+    assert stats["hits"] - before["hits"] == 2
+    assert stats["misses"] - before["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_report_cache_does_not_store_misses(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find_one.return_value = None
+    await client.get("/weather/2024-01-02")
+    await client.get("/weather/2024-01-02")
+    assert mock_mongo_client.find_one.call_count == 2
+
+def test_watch_database_changes_evicts_changed_dates():
+    report_cache.set(("18966", "2024-01-01"), b"stale")
+    report_cache.set(("18966", "2024-01-02"), b"fresh")
+    report_cache.set(("10001", "2024-01-01"), b"other location")
+    change = {
+        "operationType": "update",
+        "ns": {"db": "weather_db", "coll": "hourly_reports"},
+        "fullDocument": {"location": "18966", "date": "2024-01-01"},
+    }
+
+    stream = MagicMock()
+    stream.__enter__.return_value = stream
+    stream.alive = True
+    def try_next():
+        api.change_watcher_stop.set()
+        return change
+    stream.try_next.side_effect = try_next
+    db = MagicMock()
+    db.watch.return_value = stream
+    loop = MagicMock()
+    loop.call_soon_threadsafe.side_effect = lambda func, *args: func(*args)
+
+    api.change_watcher_stop.clear()
+    with patch('api.get_mongo_client', return_value={"weather_db": db}):
+        api.watch_database_changes(loop)
+
+    assert report_cache.get(("18966", "2024-01-01")) is None
+    assert report_cache.get(("18966", "2024-01-02")) == b"fresh"
+    assert report_cache.get(("10001", "2024-01-01")) == b"other location"
+    assert api.cache_invalidation_mode == "ttl"
+
+def test_watch_database_changes_falls_back_to_ttl_on_standalone():
+    db = MagicMock()
+    db.watch.side_effect = OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    api.change_watcher_stop.clear()
+    with patch('api.get_mongo_client', return_value={"weather_db": db}):
+        api.watch_database_changes(MagicMock())
+
+    assert db.watch.call_count == 1
+    assert api.cache_invalidation_mode == "ttl"
+
+def test_watch_database_changes_drops_every_cache_when_history_is_lost():
+    report_cache.set(("18966", "2024-01-01"), b"report")
+    stats_cache.set(("summary", "18966"), b"stats")
+    db = MagicMock()
+    def lost_history(*args, **kwargs):
+        api.change_watcher_stop.set()
+        raise OperationFailure("resume point no longer in the oplog", code=286)
+    db.watch.side_effect = lost_history
+    loop = MagicMock()
+    loop.call_soon_threadsafe.side_effect = lambda func, *args: func(*args)
+
+    api.change_watcher_stop.clear()
+    with patch('api.get_mongo_client', return_value={"weather_db": db}):
+        api.watch_database_changes(loop)
+
+    assert len(report_cache) == 0
+    assert len(stats_cache) == 0
+
+@pytest.mark.asyncio
+async def test_report_evicted_during_lookup_is_not_cached(client: AsyncClient, mock_mongo_client):
+    reading, evicted = threading.Event(), threading.Event()
+    def find_one(query):
+        reading.set()
+        evicted.wait(1)
+        return {"_id": "r1", "date": "2024-01-01", "hourly": [], "timestamp_recorded_utc": "2024-01-01T12:00:00"}
+    mock_mongo_client.find_one.side_effect = find_one
+
+    async def upsert_lands_mid_read():
+        await asyncio.to_thread(reading.wait, 1)
+        api.handle_change({
+            "operationType": "update",
+            "ns": {"coll": "hourly_reports"},
+            "fullDocument": {"location": "18966", "date": "2024-01-01"},
+        })
+        evicted.set()
+
+    with patch('api.event_hub', EventHub(buffer_size=10, queue_size=10)):
+        response, _ = await asyncio.gather(client.get("/weather/2024-01-01"), upsert_lands_mid_read())
+
+    assert response.status_code == 200
+    assert report_cache.get(("18966", "2024-01-01")) is None
+    await client.get("/weather/2024-01-01")
+    assert mock_mongo_client.find_one.call_count == 2
+    # Without a concurrent eviction the read is cached as usual
+    await client.get("/weather/2024-01-01")
+    assert mock_mongo_client.find_one.call_count == 2
+    # Nothing is kept per key once its lookups finish, however often it is evicted
+    api.invalidate_report(("18966", "2024-01-02"))
+    assert api.report_lookups == {}
+
+@pytest.mark.asyncio
+async def test_conditional_get_returns_304_for_matching_etag(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find_one.return_value = {
+        "_id": "60d5ec49e7ef42e3f8a3e3a0",
+        "date": "2024-01-01",
+        "hourly": [],
+        "timestamp_recorded_utc": datetime(2024, 1, 1, 12, 0, 0)
+    }
+    first = await client.get("/weather/2024-01-01")
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"] == "Mon, 01 Jan 2024 12:00:00 GMT"
+    assert "max-age" in first.headers["cache-control"]
+
+    cached = await client.get("/weather/2024-01-01", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    # A cold cache still answers 304 without serializing the report
+    report_cache.clear()
+    with patch("api.WeatherReport.model_validate") as model_validate:
+        cold = await client.get("/weather/2024-01-01", headers={"If-None-Match": f'"other", {etag}'})
+    assert cold.status_code == 304
+    model_validate.assert_not_called()
+
+    changed = await client.get("/weather/2024-01-01", headers={"If-None-Match": '"other"'})
+    assert changed.status_code == 200
+
+@pytest.mark.asyncio
+async def test_conditional_get_honours_if_modified_since(client: AsyncClient, mock_mongo_client):
+    today = date.today().strftime("%Y-%m-%d")
+    mock_mongo_client.find_one.return_value = {
+        "_id": "60d5ec49e7ef42e3f8a3e3a0",
+        "date": today,
+        "hourly": [],
+        "timestamp_recorded_utc": datetime(2024, 1, 1, 12, 0, 0, 500000)
+    }
+    not_modified = await client.get("/weather/today", headers={"If-Modified-Since": "Mon, 01 Jan 2024 12:00:00 GMT"})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["cache-control"] == "public, no-cache"
+
+    modified = await client.get("/weather/today", headers={"If-Modified-Since": "Mon, 01 Jan 2024 11:59:59 GMT"})
+    assert modified.status_code == 200
+
+def _range_docs(*dates):
+    return [{
+        "_id": f"60d5ec49e7ef42e3f8a3e3a{i}",
+        "date": day,
+        "hourly": [],
+        "timestamp_recorded_utc": datetime(2024, 1, 1, 12, 0, 0)
+    } for i, day in enumerate(dates)]
+
+@pytest.mark.asyncio
+async def test_get_reports_in_range_streams_ndjson(client: AsyncClient, mock_mongo_client):
+    docs = _range_docs("2024-01-01", "2024-01-02", "2024-01-03")
+    mock_mongo_client.find.return_value.sort.return_value.batch_size.return_value.__iter__.return_value = iter(docs)
+
+    response = await client.get("/weather/range", params={"start": "2024-01-01", "end": "2024-01-03"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["date"] for line in response.text.splitlines()] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    mock_mongo_client.find.assert_called_once_with({"location": "18966", "date": {"$gte": "2024-01-01", "$lte": "2024-01-03"}})
+    assert "x-next-cursor" not in response.headers
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+
+@pytest.mark.asyncio
+async def test_get_reports_in_range_paginates_with_cursor(client: AsyncClient, mock_mongo_client):
+    page = MagicMock()
+    page.__iter__.return_value = iter(_range_docs("2024-01-01", "2024-01-02"))
+    lookahead = MagicMock()
+    lookahead.__iter__.return_value = iter([{"date": "2024-01-03"}])
+    def find(query, projection=None):
+        cursor = MagicMock()
+        if projection:
+            cursor.sort.return_value.skip.return_value.limit.return_value = lookahead
+        else:
+            cursor.sort.return_value.batch_size.return_value.limit.return_value = page
+        return cursor
+    mock_mongo_client.find.side_effect = find
+
+    response = await client.get("/weather/range", params={"start": "2024-01-01", "end": "2024-01-31", "limit": 2, "format": "json"})
+
+    assert response.status_code == 200
+    assert [report["date"] for report in response.json()] == ["2024-01-01", "2024-01-02"]
+    assert response.headers["x-next-cursor"] == "2024-01-03"
+
+    response = await client.get("/weather/range", params={"start": "2024-01-01", "end": "2024-01-31", "cursor": "2024-01-03", "limit": 2})
+    assert mock_mongo_client.find.call_args_list[-1].args[0] == {"location": "18966", "date": {"$gte": "2024-01-03", "$lte": "2024-01-31"}}
+
+    # A cursor from before start can't widen the range
+    await client.get("/weather/range", params={"start": "2024-01-10", "end": "2024-01-31", "cursor": "2023-06-01", "limit": 2})
+    assert mock_mongo_client.find.call_args_list[-1].args[0] == {"location": "18966", "date": {"$gte": "2024-01-10", "$lte": "2024-01-31"}}
+
+@pytest.mark.asyncio
+async def test_get_reports_in_range_rejects_reversed_range(client: AsyncClient, mock_mongo_client):
+    response = await client.get("/weather/range", params={"start": "2024-01-05", "end": "2024-01-01"})
+    assert response.status_code == 400
+
+def _hour(**overrides):
+    hour = {
+        "DewPointC": "5", "DewPointF": "41", "FeelsLikeC": "7", "FeelsLikeF": "44",
+        "HeatIndexC": "9", "HeatIndexF": "48", "WindChillC": "7", "WindChillF": "44",
+        "WindGustKmph": "25", "WindGustMiles": "16",
+        "chanceoffog": "0", "chanceoffrost": "0", "chanceofhightemp": "0", "chanceofovercast": "40",
+        "chanceofrain": "0", "chanceofremdry": "85", "chanceofsnow": "0", "chanceofsunshine": "70",
+        "chanceofthunder": "0", "chanceofwindy": "0", "cloudcover": "22", "diffRad": "0.0",
+        "humidity": "75", "precipInches": "0.0", "precipMM": "0.0", "pressure": "1019",
+        "pressureInches": "30", "shortRad": "0.0", "tempC": "9", "tempF": "48", "time": "900",
+        "uvIndex": "0", "visibility": "10", "visibilityMiles": "6", "weatherCode": "116",
+        "weatherDesc": [{"value": "Partly cloudy"}], "weatherIconUrl": [{"value": ""}],
+        "winddir16Point": "WSW", "winddirDegree": "244", "windspeedKmph": "16", "windspeedMiles": "10",
+    }
+    hour.update(overrides)
+    return hour
+
+@pytest.mark.asyncio
+async def test_report_accepts_legacy_string_and_typed_hourly(client: AsyncClient, mock_mongo_client):
+    typed = {key: value for key, value in _hour().items()}
+    typed.update({"tempF": 48, "time": 900, "precipMM": 0.0, "windspeedMiles": 10})
+    mock_mongo_client.find_one.return_value = {
+        "_id": "60d5ec49e7ef42e3f8a3e3a0",
+        "date": "2024-01-01",
+        "hourly": [_hour(), typed],
+        "schema_version": None,
+        "timestamp_recorded_utc": datetime(2024, 1, 1, 12, 0, 0)
+    }
+    response = await client.get("/weather/2024-01-01")
+
+    assert response.status_code == 200
+    legacy_hour, typed_hour = response.json()["hourly"]
+    assert legacy_hour == typed_hour
+    assert typed_hour["tempF"] == 48
+    assert typed_hour["time"] == 900
+    assert typed_hour["precipMM"] == 0.0
+    assert typed_hour["winddir16Point"] == "WSW"
+
+def test_serialize_report_fast_path_matches_validated_output():
+    typed = api.Hourly.model_validate(_hour()).model_dump(by_alias=True)
+    report = {
+        "_id": ObjectId("60d5ec49e7ef42e3f8a3e3a0"),
+        "location": "18966",
+        "date": "2024-01-01",
+        "hourly": [typed, {**typed, "extra": "dropped"}],
+        "hourly_hash": "abc",
+        "schema_version": 2,
+        "timestamp_recorded_utc": datetime(2024, 1, 1, 12, 0, 0, 250000),
+    }
+
+    with patch.object(WeatherReport, "model_validate", wraps=WeatherReport.model_validate) as validate:
+        body = api.serialize_report(report)
+        validate.assert_not_called()
+
+    assert body == WeatherReport.model_validate(report).model_dump_json(by_alias=True).encode()
+
+@pytest.mark.asyncio
+async def test_get_weather_stats_runs_memoized_aggregation(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.aggregate.return_value = [
+        {"_id": "2024-01-01", "first_date": "2024-01-01", "last_date": "2024-01-01", "hours": 8, "min": 3.0, "max": 21.0, "avg": 11.5, "exceedances": 2},
+        {"_id": "2024-01-02", "first_date": "2024-01-02", "last_date": "2024-01-02", "hours": 8, "min": 1.0, "max": 9.0, "avg": 4.0, "exceedances": 0},
+    ]
+    params = {"start": "2024-01-01", "end": "2024-01-02", "metric": "windspeedMiles", "threshold": 15}
+
+    response = await client.get("/weather/stats", params=params)
+    again = await client.get("/weather/stats", params=params)
+
+    assert response.status_code == 200
+    assert response.json() == again.json()
+    body = response.json()
+    assert body["buckets"][0] == {"period": "2024-01-01", "first_date": "2024-01-01", "last_date": "2024-01-01", "hours": 8, "min": 3.0, "max": 21.0, "avg": 11.5, "exceedances": 2}
+    assert mock_mongo_client.aggregate.call_count == 1
+    pipeline = mock_mongo_client.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {"location": "18966", "date": {"$gte": "2024-01-01", "$lte": "2024-01-02"}}}
+    assert {"$unwind": "$hourly"} in pipeline
+    assert pipeline[4]["$group"]["exceedances"] == {"$sum": {"$cond": [{"$gte": ["$value", 15.0]}, 1, 0]}}
+
+@pytest.mark.asyncio
+async def test_get_weather_stats_rejects_unknown_metric(client: AsyncClient, mock_mongo_client):
+    response = await client.get("/weather/stats", params={"start": "2024-01-01", "end": "2024-01-02", "metric": "winddir16Point"})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_get_daily_summary_projects_only_requested_metrics(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.aggregate.return_value = [{
+        "_id": "2024-01-01", "hours": 8,
+        "tempF__min": 30.0, "tempF__max": 47.0, "tempF__avg": 38.125,
+        "windspeedMiles__min": 5.0, "windspeedMiles__max": 22.0, "windspeedMiles__avg": 11.0,
+    }]
+
+    response = await client.get("/weather/summary", params={"start": "2024-01-01", "metrics": "tempF,windspeedMiles"})
+
+    assert response.status_code == 200
+    assert response.json() == [{
+        "date": "2024-01-01", "location": "18966", "hours": 8,
+        "metrics": {
+            "tempF": {"min": 30.0, "max": 47.0, "avg": 38.12},
+            "windspeedMiles": {"min": 5.0, "max": 22.0, "avg": 11.0},
+        },
+    }]
+    pipeline = mock_mongo_client.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {"location": "18966", "date": {"$gte": "2024-01-01", "$lte": "2024-01-01"}}}
+    assert pipeline[1] == {"$project": {"_id": 0, "date": 1, "hourly.tempF": 1, "hourly.windspeedMiles": 1}}
+
+    too_long = await client.get("/weather/summary", params={"start": "2024-01-01", "end": "2024-03-01"})
+    assert too_long.status_code == 400
+
+@pytest.mark.asyncio
+async def test_find_hours_filters_in_the_pipeline(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.aggregate.return_value = [
+        {"date": "2024-01-01", "time": 1200, "value": 18.0},
+        {"date": "2024-01-02", "time": 0, "value": 16.0},
+    ]
+    params = {"start": "2024-01-01", "end": "2024-01-02", "metric": "windspeedMiles", "op": ">=", "value": 15}
+
+    response = await client.get("/weather/hours", params=params)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["hours"] == [
+        {"date": "2024-01-01", "time": 1200, "value": 18.0},
+        {"date": "2024-01-02", "time": 0, "value": 16.0},
+    ]
+    assert body["truncated"] is False
+    pipeline = mock_mongo_client.aggregate.call_args.args[0]
+    assert pipeline[1] == {"$project": {"_id": 0, "date": 1, "hourly.time": 1, "hourly.windspeedMiles": 1}}
+    assert {"$match": {"value": {"$gte": 15.0}}} in pipeline
+
+    missing_value = await client.get("/weather/hours", params={"start": "2024-01-01", "metric": "windspeedMiles", "op": ">="})
+    assert missing_value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_get_report_by_date_with_location(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find_one.return_value = {
+        "_id": "60d5ec49e7ef42e3f8a3e3a0",
+        "location": "10001",
+        "date": "2024-01-01",
+        "hourly": [],
+        "timestamp_recorded_utc": datetime.utcnow().isoformat()
+    }
+    response = await client.get("/weather/2024-01-01", params={"location": "10001"})
+    assert response.status_code == 200
+    assert response.json()["location"] == "10001"
+    mock_mongo_client.find_one.assert_called_once_with({"location": "10001", "date": "2024-01-01"})
+
+    await client.get("/weather/2024-01-01")
+    mock_mongo_client.find_one.assert_called_with({"location": "18966", "date": "2024-01-01"})
+
+@pytest.mark.asyncio
+async def test_get_forecast_as_of_returns_matching_snapshot(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.aggregate.return_value = [{
+        "location": "18966",
+        "date": "2024-01-03",
+        "snapshot": {"recorded_utc": datetime(2024, 1, 1, 6, 0), "hourly_hash": "abc", "hourly": [_hour()]},
+    }]
+
+    response = await client.get("/weather/2024-01-03/as-of", params={"at": "2024-01-01T03:00:00-05:00"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["recorded_utc"] == "2024-01-01T06:00:00"
+    assert body["hourly"][0]["tempF"] == 48
+    pipeline = mock_mongo_client.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {"location": "18966", "date": "2024-01-03"}}
+    cond = pipeline[1]["$project"]["snapshot"]["$arrayElemAt"][0]["$filter"]["cond"]
+    assert cond == {"$lte": ["$$s.recorded_utc", datetime(2024, 1, 1, 8, 0)]}
+
+@pytest.mark.asyncio
+async def test_get_forecast_as_of_not_found_before_first_snapshot(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.aggregate.return_value = [{"location": "18966", "date": "2024-01-03"}]
+    response = await client.get("/weather/2024-01-03/as-of", params={"at": "2023-12-01T00:00:00"})
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_get_logs_summary_reads_daily_rollups(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find.return_value.sort.return_value = [{
+        "date": "2024-01-01", "location": "18966", "attempts": 26, "successes": 24, "failures": 2,
+        "not_modified": 10, "avg_duration_ms": 412.5, "max_duration_ms": 2210.0,
+    }]
+
+    response = await client.get("/logs/summary", params={"start": "2024-01-01", "end": "2024-01-07", "location": "18966"})
+
+    assert response.status_code == 200
+    assert response.json()[0]["failures"] == 2
+    mock_mongo_client.find.assert_called_once_with(
+        {"date": {"$gte": "2024-01-01", "$lte": "2024-01-07"}, "location": "18966"}, {"_id": 0}
+    )
+
+def _attempts(count, start=datetime(2024, 1, 1, 12, 0)):
+    return [
+        {"_id": ObjectId(f"{index:024x}"), "location": "18966", "attempt_number": 1, "timestamp_utc": start - timedelta(hours=index),
+         "success": index % 2 == 0, "status_code": 200 if index % 2 == 0 else 503, "error": None}
+        for index in range(count)
+    ]
+
+@pytest.mark.asyncio
+async def test_get_logs_pages_with_keyset_cursor(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find.return_value.sort.return_value.limit.return_value = _attempts(3)
+
+    response = await client.get("/logs", params={"limit": 2, "success": "false"})
+
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    cursor = response.headers["X-Next-Cursor"]
+    assert cursor == f"2024-01-01T11:00:00_{ObjectId(f'{1:024x}')}"
+    mock_mongo_client.find.return_value.sort.return_value.limit.assert_called_with(3)
+
+    await client.get("/logs", params={"limit": 2, "success": "false", "cursor": cursor})
+
+    query = mock_mongo_client.find.call_args.args[0]
+    assert query["success"] is False
+    assert query["timestamp_utc"] == {"$lte": datetime(2024, 1, 1, 11, 0)}
+    assert query["$or"][1] == {"_id": {"$lt": ObjectId(f"{1:024x}")}}
+
+@pytest.mark.asyncio
+async def test_get_logs_projects_requested_fields(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find.return_value.sort.return_value.limit.return_value = [
+        {"_id": ObjectId(f"{0:024x}"), "timestamp_utc": datetime(2024, 1, 1, 12, 0), "status_code": 503}
+    ]
+
+    response = await client.get("/logs", params={"fields": "status_code", "since": "2024-01-01T00:00:00Z"})
+
+    assert response.status_code == 200
+    assert response.json() == [{"_id": f"{0:024x}", "timestamp_utc": "2024-01-01T12:00:00", "status_code": 503}]
+    query, projection = mock_mongo_client.find.call_args.args
+    assert projection == {"timestamp_utc": 1, "status_code": 1}
+    assert query == {"timestamp_utc": {"$gte": datetime(2024, 1, 1, 0, 0)}}
+
+@pytest.mark.asyncio
+async def test_get_logs_rejects_unknown_fields_and_bad_cursor(client: AsyncClient, mock_mongo_client):
+    assert (await client.get("/logs", params={"fields": "password"})).status_code == 400
+    assert (await client.get("/logs", params={"cursor": "nope"})).status_code == 400
+
+
+def test_handle_change_fans_out_one_event_to_every_subscriber():
+    hub = EventHub(buffer_size=10, queue_size=10)
+    attempt = {"_id": ObjectId(f"{0:024x}"), "location": "18966", "attempt_number": 1,
+               "timestamp_utc": datetime(2024, 1, 1, 12, 0), "success": True, "status_code": 200, "error": None}
+    report = {"_id": "r1", "location": "18966", "date": "2024-01-01", "timestamp_recorded_utc": datetime(2024, 1, 1, 12, 0)}
+
+    with patch('api.event_hub', hub):
+        everything, _ = hub.subscribe()
+        attempts_only, _ = hub.subscribe(["attempt"])
+        api.handle_change({"operationType": "insert", "ns": {"coll": "attempts"}, "fullDocument": attempt})
+        api.handle_change({"operationType": "update", "ns": {"coll": "hourly_reports"}, "fullDocument": report})
+
+    assert [event["type"] for event in everything.queue._queue] == ["attempt", "report"]
+    assert [event["type"] for event in attempts_only.queue._queue] == ["attempt"]
+    assert everything.queue._queue[0]["data"]["status_code"] == 200
+    assert everything.queue._queue[1]["data"]["date"] == "2024-01-01"
+
+def test_event_hub_resumes_from_last_event_id():
+    hub = EventHub(buffer_size=3, queue_size=10)
+    events = [hub.publish("attempt", {"n": n}) for n in range(5)]
+
+    subscriber, resumed = hub.subscribe(last_event_id=events[2]["id"])
+    assert resumed
+    assert [event["data"]["n"] for event in subscriber.queue._queue] == [3, 4]
+
+    _, resumed = hub.subscribe(last_event_id=events[0]["id"])  # rotated out of the buffer
+    assert not resumed
+    _, resumed = hub.subscribe(last_event_id="previous-process-7")
+    assert not resumed
+
+@pytest.mark.asyncio
+async def test_resume_with_a_backlog_larger_than_the_queue_ends_in_a_reset():
+    hub = EventHub(buffer_size=10, queue_size=2)
+    events = [hub.publish("attempt", {"n": n}) for n in range(6)]
+
+    subscriber, resumed = hub.subscribe(last_event_id=events[0]["id"])
+    assert resumed
+    assert subscriber.lagged
+
+    with patch('api.event_hub', hub):
+        chunks = [chunk async for chunk in api._event_stream(MagicMock(), subscriber, resumed)]
+
+    assert [line for chunk in chunks for line in chunk.split(b"\n") if line.startswith(b"event:")] == [
+        b"event: attempt", b"event: attempt", b"event: reset"
+    ]
+    # A backlog that fits is replayed in full
+    subscriber, _ = hub.subscribe(last_event_id=events[3]["id"])
+    assert not subscriber.lagged
+    assert subscriber.queue.qsize() == 2
+
+@pytest.mark.asyncio
+async def test_event_stream_drains_lagged_subscriber_then_resets():
+    hub = EventHub(buffer_size=10, queue_size=2)
+    subscriber, _ = hub.subscribe()
+    for n in range(3):
+        hub.publish("attempt", {"n": n})
+    request = MagicMock()
+
+    with patch('api.event_hub', hub):
+        chunks = [chunk async for chunk in api._event_stream(request, subscriber, True)]
+
+    assert [line for chunk in chunks for line in chunk.split(b"\n") if line.startswith(b"event:")] == [
+        b"event: attempt", b"event: attempt", b"event: reset"
+    ]
+    assert chunks[0].startswith(f"id: {hub.epoch}-1".encode())
+    assert len(hub) == 0
+
+def test_poll_new_documents_skips_already_seen_documents_at_the_watermark():
+    stamp = datetime(2024, 1, 1, 12, 0)
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value.limit.return_value = [
+        {"_id": 1, "timestamp_utc": stamp},
+        {"_id": 2, "timestamp_utc": stamp},
+        {"_id": 3, "timestamp_utc": stamp + timedelta(minutes=1)},
+    ]
+
+    fresh, watermark = api._poll_new_documents(collection, "timestamp_utc", (stamp, {1}))
+
+    assert [document["_id"] for document in fresh] == [2, 3]
+    assert watermark == (stamp + timedelta(minutes=1), {3})
+
+def _typed_report(date_str="2024-01-01", hours=8):
+    typed = api.Hourly.model_validate(_hour()).model_dump(by_alias=True)
+    return {
+        "_id": ObjectId("60d5ec49e7ef42e3f8a3e3a0"), "location": "18966", "date": date_str,
+        "hourly": [{**typed, "time": hour * 300} for hour in range(hours)],
+        "schema_version": 2, "timestamp_recorded_utc": datetime(2024, 1, 1, 12, 0, 0),
+    }
+
+@pytest.mark.asyncio
+async def test_report_is_compressed_once_per_negotiated_encoding(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find_one.return_value = _typed_report()
+
+    plain = await client.get("/weather/2024-01-01", headers={"Accept-Encoding": "identity"})
+    brotli_response = await client.get("/weather/2024-01-01", headers={"Accept-Encoding": "gzip;q=0.5, br"})
+    gzip_response = await client.get("/weather/2024-01-01", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in plain.headers
+    assert brotli_response.headers["content-encoding"] == "br"
+    assert gzip_response.headers["content-encoding"] == "gzip"
+    assert brotli_response.json() == gzip_response.json() == plain.json()
+    assert len({plain.headers["etag"], brotli_response.headers["etag"], gzip_response.headers["etag"]}) == 3
+    assert int(brotli_response.headers["content-length"]) * 4 < len(plain.content)
+    assert mock_mongo_client.find_one.call_count == 1
+
+@pytest.mark.asyncio
+async def test_report_columnar_and_msgpack_representations(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find_one.return_value = _typed_report()
+
+    columnar = await client.get("/weather/2024-01-01", params={"format": "columnar"})
+    packed = await client.get("/weather/2024-01-01", params={"format": "columnar"}, headers={"Accept": "application/x-msgpack"})
+
+    body = columnar.json()
+    assert body["hours"] == 8
+    assert body["hourly"]["time"] == [0, 300, 600, 900, 1200, 1500, 1800, 2100]
+    assert body["hourly"]["weatherDesc"] == ["Partly cloudy"] * 8
+    assert packed.headers["content-type"] == "application/x-msgpack"
+    assert msgpack.unpackb(packed.content) == body
+    assert columnar.headers["etag"] != packed.headers["etag"]
+
+@pytest.mark.asyncio
+async def test_range_stream_is_gzipped_and_supports_columnar(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find.return_value.sort.return_value.batch_size.return_value.__iter__.return_value = iter(
+        [_typed_report("2024-01-01"), _typed_report("2024-01-02")]
+    )
+
+    response = await client.get(
+        "/weather/range", params={"start": "2024-01-01", "end": "2024-01-02", "format": "columnar"},
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+    assert [report["date"] for report in response.json()] == ["2024-01-01", "2024-01-02"]
+    assert response.json()[0]["hourly"]["tempF"] == [48] * 8
+
+@pytest.mark.asyncio
+async def test_metrics_report_route_latency_db_time_and_cache_counters(client: AsyncClient, mock_mongo_client):
+    mock_mongo_client.find_one.return_value = _typed_report()
+    await client.get("/weather/2024-01-01")
+    await client.get("/weather/2024-01-01")
+
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    text = response.text
+    assert 'api_http_request_duration_seconds_count{method="GET",route="/weather/{date_str}",status="200"}' in text
+    assert 'api_db_query_duration_seconds_count{route="/weather/{date_str}"}' in text
+    assert 'api_cache_hits_total{cache="report"}' in text
+    assert "api_http_requests_in_flight" in text
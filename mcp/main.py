@@ -3,6 +3,9 @@ import httpx
 import os
 import json
 import asyncio
+import re
+from datetime import date, timedelta
+from typing import Optional
 from starlette.responses import StreamingResponse
 
 # Initialize FastMCP
@@ -11,83 +14,331 @@ mcp = FastMCP("My API MCP Wrapper")
 # Configuration - set via environment variables
 API_BASE_URL = os.getenv("API_BASE_URL", "http://api:8000")
 API_TIMEOUT = int(os.getenv("API_TIMEOUT", "30"))
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "20"))
+API_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("API_MAX_KEEPALIVE_CONNECTIONS", "10"))
+API_HTTP2 = os.getenv("API_HTTP2", "false").lower() == "true"
+# How long identical tool calls are answered from memory. Logs change with every scrape attempt.
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+LOGS_CACHE_TTL_SECONDS = float(os.getenv("LOGS_CACHE_TTL_SECONDS", "5"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
 
 # HTTP client for calling the existing API
-http_client = httpx.AsyncClient(base_url=API_BASE_URL, timeout=API_TIMEOUT)
+http_client = httpx.AsyncClient(
+    base_url=API_BASE_URL,
+    timeout=API_TIMEOUT,
+    limits=httpx.Limits(max_connections=API_MAX_CONNECTIONS, max_keepalive_connections=API_MAX_KEEPALIVE_CONNECTIONS),
+    http2=API_HTTP2,
+)
+# Event streams stay open indefinitely, so they get their own client rather
+# than holding connections from the tool calls' pool
+event_client = httpx.AsyncClient(base_url=API_BASE_URL, timeout=API_TIMEOUT)
 
+# (path, params) -> (expires_at, body, headers) for recent responses, and the
+# requests currently in flight, which identical calls wait on instead of
+# sending their own
+_response_cache = {}
+_in_flight = {}
+
+# find_hours conditions, e.g. "windspeedMiles >= 20"
+CONDITION_PATTERN = re.compile(r"^\s*(\w+)\s*(>=|<=|==|>|<)\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def _location_params(location: Optional[str]) -> dict:
+    return {"location": location} if location else {}
+
+def _resolve_date(date_str: str) -> str:
+    """
+    Turns "today", "tomorrow" and "yesterday" into a YYYY-MM-DD date, so
+    calls with a keyword and with the literal date share a cache entry.
+    Anything else is passed through for the API to validate.
+    """
+    offsets = {"yesterday": -1, "today": 0, "tomorrow": 1}
+    if date_str in offsets:
+        return (date.today() + timedelta(days=offsets[date_str])).strftime("%Y-%m-%d")
+    return date_str
+
+def _parse_fields(fields: Optional[str]) -> Optional[set]:
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(",") if field.strip()}
+
+def _trim_report(report, fields: Optional[set]):
+    """
+    Keeps only the requested fields. Hourly entries keep the requested
+    hourly metrics plus "time"; the report keeps "date", "location" and any
+    requested top-level keys.
+    """
+    if not fields or not isinstance(report, dict):
+        return report
+    trimmed = {key: value for key, value in report.items() if key in fields or key in ("date", "location")}
+    if "hourly" in report:
+        trimmed["hourly"] = [
+            {key: value for key, value in hour.items() if key in fields or key == "time"}
+            for hour in report["hourly"]
+        ]
+    return trimmed
+
+def _prune_cache(now: float):
+    if len(_response_cache) < CACHE_MAX_ENTRIES:
+        return
+    for key in [key for key, (expires_at, _, _) in _response_cache.items() if expires_at <= now]:
+        del _response_cache[key]
+    while len(_response_cache) >= CACHE_MAX_ENTRIES:
+        del _response_cache[next(iter(_response_cache))]  # oldest first
+
+async def _fetch(path: str, params: dict):
+    response = await http_client.get(path, params=params)
+    response.raise_for_status()
+    return response.json(), {"X-Next-Cursor": response.headers.get("X-Next-Cursor")}
+
+async def _get_json(path: str, params: Optional[dict] = None, ttl: float = CACHE_TTL_SECONDS):
+    """
+    GETs an API path and returns (body, headers). Identical calls within
+    `ttl` are answered from memory, and identical calls made while one is
+    in flight share its upstream request. Errors are raised to every
+    caller and not cached.
+    """
+    params = params or {}
+    key = (path, tuple(sorted((name, str(value)) for name, value in params.items())))
+    loop = asyncio.get_running_loop()
+    cached = _response_cache.get(key)
+    if cached is not None and cached[0] > loop.time():
+        return cached[1], cached[2]
+
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch(path, params))
+        _in_flight[key] = task
+
+        def done(finished):
+            # Read even when every caller has given up, so asyncio doesn't log
+            # "Task exception was never retrieved"
+            failed = finished.cancelled() or finished.exception() is not None
+            _in_flight.pop(key, None)
+            if not failed and ttl > 0:
+                _prune_cache(loop.time())
+                body, headers = finished.result()
+                _response_cache[key] = (loop.time() + ttl, body, headers)
+
+        task.add_done_callback(done)
+    # Shielded so a caller that gives up doesn't cancel the request for the others
+    return await asyncio.shield(task)
+
+def _error(e: httpx.HTTPError) -> str:
+    if isinstance(e, httpx.HTTPStatusError):
+        return json.dumps({"error": f"API error: {e.response.status_code} - {e.response.text}", "status_code": e.response.status_code})
+    return json.dumps({"error": f"Network error: {e}", "status_code": None})
 
 @mcp.tool()
-async def get_latest_weather_report() -> dict:
+async def get_latest_weather_report(location: Optional[str] = None, fields: Optional[str] = None) -> dict:
     """
     Retrieves the latest weather report from the weather API.
     
+    Args:
+        location: Zip code or place name. Defaults to the API's default location.
+        fields: Comma-separated fields to return, e.g. "tempF,windspeedMiles,chanceofrain".
+            Hourly entries keep these metrics plus "time". Omit for the full report,
+            which is much larger.
+        
     Returns:
         The latest weather report data.
     """
-    try:
-        response = await http_client.get("/weather/latest")
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        return json.dumps({"error": f"API error: {e.response.status_code} - {e.response.text}", "status_code": e.response.status_code})
-    except httpx.RequestError as e:
-        return json.dumps({"error": f"Network error: {e}", "status_code": None})
+    return await get_weather_report_by_date("today", location, fields)
 
 @mcp.tool()
-async def get_weather_report_by_date(date_str: str) -> dict:
+async def get_weather_report_by_date(date_str: str, location: Optional[str] = None, fields: Optional[str] = None) -> dict:
     """
     Retrieves a weather report for a specific date from the weather API.
     
     Args:
         date_str: The date in YYYY-MM-DD format, or keywords like "today", "tomorrow", "yesterday".
+        location: Zip code or place name. Defaults to the API's default location.
+        fields: Comma-separated fields to return, e.g. "tempF,windspeedMiles,chanceofrain".
+            Hourly entries keep these metrics plus "time". Omit for the full report.
         
     Returns:
         The weather report data for the specified date.
     """
     try:
-        response = await http_client.get(f"/weather/{date_str}")
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        return json.dumps({"error": f"API error: {e.response.status_code} - {e.response.text}", "status_code": e.response.status_code})
-    except httpx.RequestError as e:
-        return json.dumps({"error": f"Network error: {e}", "status_code": None})
+        report, _ = await _get_json(f"/weather/{_resolve_date(date_str)}", _location_params(location))
+        return _trim_report(report, _parse_fields(fields))
+    except httpx.HTTPError as e:
+        return _error(e)
 
 @mcp.tool()
-async def get_attempt_logs() -> list:
+async def get_weather_reports_in_range(start: str, end: str, cursor: Optional[str] = None, limit: int = 31,
+                                       location: Optional[str] = None, fields: Optional[str] = None) -> dict:
     """
-    Retrieves a list of all data fetching attempt logs from the weather API.
+    Retrieves every weather report between two dates (inclusive) in a single call.
+    Prefer this over calling get_weather_report_by_date once per day.
     
+    Args:
+        start: First date in YYYY-MM-DD format, or keywords like "today", "tomorrow", "yesterday".
+        end: Last date in YYYY-MM-DD format, or the same keywords.
+        cursor: The next_cursor value from a previous call, to fetch the following page.
+        limit: Maximum number of daily reports to return per call.
+        location: Zip code or place name. Defaults to the API's default location.
+        fields: Comma-separated fields to return for each report, as for get_weather_report_by_date.
+        
+    Returns:
+        A dict with "reports" (the weather reports, oldest first) and "next_cursor"
+        (None when there are no more reports in the range).
+    """
+    params = {"start": _resolve_date(start), "end": _resolve_date(end), "limit": limit, "format": "json", **_location_params(location)}
+    if cursor:
+        params["cursor"] = cursor
+    try:
+        reports, headers = await _get_json("/weather/range", params)
+        requested = _parse_fields(fields)
+        return {"reports": [_trim_report(report, requested) for report in reports], "next_cursor": headers["X-Next-Cursor"]}
+    except httpx.HTTPError as e:
+        return _error(e)
+
+@mcp.tool()
+async def get_attempt_logs(limit: int = 100, success: Optional[bool] = None, fields: Optional[str] = None) -> list:
+    """
+    Retrieves the most recent data fetching attempt logs from the weather API, newest first.
+    
+    Args:
+        limit: Maximum number of attempts to return.
+        success: Only return successful (true) or failed (false) attempts.
+        fields: Comma-separated columns to return, e.g. "success,status_code,error".
+            "_id" and "timestamp_utc" are always included.
+        
     Returns:
         A list of attempt log entries.
     """
+    params = {"limit": limit}
+    if success is not None:
+        params["success"] = str(success).lower()
+    if fields:
+        params["fields"] = fields
     try:
-        response = await http_client.get("/logs")
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        return json.dumps({"error": f"API error: {e.response.status_code} - {e.response.text}", "status_code": e.response.status_code})
-    except httpx.RequestError as e:
-        return json.dumps({"error": f"Network error: {e}", "status_code": None})
+        logs, _ = await _get_json("/logs", params, ttl=LOGS_CACHE_TTL_SECONDS)
+        return logs
+    except httpx.HTTPError as e:
+        return _error(e)
 
+@mcp.tool()
+async def get_daily_summary(start: str = "today", end: Optional[str] = None, location: Optional[str] = None,
+                            metrics: Optional[str] = None) -> list:
+    """
+    Daily min/max/avg of the main weather metrics, without the hourly detail.
+    The cheapest way to answer "what's the weather like" for one or more days.
+    
+    Args:
+        start: First date in YYYY-MM-DD format, or keywords like "today", "tomorrow", "yesterday".
+        end: Last date (inclusive), up to 31 days after start. Defaults to start.
+        location: Zip code or place name. Defaults to the API's default location.
+        metrics: Comma-separated hourly metrics to summarize, e.g. "tempF,chanceofrain".
+            Defaults to temperature, wind, rain, humidity, cloud cover and UV index.
+        
+    Returns:
+        One entry per day: {"date", "location", "hours", "metrics": {metric: {"min", "max", "avg"}}}.
+    """
+    params = {"start": _resolve_date(start), **_location_params(location)}
+    if end:
+        params["end"] = _resolve_date(end)
+    if metrics:
+        params["metrics"] = metrics
+    try:
+        summaries, _ = await _get_json("/weather/summary", params)
+        return summaries
+    except httpx.HTTPError as e:
+        return _error(e)
 
-async def log_event_generator():
+@mcp.tool()
+async def get_hourly_metric(date_str: str, metric: str, location: Optional[str] = None) -> dict:
     """
-    An asynchronous generator that fetches logs from the API and yields them as SSE-formatted strings.
+    One hourly metric for a day, as (time, value) pairs.
+    
+    Args:
+        date_str: The date in YYYY-MM-DD format, or keywords like "today", "tomorrow", "yesterday".
+        metric: An hourly metric such as "tempF", "windspeedMiles", "WindGustMiles",
+            "chanceofrain", "precipInches", "humidity" or "uvIndex".
+        location: Zip code or place name. Defaults to the API's default location.
+        
+    Returns:
+        {"metric", "date", "hours": [{"time", "value"}]}, where time is HHMM (e.g. 900, 1500).
     """
+    resolved = _resolve_date(date_str)
+    try:
+        values, _ = await _get_json("/weather/hours", {"start": resolved, "metric": metric, **_location_params(location)})
+        return {
+            "metric": metric,
+            "date": values["start"],
+            "hours": [{"time": hour["time"], "value": hour["value"]} for hour in values["hours"]],
+        }
+    except httpx.HTTPError as e:
+        return _error(e)
+
+@mcp.tool()
+async def find_hours(condition: str, start: str = "today", end: str = "tomorrow", location: Optional[str] = None) -> dict:
+    """
+    Finds the hours in a date range where a condition holds, e.g. when it is windy or cold.
+    
+    Args:
+        condition: "<metric> <operator> <number>", e.g. "windspeedMiles >= 20", "tempF < 32"
+            or "chanceofrain > 50". Operators: >=, >, <=, <, ==.
+        start: First date in YYYY-MM-DD format, or keywords like "today", "tomorrow", "yesterday".
+        end: Last date (inclusive), in the same formats.
+        location: Zip code or place name. Defaults to the API's default location.
+        
+    Returns:
+        {"condition", "hours": [{"date", "time", "value"}], "truncated"}, oldest first.
+    """
+    match = CONDITION_PATTERN.match(condition)
+    if match is None:
+        return json.dumps({"error": "Condition must look like 'windspeedMiles >= 20'.", "status_code": None})
+    metric, op, value = match.groups()
+    params = {
+        "start": _resolve_date(start), "end": _resolve_date(end),
+        "metric": metric, "op": op, "value": value, **_location_params(location),
+    }
+    try:
+        values, _ = await _get_json("/weather/hours", params)
+        return {"condition": condition, "hours": values["hours"], "truncated": values["truncated"]}
+    except httpx.HTTPError as e:
+        return _error(e)
+
+async def log_event_generator(types: str = "attempt,report"):
+    """
+    An asynchronous generator that relays the weather API's /events stream
+    as SSE-formatted strings. Only new attempts and report upserts are sent;
+    after a dropped connection it reconnects with Last-Event-ID so nothing
+    is repeated or missed.
+    """
+    last_event_id = None
+    stream_timeout = httpx.Timeout(API_TIMEOUT, read=None)
     while True:
+        headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
         try:
-            logs_json = await get_attempt_logs()
-            # Assuming logs_json is a list of dictionaries, convert each to a JSON string
-            if isinstance(logs_json, list):
-                for log_entry in logs_json:
-                    yield f"data: {json.dumps(log_entry)}\n\n"
-            else:
-                # If get_attempt_logs returns an error string, send it as an SSE message
-                yield f"data: {logs_json}\n\n"
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-        await asyncio.sleep(5)  # Fetch logs every 5 seconds
+            async with event_client.stream("GET", "/events", params={"types": types}, headers=headers, timeout=stream_timeout) as response:
+                response.raise_for_status()
+                message = []
+                async for line in response.aiter_lines():
+                    if line.startswith("id: "):
+                        last_event_id = line[4:]
+                    message.append(line)
+                    if line == "":
+                        yield "\n".join(message) + "\n"
+                        message = []
+        except httpx.HTTPStatusError as e:
+            yield f"data: {json.dumps({'error': f'API error: {e.response.status_code}', 'status_code': e.response.status_code})}\n\n"
+        except httpx.RequestError as e:
+            yield f"data: {json.dumps({'error': f'Network error: {e}', 'status_code': None})}\n\n"
+        await asyncio.sleep(5)  # Reconnect after the stream ends or fails
+
+@mcp.custom_route("/events", methods=["GET"])
+async def stream_events(request):
+    """
+    Live attempt logs and report upserts, relayed from the weather API.
+    """
+    return StreamingResponse(
+        log_event_generator(request.query_params.get("types", "attempt,report")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 if __name__ == "__main__":
     mcp.run(transport="http", host="0.0.0.0", port=8000)
@@ -0,0 +1,158 @@
+import asyncio
+import gc
+import os
+import sys
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+# Add the parent directory to the path so we can import the mcp module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import main
+
+
+class SlowUpstream:
+    """
+    Stand-in for the weather API that counts requests and takes `delay`
+    seconds to answer each one with `status`.
+    """
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.status = 200
+        self.requests = []
+
+    async def handler(self, request):
+        self.requests.append(request)
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return httpx.Response(self.status, request=request)
+        return httpx.Response(200, json={"date": "2024-01-01", "n": len(self.requests)}, headers={"X-Next-Cursor": "2024-01-02"})
+
+
+@pytest.fixture
+def upstream():
+    upstream = SlowUpstream()
+    client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(upstream.handler))
+    with patch("main.http_client", client), \
+            patch.dict("main._response_cache", clear=True), \
+            patch.dict("main._in_flight", clear=True):
+        yield upstream
+
+
+async def test_concurrent_identical_calls_share_one_request(upstream):
+    results = await asyncio.gather(*(main._get_json("/weather/2024-01-01", {"location": "18966"}) for _ in range(5)))
+
+    assert len(upstream.requests) == 1
+    assert all(result == ({"date": "2024-01-01", "n": 1}, {"X-Next-Cursor": "2024-01-02"}) for result in results)
+    assert main._in_flight == {}
+    # Other parameters are a different call
+    await main._get_json("/weather/2024-01-01", {"location": "10001"})
+    assert len(upstream.requests) == 2
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_request(upstream):
+    first = asyncio.ensure_future(main._get_json("/weather/2024-01-01"))
+    second = asyncio.ensure_future(main._get_json("/weather/2024-01-01"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    body, _ = await second
+
+    assert first.cancelled()
+    assert body == {"date": "2024-01-01", "n": 1}
+    assert len(upstream.requests) == 1
+
+
+async def test_request_outlives_its_only_caller_and_is_cached(upstream):
+    caller = asyncio.ensure_future(main._get_json("/weather/2024-01-01"))
+    await asyncio.sleep(0.01)
+    caller.cancel()
+    await asyncio.sleep(upstream.delay * 2)
+
+    body, _ = await main._get_json("/weather/2024-01-01")
+
+    assert body["n"] == 1
+    assert len(upstream.requests) == 1
+
+
+async def test_cached_responses_expire_after_the_ttl(upstream):
+    upstream.delay = 0
+    await main._get_json("/logs", ttl=0.05)
+    await main._get_json("/logs", ttl=0.05)
+    assert len(upstream.requests) == 1
+
+    await asyncio.sleep(0.06)
+    body, _ = await main._get_json("/logs", ttl=0.05)
+
+    assert body["n"] == 2
+    assert len(upstream.requests) == 2
+
+
+async def test_errors_are_raised_to_every_caller_and_not_cached(upstream):
+    upstream.status = 503
+
+    results = await asyncio.gather(*(main._get_json("/weather/2024-01-01") for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, httpx.HTTPStatusError) for result in results)
+    assert len(upstream.requests) == 1
+    assert main._response_cache == {}
+
+
+async def test_failure_after_every_caller_gave_up_is_not_reported_as_unretrieved(upstream):
+    unhandled = []
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context["message"]))
+    upstream.status = 503
+    callers = [asyncio.ensure_future(main._get_json("/weather/2024-01-01")) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.sleep(upstream.delay * 2)
+
+    # The cancelled callers' tracebacks are what keep the shared task alive
+    del callers, caller
+    gc.collect()
+
+    assert len(upstream.requests) == 1
+    assert main._in_flight == {}
+    assert unhandled == []
+
+
+def test_prune_cache_drops_expired_then_oldest_entries():
+    with patch("main.CACHE_MAX_ENTRIES", 3), patch.dict("main._response_cache", clear=True):
+        main._response_cache.update({
+            "expired": (5, None, None),
+            "oldest": (20, None, None),
+            "newer": (30, None, None),
+        })
+        main._prune_cache(now=10)
+        assert list(main._response_cache) == ["oldest", "newer"]
+
+        main._response_cache["newest"] = (40, None, None)
+        main._prune_cache(now=10)
+        assert list(main._response_cache) == ["newer", "newest"]
+
+
+def test_trim_report_keeps_requested_fields():
+    report = {
+        "_id": "r1",
+        "date": "2024-01-01",
+        "location": "18966",
+        "timestamp_recorded_utc": "2024-01-01T12:00:00",
+        "hourly": [{"time": 0, "tempF": 40, "windspeedMiles": 12, "humidity": 80}],
+    }
+
+    assert main._trim_report(report, {"windspeedMiles"}) == {
+        "date": "2024-01-01",
+        "location": "18966",
+        "hourly": [{"time": 0, "windspeedMiles": 12}],
+    }
+    assert main._trim_report(report, main._parse_fields("tempF, timestamp_recorded_utc")) == {
+        "date": "2024-01-01",
+        "location": "18966",
+        "timestamp_recorded_utc": "2024-01-01T12:00:00",
+        "hourly": [{"time": 0, "tempF": 40}],
+    }
+    assert main._trim_report(report, main._parse_fields("")) is report
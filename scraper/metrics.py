@@ -0,0 +1,25 @@
+from prometheus_client import Counter, Histogram
+
+FETCH_DURATION = Histogram(
+    "scraper_fetch_duration_seconds",
+    "Time spent waiting on wttr.in per attempt.",
+    ["result"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+FETCH_ATTEMPTS = Counter(
+    "scraper_fetch_attempts_total",
+    "Fetch attempts by result: updated, not_modified, failed or skipped (circuit open / deadline).",
+    ["result"],
+)
+FETCH_RETRIES = Counter("scraper_fetch_retries_total", "Attempts that were retries of an earlier failed attempt.")
+REPORTS_WRITTEN = Counter(
+    "scraper_reports_total",
+    "Reports handled by ingest_reports: inserted, modified, unchanged or failed.",
+    ["result"],
+)
+JOB_DURATION = Histogram(
+    "scraper_job_duration_seconds",
+    "Wall time of scheduled jobs.",
+    ["job"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
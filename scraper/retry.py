@@ -0,0 +1,70 @@
+import random
+import time
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: the delay before retry n is drawn
+    uniformly from [0, min(max_delay, base_delay * 2 ** (n - 1))], so
+    retries from many locations don't hit the upstream in lockstep.
+    """
+
+    def __init__(self, max_attempts, base_delay, max_delay, rng=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt_number):
+        """
+        Returns the delay in seconds to wait after the given (1-based) failed attempt.
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt_number - 1))
+        return self._rng.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream after `failure_threshold` consecutive failures.
+    Once `cooldown` seconds have passed, a single trial request is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, cooldown, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def allow(self):
+        """
+        Returns True if a request may be sent now.
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self._clock() - self._opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = self._clock()
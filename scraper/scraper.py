@@ -1,21 +1,89 @@
 import os
 import time
-import requests
+import asyncio
+import httpx
 import schedule
 import logging
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from datetime import datetime
+import hashlib
+import calendar
+import json
+from urllib.parse import quote, urlsplit
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import ConnectionFailure, OperationFailure, BulkWriteError
+from datetime import datetime, timedelta
+from prometheus_client import start_http_server
+from retry import RetryPolicy, CircuitBreaker
+from metrics import FETCH_ATTEMPTS, FETCH_DURATION, FETCH_RETRIES, JOB_DURATION, REPORTS_WRITTEN
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
 # --- Configuration ---
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
-WEATHER_URL = "http://wttr.in/18966?format=j1"
-RETRY_DELAY_SECONDS = 10
+WEATHER_URL_TEMPLATE = os.getenv("WEATHER_URL_TEMPLATE", "http://wttr.in/{location}?format=j1")
+# Comma-separated zip codes or place names; each one is fetched every sweep
+WEATHER_LOCATIONS = [location.strip() for location in os.getenv("WEATHER_LOCATIONS", "18966").split(",") if location.strip()]
+# Reports written before multi-location support have no location field
+LEGACY_LOCATION = "18966"
 MAX_RETRIES = 5
 REQUEST_TIMEOUT_SECONDS = 10 # Timeout for the weather API request
+# Exponential backoff with jitter between retries of the same location
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "2"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "30"))
+# No retry is started once a sweep has run this long
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "120"))
+# After this many consecutive failures against a host, skip it for the cool-down
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "600"))
+# 4xx responses other than these mean the request itself is wrong; retrying won't help
+RETRYABLE_CLIENT_STATUS_CODES = {408, 425, 429}
+MAX_CONCURRENT_FETCHES = int(os.getenv("MAX_CONCURRENT_FETCHES", "10"))
+PER_HOST_REQUESTS_PER_SECOND = float(os.getenv("PER_HOST_REQUESTS_PER_SECOND", "5"))
+PER_HOST_BURST = int(os.getenv("PER_HOST_BURST", str(MAX_CONCURRENT_FETCHES)))
+# Prometheus metrics are served on this port; 0 disables the endpoint
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+RETRY_POLICY = RetryPolicy(MAX_RETRIES, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS)
+# One breaker per upstream host, kept across scheduled sweeps
+circuit_breakers = {}
+# Per-location validators from the last payload that was ingested:
+# {"etag", "last_modified", "payload_hash"}. Used for conditional requests.
+fetch_state = {}
+
+# wttr.in returns every metric as a string. Hourly data is stored with native
+# numbers instead so consumers and Mongo queries don't have to re-parse them.
+# Bump SCHEMA_VERSION whenever the stored shape changes.
+SCHEMA_VERSION = 2
+MIGRATION_BATCH_SIZE = 500
+
+# Forecast history: one forecast_history bucket per (location, date) holding
+# every distinct forecast ever scraped for that day, oldest first. Buckets are
+# capped at HISTORY_MAX_SNAPSHOTS, thinned to one snapshot per
+# HISTORY_DOWNSAMPLE_INTERVAL_HOURS once the day is HISTORY_DOWNSAMPLE_AFTER_DAYS
+# old, and expire HISTORY_RETENTION_DAYS after the forecast day.
+HISTORY_MAX_SNAPSHOTS = int(os.getenv("HISTORY_MAX_SNAPSHOTS", "96"))
+HISTORY_DOWNSAMPLE_AFTER_DAYS = int(os.getenv("HISTORY_DOWNSAMPLE_AFTER_DAYS", "7"))
+HISTORY_DOWNSAMPLE_INTERVAL_HOURS = int(os.getenv("HISTORY_DOWNSAMPLE_INTERVAL_HOURS", "6"))
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "730"))
+
+# Attempt log retention. Attempts expire ATTEMPTS_RETENTION_DAYS after they
+# were made through a TTL index on timestamp_utc (0 keeps them forever). Setting
+# ATTEMPTS_CAPPED_SIZE_BYTES turns attempts into a capped collection of that
+# size instead, which bounds it by size rather than age. Either way, complete
+# days are first condensed into attempt_summaries by the daily rollup job.
+ATTEMPTS_RETENTION_DAYS = int(os.getenv("ATTEMPTS_RETENTION_DAYS", "90"))
+ATTEMPTS_CAPPED_SIZE_BYTES = int(os.getenv("ATTEMPTS_CAPPED_SIZE_BYTES", "0"))
+ATTEMPTS_TIMESTAMP_INDEX = "timestamp_utc_-1"
+HOURLY_INT_FIELDS = (
+    "DewPointC", "DewPointF", "FeelsLikeC", "FeelsLikeF", "HeatIndexC", "HeatIndexF",
+    "WindChillC", "WindChillF", "WindGustKmph", "WindGustMiles",
+    "chanceoffog", "chanceoffrost", "chanceofhightemp", "chanceofovercast", "chanceofrain",
+    "chanceofremdry", "chanceofsnow", "chanceofsunshine", "chanceofthunder", "chanceofwindy",
+    "cloudcover", "humidity", "pressure", "tempC", "tempF", "time", "uvIndex", "visibility",
+    "weatherCode", "winddirDegree", "windspeedKmph", "windspeedMiles",
+)
+HOURLY_FLOAT_FIELDS = ("diffRad", "precipInches", "precipMM", "pressureInches", "shortRad", "visibilityMiles")
 
 def get_mongo_client():
     """
@@ -36,93 +104,655 @@ def get_mongo_client():
     logging.error("Failed to connect to MongoDB after several retries. Exiting.")
     return None
 
-def fetch_weather_data():
+def _drop_legacy_date_index(collection):
+    """
+    Reports used to be unique per date. With several locations they are
+    unique per (location, date), so the old index has to go.
+    """
+    if "date_1" not in collection.index_information():
+        return
+    try:
+        collection.drop_index("date_1")
+        logging.info("Dropped legacy unique index on hourly_reports.date.")
+    except OperationFailure as e:
+        if e.code != 27:  # IndexNotFound: the API dropped it first
+            raise
+
+def ensure_indexes(db):
+    """
+    Creates the indexes the upserts and API lookups rely on. Idempotent, so it
+    is safe to run on every startup; the API runs the same step.
+    """
+    _drop_legacy_date_index(db.hourly_reports)
+    db.hourly_reports.create_index([("location", ASCENDING), ("date", ASCENDING)], unique=True)
+    db.hourly_reports.create_index([("timestamp_recorded_utc", ASCENDING)])
+    configure_attempts_retention(db)
+    db.attempts.create_index([("timestamp_utc", DESCENDING), ("_id", DESCENDING)])
+    db.attempt_summaries.create_index([("date", ASCENDING), ("location", ASCENDING)], unique=True)
+    db.forecast_history.create_index([("location", ASCENDING), ("date", ASCENDING)], unique=True)
+    db.forecast_history.create_index([("expire_at", ASCENDING)], expireAfterSeconds=0)
+    # compact_forecast_history's daily scan for old, uncompacted buckets
+    db.forecast_history.create_index([("date", ASCENDING), ("compacted", ASCENDING)])
+    logging.info("MongoDB indexes are in place.")
+
+def _attempts_expire_after():
+    """
+    The TTL for the attempts timestamp index, or None when attempts should not expire.
+    """
+    if ATTEMPTS_CAPPED_SIZE_BYTES > 0 or ATTEMPTS_RETENTION_DAYS <= 0:
+        return None  # capped collections can't have TTL indexes
+    return ATTEMPTS_RETENTION_DAYS * 24 * 3600
+
+def _create_attempts_timestamp_index(collection, expire_after):
+    options = {} if expire_after is None else {"expireAfterSeconds": expire_after}
+    collection.create_index([("timestamp_utc", DESCENDING)], name=ATTEMPTS_TIMESTAMP_INDEX, **options)
+
+def configure_attempts_retention(db):
     """
-    Fetches weather data from the wttr.in API with retry logic for timeouts.
-    Records each attempt's success status.
+    Applies the attempts retention settings: converts the collection to a
+    capped one when ATTEMPTS_CAPPED_SIZE_BYTES is set, and makes sure the
+    timestamp_utc index carries the TTL for ATTEMPTS_RETENTION_DAYS. An
+    existing index is changed in place with collMod where the server allows
+    it, and rebuilt otherwise.
+    """
+    collection = db.attempts
+    if ATTEMPTS_CAPPED_SIZE_BYTES > 0 and not collection.options().get("capped"):
+        if "attempts" in db.list_collection_names():
+            # convertToCapped keeps only the _id index; the one below is rebuilt
+            db.command("convertToCapped", "attempts", size=ATTEMPTS_CAPPED_SIZE_BYTES)
+        else:
+            db.create_collection("attempts", capped=True, size=ATTEMPTS_CAPPED_SIZE_BYTES)
+        logging.info(f"Attempts collection is capped at {ATTEMPTS_CAPPED_SIZE_BYTES} bytes.")
+
+    expire_after = _attempts_expire_after()
+    index = collection.index_information().get(ATTEMPTS_TIMESTAMP_INDEX)
+    if index is None:
+        _create_attempts_timestamp_index(collection, expire_after)
+    elif index.get("expireAfterSeconds") != expire_after:
+        converted = False
+        if expire_after is not None:
+            try:
+                db.command("collMod", "attempts", index={"name": ATTEMPTS_TIMESTAMP_INDEX, "expireAfterSeconds": expire_after})
+                converted = True
+            except OperationFailure:
+                pass  # servers before 5.1 can't turn a plain index into a TTL index
+        if not converted:
+            collection.drop_index(ATTEMPTS_TIMESTAMP_INDEX)
+            _create_attempts_timestamp_index(collection, expire_after)
+        logging.info(f"Updated the attempts timestamp index TTL to {expire_after} seconds.")
+
+def _plan_stages(plan):
+    """
+    Yields every stage name in an explain() plan tree.
+    """
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+def verify_query_plans(db):
+    """
+    Runs explain() on the scraper's hot query (the upsert filter) and logs a
+    warning if it would fall back to a collection scan.
+    """
+    if not WEATHER_LOCATIONS:
+        return
+    query = {"location": WEATHER_LOCATIONS[0], "date": datetime.utcnow().strftime("%Y-%m-%d")}
+    winning_plan = db.hourly_reports.find(query).limit(1).explain().get("queryPlanner", {}).get("winningPlan", {})
+    if "COLLSCAN" in set(_plan_stages(winning_plan)):
+        logging.warning("Upsert lookup on hourly_reports (location, date) is using a COLLSCAN; check the MongoDB indexes.")
+
+def bootstrap_indexes(client):
+    """
+    Creates indexes and checks the hot query plan, logging instead of exiting on failure.
+    """
+    db = client.weather_db
+    try:
+        ensure_indexes(db)
+        verify_query_plans(db)
+    except OperationFailure as e:
+        logging.error(f"Index bootstrap failed: {e}")
+
+def _to_number(value, number_type):
     """
+    Converts a wttr.in string metric to int or float, leaving anything that
+    isn't a parseable string untouched.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        return number_type(value)
+    except ValueError:
+        try:
+            return number_type(float(value))
+        except ValueError:
+            return value
+
+def normalize_hourly(hour):
+    """
+    Returns a copy of one hourly entry with its numeric metrics converted from strings.
+    """
+    normalized = dict(hour)
+    for field in HOURLY_INT_FIELDS:
+        if field in normalized:
+            normalized[field] = _to_number(normalized[field], int)
+    for field in HOURLY_FLOAT_FIELDS:
+        if field in normalized:
+            normalized[field] = _to_number(normalized[field], float)
+    return normalized
+
+def migrate_typed_schema(db):
+    """
+    One-time migration that converts hourly_reports written before
+    SCHEMA_VERSION to the typed form. Documents already at the current
+    version are skipped, so running it on every startup is cheap.
+    """
+    collection = db.hourly_reports
+    cursor = collection.find({"schema_version": {"$ne": SCHEMA_VERSION}}, {"hourly": 1})
+    operations = []
+    migrated = 0
+    for document in cursor:
+        hourly = [normalize_hourly(hour) for hour in document.get("hourly", [])]
+        operations.append(UpdateOne(
+            {"_id": document["_id"]},
+            {"$set": {"hourly": hourly, "schema_version": SCHEMA_VERSION}}
+        ))
+        if len(operations) >= MIGRATION_BATCH_SIZE:
+            migrated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        migrated += collection.bulk_write(operations, ordered=False).modified_count
+    if migrated:
+        logging.info(f"Migrated {migrated} hourly reports to schema version {SCHEMA_VERSION}.")
+    return migrated
+
+def backfill_location(db):
+    """
+    Tags reports written before multi-location support with LEGACY_LOCATION.
+    """
+    result = db.hourly_reports.update_many({"location": {"$exists": False}}, {"$set": {"location": LEGACY_LOCATION}})
+    if result.modified_count:
+        logging.info(f"Tagged {result.modified_count} hourly reports with location {LEGACY_LOCATION}.")
+    return result.modified_count
+
+def weather_url(location):
+    return WEATHER_URL_TEMPLATE.format(location=quote(location))
+
+class HostRateLimiter:
+    """
+    Token bucket per host: allows bursts of up to `burst` requests, then
+    spaces request starts out to `rate` per second so a sweep over many
+    locations doesn't hammer wttr.in.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._buckets = {}
+
+    async def wait(self, host):
+        if self.rate <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            tokens, updated_at = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                self._buckets[host] = (tokens - 1, now)
+                return
+            self._buckets[host] = (tokens, now)
+            await asyncio.sleep((1 - tokens) / self.rate)
+
+def get_circuit_breaker(host):
+    if host not in circuit_breakers:
+        circuit_breakers[host] = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS)
+    return circuit_breakers[host]
+
+def conditional_headers(previous):
+    """
+    If-None-Match / If-Modified-Since headers for the last ingested payload.
+    """
+    headers = {}
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+    return headers
+
+def _not_modified(location, attempt_info, attempts_log, breaker):
+    """
+    Records a successful attempt whose payload matches the one already
+    ingested. No data is returned, so parsing and upserting are skipped.
+    """
+    attempt_info["success"] = True
+    attempt_info["outcome"] = "not_modified"
+    attempts_log.append(attempt_info)
+    breaker.record_success()
+    logging.info(f"Weather data for {location} has not changed since the last fetch.")
+    return None, attempts_log
+
+async def fetch_weather_data(http_client, location, semaphore, rate_limiter, deadline):
+    """
+    Fetches weather data for one location from the wttr.in API. Failed
+    attempts are retried with jittered exponential backoff until
+    RETRY_POLICY runs out of attempts, the sweep deadline would be passed,
+    or the host's circuit breaker opens. Records each attempt's success
+    status and the delay chosen before the next one.
+    """
+    url = weather_url(location)
+    host = urlsplit(url).netloc
+    breaker = get_circuit_breaker(host)
+    loop = asyncio.get_running_loop()
     attempts_log = []
-    for attempt_num in range(MAX_RETRIES):
+    for attempt_num in range(1, RETRY_POLICY.max_attempts + 1):
         attempt_info = {
-            "attempt_number": attempt_num + 1,
+            "location": location,
+            "attempt_number": attempt_num,
             "timestamp_utc": datetime.utcnow(),
             "success": False,
             "status_code": None,
             "error": None,
+            "delay_seconds": None,
+            "duration_ms": None,
+            "outcome": None,
         }
+        if not breaker.allow():
+            attempt_info["error"] = "Circuit breaker open; fetch skipped"
+            attempts_log.append(attempt_info)
+            logging.warning(f"Circuit breaker for {host} is open. Skipping {location}.")
+            break
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            attempt_info["error"] = "Job deadline exceeded"
+            attempts_log.append(attempt_info)
+            break
+
+        retryable = True
         try:
-            logging.info(f"Fetching weather data from {WEATHER_URL} (Attempt {attempt_num + 1}/{MAX_RETRIES})")
-            response = requests.get(WEATHER_URL, timeout=REQUEST_TIMEOUT_SECONDS)
-            response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-            
-            attempt_info["success"] = True
+            await rate_limiter.wait(host)
+            previous = fetch_state.get(location, {})
+            async with semaphore:
+                logging.info(f"Fetching weather data from {url} (Attempt {attempt_num}/{RETRY_POLICY.max_attempts})")
+                request_started = loop.time()
+                try:
+                    response = await http_client.get(
+                        url, headers=conditional_headers(previous), timeout=min(REQUEST_TIMEOUT_SECONDS, remaining)
+                    )
+                finally:
+                    attempt_info["duration_ms"] = round((loop.time() - request_started) * 1000, 1)
             attempt_info["status_code"] = response.status_code
+            if response.status_code == 304:
+                return _not_modified(location, attempt_info, attempts_log, breaker)
+            response.raise_for_status()  # Raises an HTTPStatusError for bad responses (4xx or 5xx)
+            payload_hash = hashlib.sha256(response.content).hexdigest()
+            if previous and payload_hash == previous.get("payload_hash"):
+                return _not_modified(location, attempt_info, attempts_log, breaker)
+            weather_data = response.json()
+
+            fetch_state[location] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "payload_hash": payload_hash,
+            }
+            attempt_info["success"] = True
+            attempt_info["outcome"] = "updated"
             attempts_log.append(attempt_info)
-            logging.info("Successfully fetched weather data.")
-            return response.json(), attempts_log
-        except requests.exceptions.Timeout:
+            breaker.record_success()
+            logging.info(f"Successfully fetched weather data for {location}.")
+            return weather_data, attempts_log
+        except httpx.TimeoutException:
             attempt_info["error"] = "Request timed out"
-            attempts_log.append(attempt_info)
-            logging.warning(f"Request timed out. Retrying in {RETRY_DELAY_SECONDS} seconds...")
-            time.sleep(RETRY_DELAY_SECONDS)
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPStatusError as e:
             attempt_info["error"] = str(e)
-            attempts_log.append(attempt_info)
-            logging.error(f"An error occurred during the request: {e}. Retrying in {RETRY_DELAY_SECONDS} seconds...")
-            time.sleep(RETRY_DELAY_SECONDS)
+            status_code = e.response.status_code
+            retryable = status_code >= 500 or status_code in RETRYABLE_CLIENT_STATUS_CODES
+        except (httpx.HTTPError, ValueError) as e:
+            attempt_info["error"] = str(e)
+        attempts_log.append(attempt_info)
+
+        if not retryable:
+            # The host answered, so it is healthy; the request is what's wrong
+            breaker.record_success()
+            logging.error(f"Request for {location} failed with a non-retryable error: {attempt_info['error']}")
+            break
+        breaker.record_failure()
+        if attempt_num == RETRY_POLICY.max_attempts:
+            break
+        delay = RETRY_POLICY.delay(attempt_num)
+        if loop.time() + delay >= deadline:
+            logging.error(f"Not retrying {location}: the next attempt would start after the job deadline.")
+            break
+        attempt_info["delay_seconds"] = round(delay, 3)
+        logging.warning(f"Attempt {attempt_num} for {location} failed: {attempt_info['error']}. Retrying in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
 
-    logging.error("Failed to fetch weather data after several attempts.")
+    logging.error(f"Failed to fetch weather data for {location} after {len(attempts_log)} attempts.")
     return None, attempts_log
 
+def attempt_result(attempt):
+    if attempt["success"]:
+        return attempt["outcome"] or "updated"
+    return "failed" if attempt["duration_ms"] is not None else "skipped"
+
+def record_attempt_metrics(attempts_log):
+    for attempt in attempts_log:
+        result = attempt_result(attempt)
+        FETCH_ATTEMPTS.labels(result).inc()
+        if attempt["duration_ms"] is not None:
+            FETCH_DURATION.labels(result).observe(attempt["duration_ms"] / 1000)
+        if attempt["attempt_number"] > 1:
+            FETCH_RETRIES.inc()
+
+async def run_sweep(locations, transport=None):
+    """
+    Fetches every location concurrently, bounded by MAX_CONCURRENT_FETCHES,
+    the per-host rate limit and JOB_DEADLINE_SECONDS.
+    Returns {location: (weather_data, attempts_log)}.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    rate_limiter = HostRateLimiter(PER_HOST_REQUESTS_PER_SECOND, PER_HOST_BURST)
+    limits = httpx.Limits(max_connections=MAX_CONCURRENT_FETCHES)
+    deadline = asyncio.get_running_loop().time() + JOB_DEADLINE_SECONDS
+    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT_SECONDS, limits=limits, transport=transport) as http_client:
+        results = await asyncio.gather(*(
+            fetch_weather_data(http_client, location, semaphore, rate_limiter, deadline) for location in locations
+        ))
+    for _, attempts_log in results:
+        record_attempt_metrics(attempts_log)
+    return dict(zip(locations, results))
+
+def hourly_hash(hourly):
+    """
+    Stable content hash of a day's normalized hourly data.
+    """
+    encoded = json.dumps(hourly, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+def build_reports(results):
+    """
+    Turns a sweep's {location: (weather_data, attempts_log)} results into
+    one report record per (location, forecast day).
+    """
+    recorded_at = datetime.utcnow()
+    reports = []
+    for location, (weather_data, _) in results.items():
+        if not weather_data:
+            continue
+        for daily_weather in weather_data.get("weather", []):
+            report_date = daily_weather.get("date")
+            if not report_date:
+                continue
+            hourly = [normalize_hourly(hour) for hour in daily_weather.get("hourly", [])]
+            reports.append({
+                "location": location,
+                "date": report_date,
+                "hourly": hourly,
+                "hourly_hash": hourly_hash(hourly),
+                "schema_version": SCHEMA_VERSION,
+                "timestamp_recorded_utc": recorded_at,
+            })
+    return reports
+
+def history_expiry(report_date):
+    """
+    When a forecast_history bucket for report_date should be dropped by the TTL index.
+    """
+    return datetime.strptime(report_date, "%Y-%m-%d") + timedelta(days=HISTORY_RETENTION_DAYS)
+
+def append_forecast_history(history_collection, reports):
+    """
+    Appends each changed report's forecast to its (location, date) bucket in
+    one unordered bulk_write. $slice keeps every bucket bounded.
+    """
+    operations = [
+        UpdateOne(
+            {"location": report["location"], "date": report["date"]},
+            {
+                "$push": {"snapshots": {
+                    "$each": [{
+                        "recorded_utc": report["timestamp_recorded_utc"],
+                        "hourly_hash": report["hourly_hash"],
+                        "hourly": report["hourly"],
+                    }],
+                    "$slice": -HISTORY_MAX_SNAPSHOTS,
+                }},
+                "$setOnInsert": {"expire_at": history_expiry(report["date"])},
+            },
+            upsert=True
+        )
+        for report in reports
+    ]
+    if not operations:
+        return
+    try:
+        history_collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        logging.error(f"Failed to append {len(e.details.get('writeErrors', []))} forecast history snapshots.")
+
+def downsample_snapshots(snapshots, interval_hours):
+    """
+    Keeps the last snapshot recorded in each interval_hours window, so the
+    forecast as of the end of every window is preserved.
+    """
+    interval = interval_hours * 3600
+    kept = {}
+    for snapshot in snapshots:
+        kept[calendar.timegm(snapshot["recorded_utc"].utctimetuple()) // interval] = snapshot
+    return [kept[window] for window in sorted(kept)]
+
+@JOB_DURATION.labels("compact_forecast_history").time()
+def compact_forecast_history(db, now=None):
+    """
+    Thins out history buckets for days older than HISTORY_DOWNSAMPLE_AFTER_DAYS.
+    Each bucket is compacted once; expiry is left to the TTL index.
+    """
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=HISTORY_DOWNSAMPLE_AFTER_DAYS)).strftime("%Y-%m-%d")
+    collection = db.forecast_history
+    cursor = collection.find({"date": {"$lt": cutoff}, "compacted": {"$ne": True}}, {"snapshots": 1})
+    operations = []
+    compacted = 0
+    for bucket in cursor:
+        snapshots = downsample_snapshots(bucket.get("snapshots", []), HISTORY_DOWNSAMPLE_INTERVAL_HOURS)
+        operations.append(UpdateOne({"_id": bucket["_id"]}, {"$set": {"snapshots": snapshots, "compacted": True}}))
+        if len(operations) >= MIGRATION_BATCH_SIZE:
+            compacted += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        compacted += collection.bulk_write(operations, ordered=False).modified_count
+    logging.info(f"Compacted {compacted} forecast history buckets older than {cutoff}.")
+    return compacted
+
+def _attempt_summary_pipeline(start, end):
+    """
+    Groups the attempts made in [start, end) per UTC day and location.
+    """
+    return [
+        {"$match": {"timestamp_utc": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp_utc"}},
+                "location": {"$ifNull": ["$location", LEGACY_LOCATION]},
+            },
+            "attempts": {"$sum": 1},
+            "successes": {"$sum": {"$cond": ["$success", 1, 0]}},
+            "not_modified": {"$sum": {"$cond": [{"$eq": ["$outcome", "not_modified"]}, 1, 0]}},
+            "avg_duration_ms": {"$avg": "$duration_ms"},
+            "max_duration_ms": {"$max": "$duration_ms"},
+        }},
+    ]
+
+@JOB_DURATION.labels("rollup_attempts").time()
+def rollup_attempts(db, now=None):
+    """
+    Condenses the attempts of every complete UTC day not yet summarized into
+    one attempt_summaries document per (date, location), so the counts and
+    latencies outlive the raw attempts once retention removes them.
+    Returns the number of summaries written.
+    """
+    now = now or datetime.utcnow()
+    end = datetime(now.year, now.month, now.day)
+    latest = db.attempt_summaries.find_one({}, {"date": 1}, sort=[("date", DESCENDING)])
+    if latest:
+        start = datetime.strptime(latest["date"], "%Y-%m-%d") + timedelta(days=1)
+    else:
+        oldest = db.attempts.find_one({}, {"timestamp_utc": 1}, sort=[("timestamp_utc", ASCENDING)])
+        if not oldest:
+            return 0
+        stamp = oldest["timestamp_utc"]
+        start = datetime(stamp.year, stamp.month, stamp.day)
+    if start >= end:
+        return 0
+
+    operations = []
+    for row in db.attempts.aggregate(_attempt_summary_pipeline(start, end)):
+        key = row.pop("_id")
+        summary = {
+            **key,
+            **row,
+            "failures": row["attempts"] - row["successes"],
+            "rolled_up_utc": now,
+        }
+        operations.append(UpdateOne(key, {"$set": summary}, upsert=True))
+    if operations:
+        db.attempt_summaries.bulk_write(operations, ordered=False)
+    logging.info(
+        f"Rolled up attempts from {start:%Y-%m-%d} to {end - timedelta(days=1):%Y-%m-%d} into {len(operations)} daily summaries."
+    )
+    return len(operations)
+
+def ingest_reports(hourly_reports_collection, reports, history_collection=None):
+    """
+    Upserts a sweep's reports with a single unordered bulk_write. Reports
+    whose hourly_hash matches the stored one are skipped, so an hour with no
+    forecast changes costs one read and no writes. Changed reports that were
+    written are also appended to history_collection when one is given. Returns counts of
+    inserted, modified, unchanged and failed reports.
+    """
+    counts = {"inserted": 0, "modified": 0, "unchanged": 0, "failed": 0}
+    if not reports:
+        return counts
+
+    dates_by_location = {}
+    for report in reports:
+        dates_by_location.setdefault(report["location"], []).append(report["date"])
+    stored_hashes = {
+        (stored["location"], stored["date"]): stored.get("hourly_hash")
+        for stored in hourly_reports_collection.find(
+            {"$or": [{"location": location, "date": {"$in": dates}} for location, dates in dates_by_location.items()]},
+            {"_id": 0, "location": 1, "date": 1, "hourly_hash": 1},
+        )
+    }
+
+    operations = []
+    pending = []
+    changed = []
+    for report in reports:
+        key = (report["location"], report["date"])
+        if stored_hashes.get(key) == report["hourly_hash"]:
+            counts["unchanged"] += 1
+            continue
+        operations.append(UpdateOne(
+            {"location": report["location"], "date": report["date"]},
+            {"$set": report},
+            upsert=True
+        ))
+        pending.append(key)
+        changed.append(report)
+    if not operations:
+        REPORTS_WRITTEN.labels("unchanged").inc(counts["unchanged"])
+        return counts
+
+    failed = set()
+    try:
+        result = hourly_reports_collection.bulk_write(operations, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        # With ordered=False every other operation still ran
+        result = e.details
+        for write_error in result.get("writeErrors", []):
+            failed.add(write_error["index"])
+            location, report_date = pending[write_error["index"]]
+            logging.error(f"Failed to upsert hourly data for {location} on {report_date}: {write_error.get('errmsg')}")
+    if history_collection is not None:
+        # A report that failed to upsert keeps its old hourly_hash and is seen as
+        # changed again next run, so its snapshot is appended then instead
+        append_forecast_history(history_collection, [report for i, report in enumerate(changed) if i not in failed])
+    counts["inserted"] = result.get("nUpserted", 0)
+    counts["modified"] = result.get("nModified", 0)
+    counts["failed"] = len(result.get("writeErrors", []))
+    counts["unchanged"] += result.get("nMatched", 0) - counts["modified"]
+    for name, count in counts.items():
+        REPORTS_WRITTEN.labels(name).inc(count)
+    return counts
+
+@JOB_DURATION.labels("weather").time()
 def weather_job(client):
     """
-    The main job to be scheduled. Fetches weather and saves it to MongoDB.
+    The main job to be scheduled. Fetches weather for every configured
+    location and saves it to MongoDB.
     """
-    weather_data, attempts_log = fetch_weather_data()
+    started = time.monotonic()
+    results = asyncio.run(run_sweep(WEATHER_LOCATIONS))
+    logging.info(f"Fetched {len(results)} locations in {time.monotonic() - started:.1f} seconds.")
     if client:
         db = client.weather_db
         attempts_collection = db.attempts
         hourly_reports_collection = db.hourly_reports
 
         # Save the attempts log
+        attempts_log = [attempt for _, location_attempts in results.values() for attempt in location_attempts]
         if attempts_log:
             attempts_collection.insert_many(attempts_log)
             logging.info("Successfully saved attempt log to MongoDB.")
 
-        # If weather data is fetched successfully, process and save it
-        if weather_data:
-            try:
-                for daily_weather in weather_data.get("weather", []):
-                    report_date = daily_weather.get("date")
-                    if report_date:
-                        # Create a record with the date and the hourly data
-                        record = {
-                            "date": report_date,
-                            "hourly": daily_weather.get("hourly", []),
-                            "timestamp_recorded_utc": datetime.utcnow()
-                        }
-                        # Use update_one with upsert=True to overwrite or create
-                        hourly_reports_collection.update_one(
-                            {"date": report_date},
-                            {"$set": record},
-                            upsert=True
-                        )
-                        logging.info(f"Successfully upserted hourly data for {report_date}.")
-            except Exception as e:
-                logging.error(f"Failed to write weather data to MongoDB: {e}")
+        # Upsert every successfully fetched location's reports in one batch
+        try:
+            counts = ingest_reports(hourly_reports_collection, build_reports(results), db.forecast_history)
+            logging.info(
+                f"Ingested hourly reports: {counts['inserted']} inserted, {counts['modified']} modified, "
+                f"{counts['unchanged']} unchanged, {counts['failed']} failed."
+            )
+            ingested = counts["failed"] == 0
+        except Exception as e:
+            logging.error(f"Failed to write weather data to MongoDB: {e}")
+            ingested = False
+        if not ingested:
+            # Forget the validators so the next sweep refetches and retries the write
+            for location in results:
+                fetch_state.pop(location, None)
 
 def main():
     """
     Main function to initialize the client and start the scheduler.
     """
+    if not WEATHER_LOCATIONS:
+        logging.error("WEATHER_LOCATIONS is empty; set it to a comma-separated list of zip codes or place names.")
+        return
     mongo_client = get_mongo_client()
 
     if not mongo_client:
         return # Exit if we can't connect to the database
 
+    try:
+        backfill_location(mongo_client.weather_db)
+        migrate_typed_schema(mongo_client.weather_db)
+    except Exception as e:
+        logging.error(f"Failed to migrate hourly reports to schema version {SCHEMA_VERSION}: {e}")
+    bootstrap_indexes(mongo_client)
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        logging.info(f"Serving Prometheus metrics on port {METRICS_PORT}.")
+
     # --- Scheduler Setup ---
     logging.info("Scheduler started. First job will run in the next hour.")
     schedule.every().hour.do(weather_job, client=mongo_client)
+    schedule.every().day.at("03:00").do(compact_forecast_history, db=mongo_client.weather_db)
+    schedule.every().day.at("00:15").do(rollup_attempts, db=mongo_client.weather_db)
     
     # Run the job once immediately on startup
     logging.info("Performing initial weather data fetch...")
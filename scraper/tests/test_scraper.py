@@ -0,0 +1,439 @@
+import pytest
+import httpx
+import asyncio
+import os
+import sys
+import random
+import mongomock
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from pymongo.errors import BulkWriteError
+
+# Add the parent directory to the path so we can import the scraper module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import scraper
+from retry import RetryPolicy, CircuitBreaker
+from prometheus_client import REGISTRY
+
+WEATHER_PAYLOAD = {"weather": [{"date": "2024-01-01", "hourly": []}]}
+
+
+class FakeUpstream:
+    """
+    Scripted stand-in for wttr.in. Each request consumes the next outcome:
+    an HTTP status code, "timeout", a ready-made httpx.Response, or a JSON
+    payload served with a 200.
+    """
+
+    def __init__(self, *outcomes, default=WEATHER_PAYLOAD):
+        self.outcomes = list(outcomes)
+        self.default = default
+        self.requests = []
+
+    def handler(self, request):
+        self.requests.append(request)
+        outcome = self.outcomes.pop(0) if self.outcomes else self.default
+        if outcome == "timeout":
+            raise httpx.ReadTimeout("timed out", request=request)
+        if isinstance(outcome, int):
+            return httpx.Response(outcome, request=request)
+        if isinstance(outcome, httpx.Response):
+            return outcome
+        return httpx.Response(200, json=outcome, request=request)
+
+    @property
+    def transport(self):
+        return httpx.MockTransport(self.handler)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.01, max_delay=0.02, rng=random.Random(0))
+    with patch('scraper.RETRY_POLICY', policy), \
+            patch.dict('scraper.circuit_breakers', clear=True), \
+            patch.dict('scraper.fetch_state', clear=True):
+        yield policy
+
+
+def test_retry_policy_delays_grow_and_are_capped():
+    policy = RetryPolicy(max_attempts=5, base_delay=1, max_delay=5, rng=random.Random(1))
+    for attempt_number, ceiling in [(1, 1), (2, 2), (3, 4), (4, 5), (10, 5)]:
+        delays = [policy.delay(attempt_number) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling * 0.8
+
+
+def test_circuit_breaker_opens_and_half_opens_after_cooldown():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10
+    assert breaker.allow()       # single half-open trial
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_fetch_retries_5xx_and_timeouts_then_succeeds():
+    upstream = FakeUpstream(500, "timeout", WEATHER_PAYLOAD)
+
+    results = await scraper.run_sweep(["18966"], transport=upstream.transport)
+
+    weather_data, attempts = results["18966"]
+    assert weather_data == WEATHER_PAYLOAD
+    assert [attempt["status_code"] for attempt in attempts] == [500, None, 200]
+    assert [attempt["success"] for attempt in attempts] == [False, False, True]
+    assert attempts[1]["error"] == "Request timed out"
+    assert all(0 <= attempt["delay_seconds"] <= 0.02 for attempt in attempts[:2])
+    assert attempts[2]["delay_seconds"] is None
+    assert attempts[2]["outcome"] == "updated"
+    assert all(attempt["duration_ms"] >= 0 for attempt in attempts)
+
+
+@pytest.mark.asyncio
+async def test_fetch_does_not_retry_client_errors():
+    upstream = FakeUpstream(404)
+
+    results = await scraper.run_sweep(["00000"], transport=upstream.transport)
+
+    weather_data, attempts = results["00000"]
+    assert weather_data is None
+    assert len(attempts) == 1
+    assert len(upstream.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_skips_fetching_after_consecutive_failures():
+    upstream = FakeUpstream(default=503)
+    with patch('scraper.CIRCUIT_FAILURE_THRESHOLD', 3):
+        first = await scraper.run_sweep(["18966"], transport=upstream.transport)
+        assert len(upstream.requests) == 3
+        assert first["18966"][1][-1]["error"] == "Circuit breaker open; fetch skipped"
+
+        # Still cooling down: the next sweep doesn't touch the upstream at all
+        second = await scraper.run_sweep(["18966", "10001"], transport=upstream.transport)
+    assert len(upstream.requests) == 3
+    assert all(log[0]["error"] == "Circuit breaker open; fetch skipped" for _, log in second.values())
+
+
+@pytest.mark.asyncio
+async def test_job_deadline_stops_retries():
+    upstream = FakeUpstream(default=502)
+    slow_policy = RetryPolicy(max_attempts=5, base_delay=10, max_delay=10, rng=random.Random(0))
+    with patch('scraper.RETRY_POLICY', slow_policy), patch('scraper.JOB_DEADLINE_SECONDS', 0.5):
+        results = await scraper.run_sweep(["18966"], transport=upstream.transport)
+
+    weather_data, attempts = results["18966"]
+    assert weather_data is None
+    # The first jittered delay (~8.4s with this seed) would overrun the deadline
+    assert len(upstream.requests) == len(attempts) == 1
+    assert attempts[0]["delay_seconds"] is None
+
+
+@pytest.mark.asyncio
+async def test_sweep_fetches_locations_concurrently():
+    in_flight = max_in_flight = 0
+
+    async def slow_upstream(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.2)
+        in_flight -= 1
+        return httpx.Response(200, json=WEATHER_PAYLOAD, request=request)
+
+    locations = [f"1896{n}" for n in range(8)]
+    started = asyncio.get_running_loop().time()
+    results = await scraper.run_sweep(locations, transport=httpx.MockTransport(slow_upstream))
+    elapsed = asyncio.get_running_loop().time() - started
+
+    assert all(weather_data == WEATHER_PAYLOAD for weather_data, _ in results.values())
+    assert max_in_flight == len(locations)
+    # Eight sequential 200ms fetches would take 1.6s; the sweep takes about one
+    assert 0.2 <= elapsed < 0.4
+
+
+@pytest.mark.asyncio
+async def test_host_rate_limiter_spaces_out_requests_after_the_burst():
+    limiter = scraper.HostRateLimiter(rate=20, burst=2)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def request(host):
+        await limiter.wait(host)
+        return loop.time() - started
+
+    times = sorted(await asyncio.gather(*(request("wttr.in") for _ in range(6))))
+    other_host = await request("example.com")
+
+    assert times[1] < 0.02  # the burst goes out at once
+    gaps = [later - earlier for earlier, later in zip(times[1:], times[2:])]
+    assert all(gap >= 0.045 for gap in gaps)  # then one request every 1/20s
+    assert times[-1] >= 0.2
+    assert other_host - times[-1] < 0.02  # other hosts have their own bucket
+
+
+def _hour(time_hhmm, windspeed):
+    return {"time": str(time_hhmm), "windspeedMiles": str(windspeed), "winddir16Point": "N"}
+
+
+def _results(location, days):
+    weather = [{"date": day, "hourly": [_hour(0, wind), _hour(300, wind)]} for day, wind in days]
+    return {location: ({"weather": weather}, [])}
+
+
+def test_ingest_reports_bulk_upserts_and_skips_unchanged_days():
+    reports = scraper.build_reports(_results("18966", [("2024-01-01", 5), ("2024-01-02", 7), ("2024-01-03", 4)]))
+    assert reports[0]["hourly"][0] == {"time": 0, "windspeedMiles": 5, "winddir16Point": "N"}
+    collection = MagicMock()
+    collection.find.return_value = [
+        {"location": "18966", "date": "2024-01-01", "hourly_hash": reports[0]["hourly_hash"]},
+        {"location": "18966", "date": "2024-01-02", "hourly_hash": "stale"},
+    ]
+    collection.bulk_write.return_value.bulk_api_result = {"nUpserted": 1, "nModified": 1, "nMatched": 1, "writeErrors": []}
+
+    counts = scraper.ingest_reports(collection, reports)
+
+    assert counts == {"inserted": 1, "modified": 1, "unchanged": 1, "failed": 0}
+    assert collection.find.call_count == 1
+    assert collection.find.call_args.args[0] == {"$or": [{"location": "18966", "date": {"$in": ["2024-01-01", "2024-01-02", "2024-01-03"]}}]}
+    operations = collection.bulk_write.call_args.args[0]
+    assert [operation._filter for operation in operations] == [
+        {"location": "18966", "date": "2024-01-02"},
+        {"location": "18966", "date": "2024-01-03"},
+    ]
+    assert collection.bulk_write.call_args.kwargs["ordered"] is False
+
+
+def test_ingest_reports_skips_writes_when_nothing_changed():
+    reports = scraper.build_reports(_results("18966", [("2024-01-01", 5)]))
+    collection = MagicMock()
+    collection.find.return_value = [{"location": "18966", "date": "2024-01-01", "hourly_hash": reports[0]["hourly_hash"]}]
+
+    counts = scraper.ingest_reports(collection, reports)
+
+    assert counts == {"inserted": 0, "modified": 0, "unchanged": 1, "failed": 0}
+    collection.bulk_write.assert_not_called()
+
+
+def test_ingest_reports_counts_partial_failures():
+    collection = MagicMock()
+    collection.find.return_value = []
+    collection.bulk_write.side_effect = BulkWriteError({
+        "nUpserted": 1, "nModified": 0, "nMatched": 0,
+        "writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}],
+    })
+
+    counts = scraper.ingest_reports(collection, scraper.build_reports(_results("18966", [("2024-01-01", 5), ("2024-01-02", 7)])))
+
+    assert counts == {"inserted": 1, "modified": 0, "unchanged": 0, "failed": 1}
+    assert collection.bulk_write.call_args.kwargs["ordered"] is False
+
+
+@pytest.mark.asyncio
+async def test_fetch_sends_validators_and_short_circuits_on_304():
+    upstream = FakeUpstream(
+        httpx.Response(200, json=WEATHER_PAYLOAD, headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 12:00:00 GMT"}),
+        304,
+    )
+
+    first = await scraper.run_sweep(["18966"], transport=upstream.transport)
+    second = await scraper.run_sweep(["18966"], transport=upstream.transport)
+
+    assert "if-none-match" not in upstream.requests[0].headers
+    assert upstream.requests[1].headers["if-none-match"] == '"v1"'
+    assert upstream.requests[1].headers["if-modified-since"] == "Mon, 01 Jan 2024 12:00:00 GMT"
+    assert first["18966"][0] == WEATHER_PAYLOAD
+    weather_data, attempts = second["18966"]
+    assert weather_data is None
+    assert attempts == [dict(attempts[0], success=True, status_code=304, outcome="not_modified")]
+    assert scraper.build_reports(second) == []
+
+
+@pytest.mark.asyncio
+async def test_fetch_short_circuits_identical_payloads_without_validators():
+    upstream = FakeUpstream(WEATHER_PAYLOAD, WEATHER_PAYLOAD, {"weather": []})
+
+    await scraper.run_sweep(["18966"], transport=upstream.transport)
+    unchanged = await scraper.run_sweep(["18966"], transport=upstream.transport)
+    changed = await scraper.run_sweep(["18966"], transport=upstream.transport)
+
+    assert unchanged["18966"][0] is None
+    assert unchanged["18966"][1][0]["outcome"] == "not_modified"
+    assert changed["18966"][0] == {"weather": []}
+    assert changed["18966"][1][0]["outcome"] == "updated"
+
+
+def test_weather_job_forgets_validators_when_ingest_fails():
+    scraper.fetch_state["18966"] = {"etag": '"v1"', "last_modified": None, "payload_hash": "abc"}
+    client = MagicMock()
+    client.weather_db.hourly_reports.find.side_effect = RuntimeError("mongo down")
+    sweep = {"18966": (WEATHER_PAYLOAD, [])}
+
+    with patch('scraper.run_sweep', MagicMock()), patch('scraper.asyncio.run', return_value=sweep):
+        scraper.weather_job(client)
+
+    assert "18966" not in scraper.fetch_state
+
+
+def test_ingest_reports_appends_changed_reports_to_history():
+    reports = scraper.build_reports(_results("18966", [("2024-01-01", 5), ("2024-01-02", 7)]))
+    collection = MagicMock()
+    collection.find.return_value = [{"location": "18966", "date": "2024-01-01", "hourly_hash": reports[0]["hourly_hash"]}]
+    collection.bulk_write.return_value.bulk_api_result = {"nUpserted": 1, "nModified": 0, "nMatched": 0, "writeErrors": []}
+    history = MagicMock()
+
+    scraper.ingest_reports(collection, reports, history)
+
+    operations = history.bulk_write.call_args.args[0]
+    assert len(operations) == 1
+    assert operations[0]._filter == {"location": "18966", "date": "2024-01-02"}
+    push = operations[0]._doc["$push"]["snapshots"]
+    assert push["$slice"] == -scraper.HISTORY_MAX_SNAPSHOTS
+    assert push["$each"][0]["hourly_hash"] == reports[1]["hourly_hash"]
+
+
+def test_ingest_reports_skips_history_for_reports_that_failed_to_upsert():
+    reports = scraper.build_reports(_results("18966", [("2024-01-01", 5), ("2024-01-02", 7), ("2024-01-03", 4)]))
+    collection = MagicMock()
+    collection.find.return_value = []
+    collection.bulk_write.side_effect = BulkWriteError({
+        "nUpserted": 2, "nModified": 0, "nMatched": 0,
+        "writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}],
+    })
+    history = MagicMock()
+
+    scraper.ingest_reports(collection, reports, history)
+
+    operations = history.bulk_write.call_args.args[0]
+    assert [operation._filter["date"] for operation in operations] == ["2024-01-01", "2024-01-03"]
+
+
+@pytest.fixture
+def mongomock_db():
+    # pymongo >= 4.9 passes sort= to bulk updates, which mongomock 4.3 predates
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def without_sort(self, *args, sort=None, **kwargs):
+        assert sort is None
+        return add_update(self, *args, **kwargs)
+
+    with patch.object(mongomock.collection.BulkOperationBuilder, "add_update", without_sort):
+        yield mongomock.MongoClient().weather_db
+
+
+def test_schema_migration_types_and_tags_legacy_reports_once(mongomock_db):
+    db = mongomock_db
+    db.hourly_reports.insert_many([
+        {"date": "2024-01-01", "hourly": [{"time": "300", "windspeedMiles": "12", "precipInches": "0.1", "winddir16Point": "N"}]},
+        {"date": "2024-01-02", "hourly": [{"time": "0", "tempF": "n/a"}]},
+    ])
+
+    assert scraper.backfill_location(db) == 2
+    assert scraper.migrate_typed_schema(db) == 2
+
+    reports = list(db.hourly_reports.find({}, {"_id": 0}).sort("date", 1))
+    assert reports[0] == {
+        "date": "2024-01-01",
+        "location": scraper.LEGACY_LOCATION,
+        "schema_version": 2,
+        "hourly": [{"time": 300, "windspeedMiles": 12, "precipInches": 0.1, "winddir16Point": "N"}],
+    }
+    # Values that aren't numbers are left as they were
+    assert reports[1]["hourly"] == [{"time": 0, "tempF": "n/a"}]
+    assert scraper.backfill_location(db) == 0
+    assert scraper.migrate_typed_schema(db) == 0
+
+
+def test_downsample_snapshots_keeps_last_snapshot_per_window():
+    snapshots = [{"recorded_utc": datetime(2024, 1, 1, hour, 5), "n": hour} for hour in range(0, 13)]
+
+    kept = scraper.downsample_snapshots(snapshots, 6)
+
+    assert [snapshot["n"] for snapshot in kept] == [5, 11, 12]
+
+
+def test_rollup_attempts_summarizes_complete_days_since_last_summary():
+    db = MagicMock()
+    db.attempt_summaries.find_one.return_value = {"date": "2024-01-01"}
+    db.attempts.aggregate.return_value = [
+        {"_id": {"date": "2024-01-02", "location": "18966"}, "attempts": 26, "successes": 24,
+         "not_modified": 10, "avg_duration_ms": 400.0, "max_duration_ms": 2000.0},
+    ]
+
+    written = scraper.rollup_attempts(db, now=datetime(2024, 1, 3, 0, 15))
+
+    assert written == 1
+    match = db.attempts.aggregate.call_args.args[0][0]["$match"]
+    assert match == {"timestamp_utc": {"$gte": datetime(2024, 1, 2), "$lt": datetime(2024, 1, 3)}}
+    operation = db.attempt_summaries.bulk_write.call_args.args[0][0]
+    assert operation._filter == {"date": "2024-01-02", "location": "18966"}
+    assert operation._doc["$set"]["failures"] == 2
+
+
+def test_rollup_attempts_skips_when_today_is_already_covered():
+    db = MagicMock()
+    db.attempt_summaries.find_one.return_value = {"date": "2024-01-02"}
+
+    assert scraper.rollup_attempts(db, now=datetime(2024, 1, 3, 0, 15)) == 0
+    db.attempts.aggregate.assert_not_called()
+
+
+def test_configure_attempts_retention_adds_ttl_to_existing_index():
+    db = MagicMock()
+    db.attempts.index_information.return_value = {"timestamp_utc_-1": {"key": [("timestamp_utc", -1)]}}
+
+    with patch('scraper.ATTEMPTS_RETENTION_DAYS', 30), patch('scraper.ATTEMPTS_CAPPED_SIZE_BYTES', 0):
+        scraper.configure_attempts_retention(db)
+
+    db.command.assert_called_once_with(
+        "collMod", "attempts", index={"name": "timestamp_utc_-1", "expireAfterSeconds": 30 * 24 * 3600}
+    )
+    db.attempts.drop_index.assert_not_called()
+
+
+def test_configure_attempts_retention_caps_collection_without_ttl():
+    db = MagicMock()
+    db.attempts.options.return_value = {}
+    db.list_collection_names.return_value = ["attempts"]
+    db.attempts.index_information.return_value = {"_id_": {"key": [("_id", 1)]}}
+
+    with patch('scraper.ATTEMPTS_CAPPED_SIZE_BYTES', 1024 * 1024):
+        scraper.configure_attempts_retention(db)
+
+    db.command.assert_called_once_with("convertToCapped", "attempts", size=1024 * 1024)
+    db.attempts.create_index.assert_called_once_with([("timestamp_utc", -1)], name="timestamp_utc_-1")
+
+
+@pytest.mark.asyncio
+async def test_sweep_exports_attempt_and_retry_metrics():
+    def sample(name, labels=None):
+        return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+    before = {
+        "updated": sample("scraper_fetch_attempts_total", {"result": "updated"}),
+        "failed": sample("scraper_fetch_attempts_total", {"result": "failed"}),
+        "retries": sample("scraper_fetch_retries_total"),
+        "observed": sample("scraper_fetch_duration_seconds_count", {"result": "failed"}),
+    }
+
+    await scraper.run_sweep(["18966"], transport=FakeUpstream(500, WEATHER_PAYLOAD).transport)
+
+    assert sample("scraper_fetch_attempts_total", {"result": "updated"}) - before["updated"] == 1
+    assert sample("scraper_fetch_attempts_total", {"result": "failed"}) - before["failed"] == 1
+    assert sample("scraper_fetch_retries_total") - before["retries"] == 1
+    assert sample("scraper_fetch_duration_seconds_count", {"result": "failed"}) - before["observed"] == 1
+
+
+def test_scraper_refuses_to_start_without_locations():
+    with patch('scraper.WEATHER_LOCATIONS', []), patch('scraper.get_mongo_client') as get_mongo_client:
+        scraper.main()
+        scraper.verify_query_plans(MagicMock())
+
+    get_mongo_client.assert_not_called()